@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""vectorized cartpole: one (batched) controller call per tick for N environments"""
+from argparse import ArgumentParser, Namespace
+from functools import partial
+from datetime import datetime
+import gymnasium as gym
+import numpy as np
+from loggez import make_logger
+from robobase import Robot, DataChannel, ActionsQueue, Action
+from roboimpl.envs.gym import GymVectorEnv, GymState, gym_actions_fn, GYM_ACTION_NAMES
+
+logger = make_logger("GYM")
+
+def controller_fn(data: dict[str, GymState], action_space: gym.Space) -> list[Action]: # pylint:disable=unused-argument
+    """controller fn: batched env state (data) to a batched step action. Finished envs are reset by gymnasium"""
+    return [Action("step", parameters=(action_space.sample(), ))]
+
+def get_args() -> Namespace:
+    """cli args"""
+    parser = ArgumentParser()
+    parser.add_argument("--num_envs", type=int, default=8)
+    parser.add_argument("--max_steps", type=int, default=1000)
+    parser.add_argument("--asynchronous", action="store_true", help="one process per env (AsyncVectorEnv)")
+    return parser.parse_args()
+
+def main(args: Namespace):
+    """main fn"""
+    env = GymVectorEnv.make("CartPole-v1", num_envs=args.num_envs, asynchronous=args.asynchronous,
+                            max_steps=args.max_steps)
+    data_channel = DataChannel(["state"], lambda a, b: np.allclose(a["state"].observation, b["state"].observation))
+    actions_queue = ActionsQueue(action_names=GYM_ACTION_NAMES)
+
+    robot = Robot(env=env, data_channel=data_channel, actions_queue=actions_queue, actions_fn=gym_actions_fn)
+    robot.add_controller(partial(controller_fn, action_space=env.action_space))
+    start = datetime.now()
+    robot.run_lockstep()
+    n_samples = env.total_steps * env.num_envs
+    logger.info(f"Collected {n_samples} samples ({n_samples / (datetime.now() - start).total_seconds():.1f}/s)")
+    env.close()
+
+if __name__ == "__main__":
+    main(get_args())
@@ -112,6 +112,7 @@ def get_args() -> Namespace:
     parser.add_argument("strategy")
     parser.add_argument("--seed", type=int)
     parser.add_argument("--results_path", type=Path, default=Path.cwd() / "results.csv")
+    parser.add_argument("--lockstep", action="store_true", help="single-threaded run. Use with MAZE_FREQ=0")
     args = parser.parse_args()
     return args
 
@@ -132,7 +133,7 @@ def main(args: Namespace):
 
     robot = Robot(env=maze, data_channel=data_channel, actions_queue=actions_queue, actions_fn=actions_fn)
     robot.add_controller(controller_fn, name="Maze Planner")
-    robot.run()
+    _ = robot.run_lockstep() if args.lockstep else robot.run()
     data_channel.close()
 
     maze.print_maze()
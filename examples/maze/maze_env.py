@@ -98,7 +98,8 @@ class MazeEnv(Environment):
 
     def _move_player(self, direction: str) -> bool:
         """moves player in one of the 4 directions. Returns true on succes, false otherwise"""
-        self._prev_time = freq_barrier(FREQUENCY, self._prev_time)
+        if FREQUENCY > 0: # MAZE_FREQ=0 disables the real-time pacing (i.e. for Robot.run_lockstep)
+            self._prev_time = freq_barrier(FREQUENCY, self._prev_time)
 
         self.n_moves += 1
         delta = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
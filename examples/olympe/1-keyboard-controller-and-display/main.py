@@ -4,7 +4,8 @@ from argparse import ArgumentParser, Namespace
 from queue import Queue
 
 from robobase import ActionsQueue, DataChannel, Robot, Action as Act
-from roboimpl.envs.olympe import OlympeEnv, olympe_actions_fn, OLYMPE_ACTION_NAMES
+from roboimpl.envs.olympe import OlympeEnv, olympe_actions_fn, OLYMPE_ACTION_NAMES, OLYMPE_ACTION_REDUCE_FNS, \
+    OLYMPE_ACTION_PRIORITIES, OLYMPE_ACTION_LANES
 from roboimpl.controllers import ScreenDisplayer, Key, KeyboardController
 
 QUEUE_MAX_SIZE = 30
@@ -53,11 +54,14 @@ def get_args() -> Namespace:
 def main(args: Namespace):
     """main fn"""
     env = OlympeEnv(ip=args.ip, image_size=args.image_size)
-    actions_queue = ActionsQueue(action_names=OLYMPE_ACTION_NAMES, queue=Queue(maxsize=QUEUE_MAX_SIZE))
+    actions_queue = ActionsQueue(action_names=OLYMPE_ACTION_NAMES, queue=Queue(maxsize=QUEUE_MAX_SIZE),
+                                 reduce_fns=OLYMPE_ACTION_REDUCE_FNS, overflow="replace",
+                                 priorities=OLYMPE_ACTION_PRIORITIES, cancel_lower=True)
     data_channel = DataChannel(supported_types=env.get_modalities(),
                                eq_fn=lambda a, b: a["metadata"]["time"] == b["metadata"]["time"])
 
-    robot = Robot(env=env, data_channel=data_channel, actions_queue=actions_queue, actions_fn=olympe_actions_fn)
+    robot = Robot(env=env, data_channel=data_channel, actions_queue=actions_queue, actions_fn=olympe_actions_fn,
+                  action_lanes=OLYMPE_ACTION_LANES)
     robot.add_controller(sd := ScreenDisplayer(data_channel, actions_queue, resolution=RESOLUTION))
     robot.add_controller(KeyboardController(data_channel, actions_queue, sd.backend, keyboard_fn=keyboard_fn))
     robot.run()
@@ -18,7 +18,7 @@ from detection.mask_splitter_data_producer import MaskSplitterDataProducer, IMAG
 
 from robobase import Robot, ActionsQueue, DataChannel, DataItem, Action as Act, DataProducer
 from roboimpl.data_producers.yolo import YOLODataProducer
-from roboimpl.envs.olympe import OlympeEnv, olympe_action_fn, OLYMPE_ACTION_NAMES
+from roboimpl.envs.olympe import OlympeEnv, olympe_action_fn, merge_piloting_actions, OLYMPE_ACTION_NAMES
 from roboimpl.controllers import ScreenDisplayer, Key, KeyboardController
 from roboimpl.utils import image_draw_rectangle, image_paste, image_draw_circle, Color
 
@@ -30,6 +30,7 @@ BBOX_THICKNESS = 0.75
 CIRCLE_RADIUS = 1
 DT = 0.15
 VELOCITY_PERC = 50
+KEYBOARD_CONTROLLER = "Keyboard controller" # the controller's name, which is the source of its actions
 
 def screen_frame_callback(data: dict[str, DataItem]) -> np.ndarray:
     """produces RGB + semantic segmentation as a single frame"""
@@ -63,7 +64,8 @@ def screen_frame_callback(data: dict[str, DataItem]) -> np.ndarray:
 def ibvs_olympe_actions_fn(env: OlympeEnv, actions: list[Act]) -> bool:
     """IBVS actions fn. Overrides the generic olympe_actions_fn, but adds other specifics like INITIALIZE_FLIGHT"""
     all_good = True
-    for action in actions:
+    # the keyboard's PILOTING overrides the one of the other controllers (i.e. IBVS), whatever the order they came in
+    for action in merge_piloting_actions(actions, "override", source_priorities=[KEYBOARD_CONTROLLER]):
         if action.name in OLYMPE_ACTION_NAMES:
             all_good = all_good and olympe_action_fn(env, action)
             continue
@@ -131,7 +133,7 @@ def main(args: Namespace):
     """main fn"""
     env = OlympeEnv(ip=args.drone_ip, image_size=args.image_size)
     action_names = [*OLYMPE_ACTION_NAMES, "INITIALIZE_FLIGHT"]
-    actions_queue = ActionsQueue(action_names=action_names, queue=Queue(maxsize=QUEUE_MAX_SIZE))
+    actions_queue = ActionsQueue(action_names=action_names, queue=Queue(maxsize=QUEUE_MAX_SIZE), overflow="replace")
     supported_types = env.get_modalities()
     dps: list[DataProducer] = []
 
@@ -153,7 +155,8 @@ def main(args: Namespace):
 
     robot.add_controller(sd := ScreenDisplayer(data_channel, actions_queue, resolution=SCREEN_RESOLUTION,
                                                screen_frame_callback=screen_frame_callback))
-    robot.add_controller(KeyboardController(data_channel, actions_queue, sd.backend, keyboard_fn=keyboard_fn))
+    robot.add_controller(KeyboardController(data_channel, actions_queue, sd.backend, keyboard_fn=keyboard_fn),
+                         name=KEYBOARD_CONTROLLER)
     robot.run()
 
     env.close()
@@ -6,7 +6,7 @@ from argparse import ArgumentParser, Namespace
 from vre_video import VREVideo
 
 from robobase import ActionsQueue, DataChannel, Robot, Action as Act
-from roboimpl.envs.video import VideoPlayerEnv, video_actions_fn, VIDEO_ACTION_NAMES
+from roboimpl.envs.video import VideoPlayerEnv, video_actions_fn, VIDEO_ACTION_NAMES, VIDEO_ACTION_REDUCE_FNS
 from roboimpl.controllers import ScreenDisplayer, UDPController, Key, KeyboardController
 
 DEFAULT_SCREEN_RESOLUTION = (420, 640)
@@ -23,7 +23,7 @@ def main(args: Namespace):
     """main fn"""
     (env := VideoPlayerEnv(VREVideo(args.video_path))).start() # start the video player
 
-    actions_queue = ActionsQueue(action_names=VIDEO_ACTION_NAMES)
+    actions_queue = ActionsQueue(action_names=VIDEO_ACTION_NAMES, reduce_fns=VIDEO_ACTION_REDUCE_FNS)
     data_channel = DataChannel(supported_types=["rgb", "frame_ix"], eq_fn=lambda a, b: a["frame_ix"] == b["frame_ix"])
 
     robot = Robot(env=env, data_channel=data_channel, actions_queue=actions_queue, actions_fn=video_actions_fn)
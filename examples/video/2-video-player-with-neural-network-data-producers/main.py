@@ -10,16 +10,18 @@ from vre_repository.utils import colorize_depth, colorize_semantic_segmentation
 
 from robobase import Robot, ActionsQueue, DataChannel, DataItem, Action as Act
 from roboimpl.data_producers.yolo import YOLODataProducer
-from roboimpl.envs.video import VideoPlayerEnv, video_actions_fn, VIDEO_ACTION_NAMES
+from roboimpl.envs.video import VideoPlayerEnv, video_actions_fn, VIDEO_ACTION_NAMES, VIDEO_ACTION_REDUCE_FNS
 from roboimpl.controllers import ScreenDisplayer, Key, KeyboardController
 from roboimpl.utils import image_draw_rectangle, image_paste, Color, image_resize
 from roboimpl.data_producers.vre import build_vre_data_producers
 
 BBOX_THICKNES = 1
 DEFAULT_SCREEN_RESOLUTION = (600, 800)
+OVERLAY_KEYS = {Key.s: "safeuav", Key.d: "depth_dpt"} # toggle the semantic segmentation and depth overlays
 
-def screen_frame_callback(data: dict[str, DataItem], color_map: list[Color], only_top1_bbox: bool) -> np.ndarray:
-    """produces RGB + semantic segmentation as a single frame"""
+def screen_frame_callback(data: dict[str, DataItem], color_map: list[Color], only_top1_bbox: bool,
+                          shown: set[str]) -> np.ndarray:
+    """produces RGB + semantic segmentation as a single frame. The NN overlays are drawn only if they are shown"""
     res, (h, w) = data["rgb"], data["rgb"].shape[0:2]
     if "bbox" in data and data["bbox"] is not None:
         data["bbox"] = data["bbox"][0:1] if only_top1_bbox else data["bbox"]
@@ -34,17 +36,27 @@ def screen_frame_callback(data: dict[str, DataItem], color_map: list[Color], onl
         all_segmentations = (data["segmentation"].sum(0).repeat(3, axis=-1) * Color.GREENISH).astype(np.uint8)
         res = image_paste(res, all_segmentations)
 
-    if "safeuav" in data:
+    if "safeuav" in shown and data["safeuav"] is not None: # None until its producer runs (see keyboard_fn)
         sema_rgb = colorize_semantic_segmentation(data["safeuav"].argmax(-1)[None], color_map, method="fast_simple")[0]
         sema_rgb_rsz = image_resize(sema_rgb, h, w, "nearest") # (Hs, Ws, 3) -> (H, W, 3)
         res = np.concatenate([res, sema_rgb_rsz], axis=1)
 
-    if "depth_dpt" in data:
+    if "depth_dpt" in shown and data["depth_dpt"] is not None:
         depth_rgb = (colorize_depth(data["depth_dpt"][None], percentiles=[1, 95]) * 255).astype("uint8")[0]
         depth_rgb_rsz = image_resize(depth_rgb, h, w, "nearest") # (Hd, Wd, 3) -> (H, W, 3)
         res = np.concatenate([res, depth_rgb_rsz], axis=1)
     return res
 
+def keyboard_fn(pressed: set[Key], key_to_action: dict[Key, Act], overlays: dict[Key, str], shown: set[str],
+                screen_displayer: ScreenDisplayer) -> list[Act]:
+    """the keys to actions + the NN overlays toggles: their producers only run while they are shown"""
+    for key in [key for key in overlays if key in pressed]:
+        shown ^= {overlays[key]}
+        screen_displayer.set_modalities([m for m in screen_displayer.data_channel.supported_types
+                                         if m not in overlays.values() or m in shown])
+        pressed.discard(key)
+    return [action for key in pressed if (action := key_to_action.get(key)) is not None]
+
 def get_args() -> Namespace:
     """cli args"""
     parser = ArgumentParser()
@@ -78,19 +90,25 @@ def main(args: Namespace):
                 color_map = dp.repr.color_map
 
     data_channel = DataChannel(supported_types=supported_types, eq_fn=lambda a, b: a["frame_ix"] == b["frame_ix"])
-    actions_queue = ActionsQueue(action_names=VIDEO_ACTION_NAMES)
+    actions_queue = ActionsQueue(action_names=VIDEO_ACTION_NAMES, reduce_fns=VIDEO_ACTION_REDUCE_FNS)
     robot = Robot(env=env, data_channel=data_channel, actions_queue=actions_queue, actions_fn=video_actions_fn)
     for dp in dps:
         robot.add_data_producer(dp)
 
+    # the NN overlays are hidden at first and toggled with their keys, so their producers only run while shown
+    overlays = {key: m for key, m in OVERLAY_KEYS.items() if m in supported_types}
+    shown: set[str] = set()
     f_screen_frame_callback = partial(screen_frame_callback, color_map=color_map,
-                                      only_top1_bbox=args.yolo_only_top1_bbox)
+                                      only_top1_bbox=args.yolo_only_top1_bbox, shown=shown)
     robot.add_controller(sd := ScreenDisplayer(data_channel, actions_queue, resolution=DEFAULT_SCREEN_RESOLUTION,
-                                               screen_frame_callback=f_screen_frame_callback))
+                                               screen_frame_callback=f_screen_frame_callback,
+                                               modalities=[m for m in supported_types if m not in overlays.values()]))
     key_to_action = {Key.Space: Act("PLAY_PAUSE"), Key.Esc: Act("DISCONNECT"), Key.Left: Act("GO_BACK", (env.fps, )),
                      Key.Right: Act("GO_FORWARD", (env.fps, )), Key.Comma: Act("GO_BACK", (1, )),
                      Key.Period: Act("GO_FORWARD", (1, ))}
-    robot.add_controller(KeyboardController(data_channel, actions_queue, sd.backend, key_to_action=key_to_action))
+    f_keyboard_fn = partial(keyboard_fn, key_to_action=key_to_action, overlays=overlays, shown=shown,
+                            screen_displayer=sd)
+    robot.add_controller(KeyboardController(data_channel, actions_queue, sd.backend, keyboard_fn=f_keyboard_fn))
 
     robot.run()
     env.close()
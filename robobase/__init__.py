@@ -4,8 +4,10 @@ from .robot import Robot
 from .data_channel import DataChannel
 from .action import Action
 from .actions_queue import ActionsQueue
-from .types import DataItem, ActionsFn, ControllerFn, DataEqFn
-from .data_producer import DataProducer, LambdaDataProducer, RawDataProducer
+from .types import DataItem, ActionsFn, ControllerFn, DataEqFn, ActionReduceFn
+from .data_producer import DataProducer, LambdaDataProducer, RawDataProducer, AsyncDataProducer, BatchedDataProducer, \
+    CachedDataProducer
+from .process_data_producer import ProcessDataProducer
 from .data_producers2channels import DataProducers2Channels
 from .controller import BaseController, Controller
 from .actions2env import Actions2Environment
@@ -17,8 +19,10 @@ __all__ = [
     "DataChannel",
     "Action",
     "ActionsQueue",
-    "DataItem", "ActionsFn", "ControllerFn", "DataEqFn",
-    "DataProducer", "LambdaDataProducer", "RawDataProducer",
+    "DataItem", "ActionsFn", "ControllerFn", "DataEqFn", "ActionReduceFn",
+    "DataProducer", "LambdaDataProducer", "RawDataProducer", "AsyncDataProducer", "BatchedDataProducer",
+    "CachedDataProducer",
+    "ProcessDataProducer",
     "DataProducers2Channels",
     "BaseController", "Controller",
     "Actions2Environment",
@@ -1,17 +1,19 @@
 """action.py The generic action class"""
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 @dataclass(frozen=True)
 class Action:
-    """action class is a name (str) + parameters (any)"""
+    """action class is a name (str) + parameters (any). The source (i.e. the controller) is not part of the equality"""
     name: str
     parameters: tuple[Any, ...] = ()
+    source: str | None = field(default=None, compare=False)
 
     def __post_init__(self):
         assert isinstance(self.name, str), type(self.name)
         assert isinstance(self.parameters, tuple), type(self.parameters)
+        assert self.source is None or isinstance(self.source, str), type(self.source)
 
     def __repr__(self):
         return f"Action({self.name}{'' if self.parameters == tuple() else f' {self.parameters}'})"
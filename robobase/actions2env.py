@@ -1,56 +1,158 @@
 """action2robot.py - the module that interfaces bewteen the action and the robot/drone"""
 from __future__ import annotations
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Awaitable, Callable
+import asyncio
+import inspect
 import threading
 import traceback
-from queue import Empty
 
 from .environment import Environment
 from .actions_queue import ActionsQueue, Action
 from .types import ActionsFn
 from .utils import logger
 
-TIMEOUT_S = 0.01
+TIMEOUT_S = 0.1 # only to check if the env stopped: a put() wakes up the thread right away (condition, not polling)
+DEFAULT_LANE = "default" # the lane of the actions that are not mapped to any lane
+
+LaneItem = tuple[Action, list[Future]] # a (coalesced) action and the futures of the submitted actions merged into it
+
+async def _await(awaitable: Awaitable) -> Any:
+    return await awaitable
+
+class _ActionsLane(threading.Thread):
+    """applies the actions of one lane (i.e. gimbal) in order, without waiting for the other lanes (i.e. piloting)"""
+    def __init__(self, name: str, apply_fn: Callable[[list[LaneItem]], None]):
+        super().__init__(daemon=True, name=f"ActionsLane-{name}")
+        self.requests: Queue[list[LaneItem] | None] = Queue()
+        self.apply_fn = apply_fn
+
+    def run(self):
+        while True:
+            requests = [self.requests.get()] # all the pending ones are applied at once, as the lane may lag behind
+            while not self.requests.empty():
+                requests.append(self.requests.get_nowait())
+            if None in requests: # stopped: the actions that didn't reach the env are cancelled
+                _ = [future.cancel() for items in requests if items is not None for _, futures in items
+                     for future in futures]
+                break
+            try:
+                self.apply_fn([item for items in requests for item in items])
+            except Exception as e:
+                logger.error(f"Error {e} in {self.name}\nTraceback: {traceback.format_exc()}")
+                break
 
 class Actions2Environment(threading.Thread):
-    """Interface defining the requirements of a robot (real, sym, mock) to receive  actions & apply them to the env"""
-    def __init__(self, env: Environment, actions_queue: ActionsQueue, actions_fn: ActionsFn):
+    """
+    Interface defining the requirements of a robot (real, sym, mock) to receive  actions & apply them to the env.
+    At each tick, all the pending actions are taken and coalesced as per the queue's reduce_fns (i.e. the keyboard's
+    PILOTING flood becomes one command), so the latency from a controller to the env stays at one actions_fn call.
+    The actions are taken one priority class at a time, highest first, so the safety ones (i.e. LAND) don't wait for
+    the lower priority ones to be applied and the reaction time is bounded regardless of the queue's depth.
+    actions_fn may also return a future or an awaitable (i.e. a drone command) instead of a bool: it is waited for
+    before the next actions_fn call of the same lane. lanes maps action names to independent actuators (i.e. piloting
+    and gimbal): each lane applies its actions in order in its own thread, so a slow TakeOff doesn't hold the gimbal.
+    Without lanes, all the actions are applied in order by this thread. The futures of the submitted actions (see
+    ActionsQueue.submit()) are completed with the result of the actions_fn call that applied them.
+    """
+    def __init__(self, env: Environment, actions_queue: ActionsQueue, actions_fn: ActionsFn,
+                 lanes: dict[str, str] | None = None):
         threading.Thread.__init__(self, daemon=True)
         assert isinstance(actions_queue, ActionsQueue), f"queue must inherit ActionsQueue: {type(actions_queue)}"
+        assert (diff := set(lanes or {}) - set(actions_queue.action_names)) == set(), f"Unknown lane actions: {diff}"
         self.env = env
         self.actions_queue = actions_queue
         self.actions_fn = actions_fn
+        self.lanes = lanes or {}
+        self.n_coalesced = 0 # number of actions merged into others (not sent to the env on their own)
+        self._stats_lock = threading.Lock() # the lanes coalesce too
+        self._lanes: dict[str, _ActionsLane] = {} # started at the first action of each lane
 
-    def _fetch_actions(self) -> list[Action]:
-        actions, timestamps = [], []
+    def apply_pending(self) -> int:
+        """applies all the queued actions in the calling thread, without lanes nor waiting (see Robot.run_lockstep)"""
+        n_applied = 0
+        while len(self.actions_queue) > 0 and len(items := self._fetch_actions(block=False)) > 0:
+            self._apply(items)
+            n_applied += len(items)
+        return n_applied
+
+    def _fetch_actions(self, block: bool = True) -> list[LaneItem]:
+        items = []
         try: # 1st is blocking, rest are non-blocking, so we don't use sleeps.
-            action, ts = self.actions_queue.get(block=True, timeout=TIMEOUT_S)
-            actions.append(action)
-            timestamps.append(ts)
+            items.append(self.actions_queue.get(block=block, timeout=TIMEOUT_S if block else None))
+            priority = self.actions_queue.priority(items[0][0].name) # only this class: safety ones are sent alone
             while True:
-                action, ts = self.actions_queue.get_nowait()
-                actions.append(action)
-                timestamps.append(ts)
+                items.append(self.actions_queue.get_nowait(priority=priority))
         except Empty:
             pass
 
-        if len(actions) > 0:
-            msg = f"Processing {len(actions)} actions: "
-            for action, ts in zip(actions, timestamps):
+        if len(items) > 0:
+            msg = f"Processing {len(items)} actions: "
+            for action, ts in items:
                 msg += f"\n - {action} (ts: {ts})"
             logger.log_every_s(msg, "DEBUG", True)
-        return actions
+        # replay queues (offline) return plain (action, ts) tuples, not QueuedAction ones
+        futures = [[] if (future := getattr(item, "future", None)) is None else [future] for item in items]
+        return self._coalesce([(action, fs) for (action, _), fs in zip(items, futures)])
+
+    def _coalesce(self, items: list[LaneItem]) -> list[LaneItem]:
+        groups = self.actions_queue.coalesce_groups([action for action, _ in items])
+        with self._stats_lock:
+            self.n_coalesced += len(items) - len(groups)
+        return [(action, [future for i in ixs for future in items[i][1]]) for action, ixs in groups]
+
+    def _apply(self, items: list[LaneItem]):
+        """calls actions_fn, waits for its result if it's a future or an awaitable and completes the actions' futures"""
+        futures = [future for _, fs in items for future in fs if future.set_running_or_notify_cancel()]
+        actions = [action for action, _ in items]
+        try:
+            res = self.actions_fn(self.env, actions)
+            if isinstance(res, Future):
+                res = res.result()
+            elif inspect.isawaitable(res):
+                res = asyncio.run(_await(res))
+        except Exception as e:
+            _ = [future.set_exception(e) for future in futures]
+            raise e
+        if res is False:
+            logger.warning(f"Could not perform one or more actions: '{actions}'")
+        _ = [future.set_result(res) for future in futures]
+
+    def _apply_lane(self, items: list[LaneItem]):
+        """the lanes may get several batches at once: they are coalesced again and applied highest priority first"""
+        items = self._coalesce(items)
+        for priority in sorted({self.actions_queue.priority(action.name) for action, _ in items}, reverse=True):
+            self._apply([item for item in items if self.actions_queue.priority(item[0].name) == priority])
+
+    def _dispatch(self, items: list[LaneItem]):
+        lane_items: dict[str, list[LaneItem]] = {}
+        for item in items:
+            lane_items.setdefault(self.lanes.get(item[0].name, DEFAULT_LANE), []).append(item)
+        for name, items_of_lane in lane_items.items():
+            if name not in self._lanes:
+                self._lanes[name] = _ActionsLane(name, self._apply_lane)
+                self._lanes[name].start()
+            self._lanes[name].requests.put(items_of_lane)
 
     def run(self):
         while self.env.is_running():
             try:
-                actions = self._fetch_actions()
-                if len(actions) == 0:
+                if len(dead := [lane.name for lane in self._lanes.values() if not lane.is_alive()]) > 0:
+                    raise RuntimeError(f"Lanes stopped: {dead}")
+                items = self._fetch_actions()
+                if len(items) == 0:
                     continue
-                res = self.actions_fn(self.env, actions)
-                if res is False:
-                    logger.warning(f"Could not perform one or more actions: '{actions}'")
+                if len(self.lanes) == 0:
+                    self._apply(items)
+                else:
+                    self._dispatch(items)
             except Exception as e:
                 logger.error(f"Error {e}\nTraceback: {traceback.format_exc()}")
                 break
+        for lane in self._lanes.values():
+            lane.requests.put(None)
 
-        logger.debug(f"Stopping {self}. {self.env.is_running()=}")
+        logger.debug(f"Stopping {self}. {self.env.is_running()=}. Coalesced actions: {self.n_coalesced}. "
+                     f"Expired actions: {self.actions_queue.n_expired}. Overflow: {self.actions_queue.n_overflow}. "
+                     f"Cancelled: {self.actions_queue.n_cancelled}")
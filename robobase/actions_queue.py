@@ -1,43 +1,249 @@
 """actions_queue.py - thread-safe queue composition with support for robobase generic actions"""
-from queue import Queue
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import replace
+from queue import Queue, Empty
 from datetime import datetime
+from typing import Any
+import threading
+import time
 
 from .action import Action
-from .utils import DataStorer, logger
+from .types import ActionReduceFn
+from .utils import DataStorer, logger, get_clock
 
 QUEUE_DEFAULT_MAX_SIZE = 20 # needed so .put() doesn't grow the queue indefinitely
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "replace")
+
+def latest_wins(prev: Action, new: Action) -> Action: # pylint: disable=unused-argument
+    """reduce fn for continuous commands (i.e. PILOTING): only the latest one matters"""
+    return new
+
+def as_number(x: Any) -> int | float:
+    """the parameter as a number. Strings (i.e. from UDPController) are parsed, keeping the ints as ints"""
+    if isinstance(x, str):
+        try:
+            return int(x)
+        except ValueError:
+            return float(x)
+    assert isinstance(x, (int, float)) and not isinstance(x, bool), f"Not a number: {x} ({type(x)})"
+    return x
+
+def sum_parameters(prev: Action, new: Action) -> Action:
+    """
+    reduce fn for incremental commands (i.e. GO_FORWARD n frames): the parameters are summed element-wise as numbers.
+    If any of them is not a number, the latest action wins instead of failing the consumer.
+    """
+    try:
+        return Action(new.name, tuple(as_number(a) + as_number(b)
+                                      for a, b in zip(prev.parameters, new.parameters, strict=True)), new.source)
+    except (ValueError, AssertionError) as e:
+        logger.warning(f"Cannot sum the parameters of {prev} and {new}: {e}. Keeping the latest one.")
+        return new
+
+ACTION_REDUCE_FNS: dict[str, ActionReduceFn] = {"latest": latest_wins, "sum": sum_parameters}
+
+class QueuedAction(tuple):
+    """the (action, action_ts) tuple returned by get(), also carrying the future of the action if it was submitted"""
+    future: Future | None = None
+
+    def __new__(cls, action: Action, action_ts: datetime, future: Future | None = None):
+        res = super().__new__(cls, (action, action_ts))
+        res.future = future
+        return res
 
 class ActionsQueue:
-    """Interface defining the actions understandable by a drone and the application. Queue must be thread-safe!"""
-    def __init__(self, action_names: list[str], queue: Queue | None = None):
+    """
+    Interface defining the actions understandable by a drone and the application. Queue must be thread-safe!
+    The pending actions are coalesced (reduce_fns), expired (max ages), dropped on overflow or preempted by priority
+    (safety) actions. See 'Design notes' in the README.
+    """
+    def __init__(self, action_names: list[str], queue: Queue | None = None,
+                 reduce_fns: dict[str, ActionReduceFn | str] | None = None,
+                 max_data_age_s: dict[str, float] | None = None, max_queue_age_s: dict[str, float] | None = None,
+                 overflow: str = "block", priorities: dict[str, int] | None = None, cancel_lower: bool = False):
         assert len(action_names) > 0, "cannot have an empty list of actions"
+        assert overflow in OVERFLOW_POLICIES, f"{overflow} not in {OVERFLOW_POLICIES}"
         assert all(isinstance(action_name, str) for action_name in action_names), action_names
+        for name, policy in {"reduce_fns": reduce_fns, "max_data_age_s": max_data_age_s,
+                             "max_queue_age_s": max_queue_age_s, "priorities": priorities}.items():
+            assert (diff := set(policy or {}) - set(action_names)) == set(), f"Unknown actions in {name}: {diff}"
+        assert all(v > 0 for v in (priorities or {}).values()), f"Priorities must be positive: {priorities}"
         self.queue = queue or Queue(maxsize=QUEUE_DEFAULT_MAX_SIZE)
+        assert (overflow == "block" and priorities is None) or isinstance(self.queue.queue, deque), \
+            f"Non-blocking overflow policies and priorities require a FIFO queue.Queue, got {type(self.queue)}"
         self.action_names = action_names
+        self.reduce_fns: dict[str, ActionReduceFn] = {k: ACTION_REDUCE_FNS[v] if isinstance(v, str) else v
+                                                      for k, v in (reduce_fns or {}).items()}
+        self.max_data_age_s = max_data_age_s or {}
+        self.max_queue_age_s = max_queue_age_s or {}
+        self.n_expired: dict[str, int] = {} # number of stale actions dropped by get(), per action name
+        self.overflow = overflow
+        self.n_overflow: dict[str, int] = {} # number of actions dropped (or rejected) by put(), per action name
+        self.priorities = priorities or {}
+        self.cancel_lower = cancel_lower
+        self.n_cancelled: dict[str, int] = {} # number of actions cancelled by higher priority ones, per action name
 
-    def put(self, action: Action, data_ts: datetime | None, *args, **kwargs):
+    def put(self, action: Action, data_ts: datetime | None, *args, future: Future | None = None, **kwargs) -> bool:
         """
         Put an action into the queue. data_ts is the ts of the data that produced the action or None (i.e. kb).
         args and kwargs are passed to the queue as we can have different queue implementations (i.e. priority queue).
+        Returns False if the action was rejected because the queue is full (overflow='drop_newest' only).
+        future, if set, is completed with the result of the actions_fn call that applied it or cancelled if dropped.
+        The action's source defaults to the name of the calling thread (i.e. the controller's name, set by Robot).
         """
         assert isinstance(action, Action), type(action)
         assert action.name in self.action_names, f"{action} not in {self.action_names}"
-        action_ts = datetime.now()
+        if action.source is None:
+            action = replace(action, source=threading.current_thread().name)
+        action_ts = get_clock().now()
         logger.log_every_s(f"Got action (action_ts='{action_ts}'): {action} (#queue: {len(self)})", "DEBUG", True)
 
         if (storer := DataStorer.get_instance()) is not None:
             item = {"action": action, "data_ts": None if data_ts is None else data_ts.isoformat()} # correlate act-data
             storer.push(item=item, tag="ActionsQueue", timestamp=action_ts)
 
-        self.queue.put((action, action_ts), *args, **kwargs)
+        item = (action, action_ts, data_ts, future) # data_ts is kept only for the max age checks
+        if self.overflow == "block" and self.priority(action.name) == 0:
+            self.queue.put(item, *args, **kwargs)
+            return True
+        return self._put_nowait(item)
+
+    def submit(self, action: Action, data_ts: datetime | None, *args, **kwargs) -> Future:
+        """
+        Like put(), but returns a future with the result of the actions_fn call that applied the action (or its error).
+        It is cancelled if the action is dropped (rejected, expired or cancelled) before reaching the env.
+        """
+        future = Future()
+        self.put(action, data_ts, *args, future=future, **kwargs)
+        return future
+
+    def priority(self, action_name: str) -> int:
+        """the priority of an action name. 0 (the lowest) unless set in the constructor"""
+        return self.priorities.get(action_name, 0)
+
+    def get(self, block: bool = True, timeout: float | None = None) -> QueuedAction:
+        """Remove and return an item from the queue. Stale actions are dropped (see n_expired) and not returned"""
+        return self._get(block, timeout)
+
+    def get_nowait(self, priority: int | None = None) -> QueuedAction:
+        """Remove and return an item from the queue without waiting. If priority is set, only if it's the next one's"""
+        return self._get(block=False, timeout=None, priority=priority)
 
-    def get(self, *args, **kwargs) -> tuple[Action, datetime]:
-        """Remove and return an item from the queue"""
-        return self.queue.get(*args, **kwargs)
+    def _get(self, block: bool, timeout: float | None, priority: int | None = None) -> QueuedAction:
+        """the implementation of get() and get_nowait(), as subclasses (i.e. replay) may only override get()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if priority is None or len(self.priorities) == 0: # no priorities: all the actions are in the same class
+                item = self.queue.get(block, remaining)
+            else:
+                item = self._get_nowait_with_priority(priority)
+            if not self._is_expired(*item[0:3]):
+                return QueuedAction(item[0], item[1], item[3])
+            self._cancel(item)
+
+    def _get_nowait_with_priority(self, priority: int) -> tuple[Action, datetime, datetime | None, Future | None]:
+        """pops the next item only if it has this priority (i.e. to not mix safety actions with the rest)"""
+        # pylint: disable=protected-access
+        q = self.queue
+        with q.mutex:
+            if q._qsize() == 0 or self.priority(q.queue[0][0].name) != priority:
+                raise Empty
+            item = q._get()
+            q.not_full.notify()
+            return item
+
+    def _put_nowait(self, item: tuple[Action, datetime, datetime | None, Future | None]) -> bool:
+        """
+        Puts the item as per the priorities and the overflow policy without blocking. Atomic, as it's done under the
+        queue's mutex. Priority actions are put after the pending ones of the same or higher priority.
+        """
+        # pylint: disable=protected-access
+        q = self.queue # a FIFO queue.Queue, so q.queue is a deque
+        prio = self.priority(item[0].name)
+        with q.mutex:
+            if prio > 0 and self.cancel_lower:
+                for ix in reversed([i for i, pending in enumerate(q.queue) if self.priority(pending[0].name) < prio]):
+                    self._cancel(pending := q.queue[ix])
+                    self._remove_pending(q, ix)
+                    self.n_cancelled[pending[0].name] = self.n_cancelled.get(pending[0].name, 0) + 1
+            if 0 < q.maxsize <= q._qsize():
+                lowest_prio = min(self.priority(pending[0].name) for pending in q.queue)
+                if prio == 0 and (self.overflow == "drop_newest" or lowest_prio > 0): # don't drop safety actions
+                    self._count_overflow(item[0])
+                    self._cancel(item)
+                    return False
+                same_ixs = [i for i, (action, *_) in enumerate(q.queue) if action.name == item[0].name]
+                if prio == 0 and self.overflow == "replace" and len(same_ixs) > 0:
+                    self._count_overflow(q.queue[same_ixs[0]][0])
+                    self._cancel(q.queue[same_ixs[0]])
+                    q.queue[same_ixs[0]] = item # it takes the place of the replaced one in the queue
+                    return True
+                # drop the oldest of the lowest priority ones. Also for 'block' & 'drop_newest' if it's a priority one,
+                # which only drops lower priority ones: if there are none, it's queued over the queue's capacity
+                if lowest_prio < prio or prio == 0:
+                    drop_ix = min(range(q._qsize()), key=lambda i: (self.priority(q.queue[i][0].name), i))
+                    self._count_overflow(q.queue[drop_ix][0])
+                    self._cancel(q.queue[drop_ix])
+                    self._remove_pending(q, drop_ix)
+            ix = next((i for i, (action, *_) in enumerate(q.queue) if self.priority(action.name) < prio), q._qsize())
+            q.queue.insert(ix, item)
+            q.unfinished_tasks += 1
+            q.not_empty.notify()
+            return True
+
+    @staticmethod
+    def _remove_pending(q: Queue, ix: int):
+        """removes a pending item as if it was consumed (task_done), so Queue.join() doesn't wait for it"""
+        del q.queue[ix]
+        q.unfinished_tasks -= 1
+        if q.unfinished_tasks == 0:
+            q.all_tasks_done.notify_all()
+
+    @staticmethod
+    def _cancel(item: tuple[Action, datetime, datetime | None, Future | None]):
+        """cancels the future of a dropped item (if it was submitted) so the controller waiting on it is notified"""
+        if item[3] is not None:
+            item[3].cancel()
+
+    def _count_overflow(self, dropped: Action):
+        self.n_overflow[dropped.name] = self.n_overflow.get(dropped.name, 0) + 1
+        logger.log_every_s(f"Queue full ({self.overflow}). Dropped: {dropped}. Total: {self.n_overflow}", "DEBUG", True)
+
+    def _is_expired(self, action: Action, action_ts: datetime, data_ts: datetime | None) -> bool:
+        """checks the max ages of the action's name. Expired actions are counted and logged"""
+        now = get_clock().now()
+        data_age_s = None if data_ts is None else (now - data_ts).total_seconds()
+        queue_age_s = (now - action_ts).total_seconds()
+        if (max_age_s := self.max_data_age_s.get(action.name)) is not None and data_age_s is not None \
+                and data_age_s > max_age_s:
+            reason = f"data age: {data_age_s:.3f}s > {max_age_s}s"
+        elif (max_age_s := self.max_queue_age_s.get(action.name)) is not None and queue_age_s > max_age_s:
+            reason = f"queue age: {queue_age_s:.3f}s > {max_age_s}s"
+        else:
+            return False
+        self.n_expired[action.name] = self.n_expired.get(action.name, 0) + 1
+        logger.log_every_s(f"Dropped stale {action} ({reason}). Expired: {self.n_expired}", "DEBUG", True)
+        return True
+
+    def coalesce(self, actions: list[Action]) -> list[Action]:
+        """
+        Merges the actions of the same name using their reduce fn. The merged action takes the place of the last one of
+        its name, so it's applied after the other actions that were queued before it. The rest are kept as they are.
+        """
+        return [action for action, _ in self.coalesce_groups(actions)]
 
-    def get_nowait(self, *args, **kwargs) -> tuple[Action, datetime]:
-        """Remove and return an item from the queue without waiting"""
-        return self.queue.get_nowait(*args, **kwargs)
+    def coalesce_groups(self, actions: list[Action]) -> list[tuple[Action, list[int]]]:
+        """coalesce() that also returns the indices of the actions merged into each one (i.e. for their futures)"""
+        merged: dict[str, Action] = {}
+        ixs: dict[str, list[int]] = {}
+        for i, action in enumerate(actions):
+            if (reduce_fn := self.reduce_fns.get(action.name)) is not None:
+                merged[action.name] = reduce_fn(merged[action.name], action) if action.name in merged else action
+                ixs.setdefault(action.name, []).append(i)
+        return [(merged[action.name], ixs[action.name]) if action.name in merged else (action, [i])
+                for i, action in enumerate(actions) if action.name not in merged or ixs[action.name][-1] == i]
 
     def __len__(self):
         return self.queue.qsize()
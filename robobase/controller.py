@@ -7,7 +7,7 @@ from overrides import overrides
 from .action import Action
 from .data_channel import DataChannel, DataChannelClosedError
 from .actions_queue import ActionsQueue
-from .utils import logger, wait_and_clear
+from .utils import logger, get_clock
 from .types import ControllerFn
 
 INITIAL_DATA_MAX_DURATION_S = 5
@@ -17,11 +17,14 @@ class BaseController(threading.Thread):
     Interface defining the requirements of a data consumer getting data from a DataProducer.
     Users can extend this class and define their scheduling but the default behavior is to provide a controller fn
     and use the default scheduling (data polling) provided in this library.
+    The modalities read by the controller can be declared (None means all of them) so the producers of the modalities
+    that no controller reads are not ran. They can be changed at runtime with set_modalities() (i.e. toggle a HUD).
     """
-    def __init__(self, data_channel: DataChannel, actions_queue: ActionsQueue):
+    def __init__(self, data_channel: DataChannel, actions_queue: ActionsQueue, modalities: list[str] | None = None):
         threading.Thread.__init__(self, daemon=True)
         self._data_channel = data_channel
         self._actions_queue = actions_queue
+        self._modalities = modalities
         self.data_channel_event = self.data_channel.subscribe()
 
     @property
@@ -34,12 +37,28 @@ class BaseController(threading.Thread):
         """The actions where where the action is sent to"""
         return self._actions_queue
 
+    @property
+    def modalities(self) -> list[str] | None:
+        """The modalities read by this controller. None means all of them"""
+        return self._modalities
+
+    def set_modalities(self, modalities: list[str] | None):
+        """changes the modalities read by this controller. Applies starting with the next item produced"""
+        self._modalities = modalities
+        if self.is_alive():
+            self.data_channel.set_demand(self.name, modalities)
+
+    @overrides
+    def start(self):
+        self.data_channel.set_demand(self.name, self.modalities) # the name is set by the Robot after the constructor
+        super().start()
+
 class Controller(BaseController):
     """small wrapper on top of a generic controller for 'planner' kind of controllers with a controller_fn callback."""
     def __init__(self, data_channel: DataChannel, actions_queue: ActionsQueue,
                  controller_fn: ControllerFn = None,
-                 initial_data_max_duration_s: float = INITIAL_DATA_MAX_DURATION_S):
-        super().__init__(data_channel, actions_queue)
+                 initial_data_max_duration_s: float = INITIAL_DATA_MAX_DURATION_S, modalities: list[str] | None = None):
+        super().__init__(data_channel, actions_queue, modalities=modalities)
         assert isinstance(controller_fn, Callable), type(controller_fn)
         self.controller_fn = controller_fn
         self.initial_data_max_duration_s = initial_data_max_duration_s
@@ -48,14 +67,18 @@ class Controller(BaseController):
     def run(self):
         """default data polling scheduling"""
         self.data_channel_event.wait(self.initial_data_max_duration_s) # wait for initial data
+        version = 0
         while self.data_channel.has_data():
-            wait_and_clear(self.data_channel_event) # get new data and set red light again.
-            try:
-                curr_data, data_ts = self.data_channel.get()
+            try: # blocks until a newer item than the last processed one is available. Returns it atomically.
+                curr_data, data_ts, version = self.data_channel.get_since(version, subscriber=self.name)
             except DataChannelClosedError:
                 break
-            logger.log_every_s(f"Processing data (data_ts='{data_ts}')", "DEBUG", True)
+            logger.log_every_s(f"Processing data (data_ts='{data_ts}', version={version})", "DEBUG", True)
             # the planner may also return 0 actions ("IDK" action basically)
             actions: list[Action] = self.controller_fn(curr_data)
             for action in actions:
                 self.actions_queue.put(action, data_ts=data_ts)
+            get_clock().release_work() # done with this item (see DataChannel.track_work)
+        self.data_channel.untrack_work(self.name)
+        self.data_channel.remove_demand(self.name)
+        logger.debug(f"Stopping {self.name}. Stats: {self.data_channel.subscribers_stats.get(self.name)}")
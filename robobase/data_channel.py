@@ -1,13 +1,16 @@
 """data_channel.py - Thread-safe channel to place perception data from the data modules"""
 from __future__ import annotations
 from copy import deepcopy
+from dataclasses import dataclass
 from datetime import datetime
 from pprint import pformat
+from types import MappingProxyType
+from typing import Any
 import threading
 import numpy as np
 
 from robobase.types import DataItem, DataEqFn
-from robobase.utils import logger
+from robobase.utils import logger, get_clock
 from robobase.utils.data_storer import DataStorer
 
 SLEEP_INTERVAL = 0.01
@@ -17,29 +20,95 @@ def _fmt(item: dict[str, DataItem]) -> str:
 
 class DataChannelClosedError(ValueError): pass # pylint: disable=all # noqa
 
+@dataclass
+class SubscriberStats:
+    """per-subscriber counters of the items received via get_since() and the versions skipped in between"""
+    received: int = 0
+    skipped: int = 0
+
+class _FrozenList(tuple):
+    """read-only list used by snapshot channels. Compares equal to lists so eq_fns work the same in both modes."""
+    def __eq__(self, other: Any) -> bool:
+        return list(self) == other if isinstance(other, list) else super().__eq__(other)
+    __hash__ = tuple.__hash__
+
+def _is_frozen_view(arr: np.ndarray) -> bool:
+    """checks if the array is a read-only view of read-only arrays only (i.e. a slice of a frozen frame)"""
+    while isinstance(arr.base, np.ndarray):
+        if arr.flags.writeable:
+            return False
+        arr = arr.base
+    return arr.base is None and not arr.flags.writeable
+
+def _freeze(item: Any) -> Any:
+    """
+    recursively makes an item read-only: np arrays are set non-writeable (in place), dicts and lists become views.
+    Views are copied once, as their base could still change underneath the readers.
+    """
+    if isinstance(item, np.ndarray):
+        if item.base is not None and not _is_frozen_view(item):
+            item = item.copy()
+        item.flags.writeable = False
+        return item
+    if isinstance(item, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in item.items()})
+    if isinstance(item, list):
+        return _FrozenList(_freeze(v) for v in item)
+    if isinstance(item, tuple) and type(item) is tuple: # namedtuples & co. are kept as they are
+        return tuple(_freeze(v) for v in item)
+    return item
+
+def _thaw(item: Any) -> Any:
+    """the inverse of _freeze: returns a writeable (deep) copy of a frozen item"""
+    if isinstance(item, np.ndarray):
+        return item.copy()
+    if isinstance(item, MappingProxyType):
+        return {k: _thaw(v) for k, v in item.items()}
+    if isinstance(item, _FrozenList):
+        return [_thaw(v) for v in item]
+    if isinstance(item, tuple) and type(item) is tuple:
+        return tuple(_thaw(v) for v in item)
+    return deepcopy(item)
+
 class DataChannel:
-    """DataChannel defines the thread-safe data structure where the data producer writes the data and consumers read"""
-    def __init__(self, supported_types: list[str], eq_fn: DataEqFn):
+    """
+    DataChannel defines the thread-safe data structure where the data producer writes the data and consumers read.
+    If snapshot is set, put() freezes the item (read-only np arrays, immutable dicts/lists) and get() returns the same
+    snapshot to all the consumers without copying. Consumers that modify data must use get(copy_modalities=[...]).
+    The arrays are frozen in place, so producers must not reuse (write to) their output buffers in snapshot mode.
+    """
+    def __init__(self, supported_types: list[str], eq_fn: DataEqFn, snapshot: bool = False):
         assert len(supported_types) > 0, "cannot have a data channel that supports no data type (i.e. rgb, pose etc.)"
         self.supported_types = set(supported_types)
         self.eq_fn = eq_fn
+        self.snapshot = snapshot
 
         self._lock = threading.Lock()
+        self._new_data = threading.Condition(self._lock) # notified on every accepted put() and on close()
         self._data: dict[str, DataItem] = {}
         self._data_ts: datetime = datetime(1900, 1, 1)
+        self._modalities_ts: dict[str, datetime] = {} # the ts of the source data of each modality (i.e. async ones)
+        self._version = 0 # incremented on every accepted (non-duplicate) put()
         self._is_closed = False
 
         self._subscribers_events: list[threading.Event] = [] # a list of subscribers that are notified on data change
+        self.subscribers_stats: dict[str, SubscriberStats] = {} # updated by get_since(subscriber=...) calls
+        self._demands: dict[str, set[str] | None] = {} # subscriber -> modalities it reads (None: all). See set_demand()
+        self._work_subscribers: dict[str, bool] = {} # subscriber -> has an unread item. See track_work()
 
     def is_open(self) -> bool:
         """check is the channel is open. Used by other data producers to whether they can continue or not"""
         return not self._is_closed
 
-    def put(self, item: dict[str, DataItem]):
-        """Put data into the queue"""
-        data_ts = datetime.now()
+    def put(self, item: dict[str, DataItem], modalities_ts: dict[str, datetime] | None = None):
+        """
+        Put data into the queue. modalities_ts is the timestamp of the source data (i.e. raw frame) of each modality.
+        If not provided, all the modalities are considered produced now. See get_modalities_ts().
+        """
+        data_ts = get_clock().now()
         assert isinstance(item, dict), type(item)
         assert (ks := set(item.keys())) == (st := self.supported_types), f"Data keys: {ks} vs. Supported types: {st}"
+        assert modalities_ts is None or modalities_ts.keys() == item.keys(), (modalities_ts, item.keys())
         with self._lock:
             if not self.is_open():
                 raise DataChannelClosedError("Channel is closed, cannot put data.")
@@ -54,18 +123,65 @@ class DataChannel:
             for subscriber_event in self._subscribers_events: # announce each 'subscriber' of new data too
                 subscriber_event.set()
 
-            self._data = item
+            self._data = _freeze(item) if self.snapshot else item
             self._data_ts = data_ts
-
-    def get(self, return_copy: bool=True) -> tuple[dict[str, DataItem], datetime]:
+            self._modalities_ts = modalities_ts or {k: data_ts for k in item}
+            self._version += 1
+            for subscriber, pending in self._work_subscribers.items():
+                if not pending: # a newer item replaces the unread one, so the work is the same
+                    self._work_subscribers[subscriber] = True
+                    get_clock().add_work()
+            self._new_data.notify_all()
+
+    def get(self, return_copy: bool=True, copy_modalities: list[str] | None = None) \
+            -> tuple[dict[str, DataItem], datetime]:
         """
         Return the current item from the channel + its the timestamp when it was received.
         Optionally allows to return the actual reference which may be invalidated when new data arives.
+        For snapshot channels, return_copy is ignored as the read-only snapshot is safe to share between consumers.
+        If copy_modalities is set, only these modalities are (deep) copied and writeable, the rest are references.
         """
         with self._lock:
-            if not self.is_open():
-                raise DataChannelClosedError("Channel is closed, cannot get data.")
-            return (deepcopy(self._data), deepcopy(self._data_ts)) if return_copy else (self._data, self._data_ts)
+            return self._get(return_copy, copy_modalities)
+
+    def get_since(self, version: int, timeout: float | None = None, subscriber: str | None = None,
+                  return_copy: bool=True, copy_modalities: list[str] | None = None) \
+            -> tuple[dict[str, DataItem], datetime, int]:
+        """
+        Blocks until an item newer than 'version' is put and returns it atomically with its timestamp and its version.
+        If the timeout expires first, the current item is returned, so callers must check if the version changed.
+        If subscriber is set, the number of received items and skipped versions are counted in subscribers_stats.
+        """
+        with self._lock:
+            self._new_data.wait_for(lambda: self._version > version or not self.is_open(), timeout)
+            data, data_ts = self._get(return_copy, copy_modalities)
+            if subscriber is not None and self._version > version:
+                stats = self.subscribers_stats.setdefault(subscriber, SubscriberStats())
+                stats.received += 1
+                stats.skipped += self._version - version - 1 if version > 0 else 0
+                if self._work_subscribers.get(subscriber, False):
+                    self._work_subscribers[subscriber] = False
+                    get_clock().take_work()
+            return data, data_ts, self._version
+
+    def _get(self, return_copy: bool, copy_modalities: list[str] | None) -> tuple[dict[str, DataItem], datetime]:
+        """the implementation of get(). Must be called with the lock held."""
+        if not self.is_open():
+            raise DataChannelClosedError("Channel is closed, cannot get data.")
+        if copy_modalities is not None:
+            assert (diff := set(copy_modalities) - self.supported_types) == set(), f"Unknown modalities: {diff}"
+            return {**self._data, **{k: _thaw(self._data[k]) for k in copy_modalities}}, self._data_ts
+        if self.snapshot or not return_copy:
+            return self._data, self._data_ts
+        return deepcopy(self._data), self._data_ts
+
+    def get_modalities_ts(self) -> dict[str, datetime]:
+        """
+        Returns the timestamp of the source data of each modality of the current item. Slow (async) producers may be
+        computed from older data than the fast ones, so this can be used to check how stale each modality is.
+        """
+        with self._lock:
+            return self._modalities_ts
 
     def has_data(self) -> bool:
         """Checks if the channel has data"""
@@ -76,8 +192,11 @@ class DataChannel:
         """Closes the channel"""
         with self._lock:
             self._is_closed = True
+            get_clock().cancel_work(sum(self._work_subscribers.values()))
+            self._work_subscribers = {}
             for subscriber_event in self._subscribers_events:
                 subscriber_event.set() # set green light so the subscribers don't block forever
+            self._new_data.notify_all() # wake up the get_since() callers as well
 
     def subscribe(self) -> threading.Event:
         """subscribe to this data channel, receiving a threading.Event object"""
@@ -85,5 +204,48 @@ class DataChannel:
             self._subscribers_events.append(res := threading.Event())
         return res
 
+    def set_demand(self, subscriber: str, modalities: list[str] | None):
+        """
+        Declares the modalities read by a subscriber (i.e. a controller), None meaning all of them. The producers of the
+        modalities that no subscriber reads are skipped by DataProducers2Channels: these modalities keep their last
+        produced value and timestamp (see get_modalities_ts), or are None if they were never produced.
+        """
+        assert modalities is None or (diff := set(modalities) - self.supported_types) == set(), f"Unknown: {diff}"
+        with self._lock:
+            self._demands[subscriber] = None if modalities is None else set(modalities)
+
+    def remove_demand(self, subscriber: str):
+        """removes the modalities declared by a subscriber (i.e. a controller that stopped)"""
+        with self._lock:
+            self._demands.pop(subscriber, None)
+
+    def track_work(self, subscriber: str):
+        """
+        The clock waits for this subscriber to read each new item with get_since(subscriber=...) and to release it (see
+        Clock.release_work). Used by Controller so a virtual time doesn't run ahead of the controllers.
+        """
+        with self._lock:
+            self._work_subscribers.setdefault(subscriber, False)
+
+    def untrack_work(self, subscriber: str):
+        """stops waiting for a subscriber (i.e. a controller that stopped)"""
+        with self._lock:
+            if self._work_subscribers.pop(subscriber, False):
+                get_clock().cancel_work()
+
+    def get_demanded_modalities(self) -> set[str]:
+        """
+        Returns the modalities read by at least one subscriber. All of them if no subscriber declared its modalities
+        or if any subscriber reads all of them. If the items are logged (DataStorer), the stored ones are added too.
+        """
+        with self._lock:
+            if len(self._demands) == 0 or any(v is None for v in self._demands.values()):
+                return set(self.supported_types)
+            res = set().union(*self._demands.values())
+        if (storer := DataStorer.get_instance()) is not None:
+            res |= storer.policy.stored_modalities("DataChannel", self.supported_types)
+        return res
+
     def __repr__(self) -> str:
-        return f"[DataChannel] Types: {self.supported_types}. Has data: {self.has_data()}. Open: {self.is_open()}."
+        return (f"[DataChannel] Types: {self.supported_types}. Has data: {self.has_data()}. Open: {self.is_open()}."
+                f"{' Snapshot.' if self.snapshot else ''}")
@@ -1,11 +1,18 @@
 """data_producer.py - interface for DataProducer which are used to produce data to be stored in a DataChannel"""
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Callable
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from hashlib import blake2b
+from typing import Callable, Hashable
+import pickle
+import threading
 from overrides import overrides
+import numpy as np
 
 from .types import DataItem
-from .utils import parsed_str_type
+from .utils import parsed_str_type, freq_barrier, LatestSlot, BatchQueue, logger, get_clock, item_nbytes
 from .environment import Environment
 
 class DataProducer(ABC):
@@ -20,6 +27,10 @@ class DataProducer(ABC):
     def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
         """produces the data at the current time given the dependencies, if any"""
 
+    def produce_batch(self, deps_batch: list[dict[str, DataItem] | None]) -> list[dict[str, DataItem]]:
+        """produces the data of a batch of items. Override it if the producer is faster on batches (i.e. NNs)"""
+        return [self.produce(deps) for deps in deps_batch]
+
     @property
     def modalities(self) -> list[str]:
         """The list of modalities of this data producer"""
@@ -53,3 +64,204 @@ class RawDataProducer(DataProducer):
     @overrides
     def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
         return self.env.get_state()
+
+class AsyncDataProducer(DataProducer):
+    """
+    Wraps a (slow) DataProducer so it runs in its own thread, at most at 'frequency' Hz or as fast as possible if None.
+    produce() doesn't wait for the wrapped producer (except for its very first output): it hands over the latest deps
+    to the thread and returns the latest available output. This way, the fast modalities (i.e. raw rgb) are published
+    at their own rate and the slow ones (i.e. a segmentation network) are merged in as they become available.
+    Use produce_async() to also get the timestamp of the source data of the returned output (i.e. to check staleness).
+    """
+    def __init__(self, data_producer: DataProducer, frequency: float | None = None):
+        assert isinstance(data_producer, DataProducer), type(data_producer)
+        assert frequency is None or frequency > 0, frequency
+        super().__init__(modalities=data_producer.modalities, dependencies=data_producer.dependencies)
+        self.data_producer = data_producer
+        self.frequency = frequency
+
+        self._inputs = LatestSlot()
+        self._lock = threading.Lock()
+        self._output_ready = threading.Event()
+        self._output: dict[str, DataItem] | None = None
+        self._output_ts: datetime | None = None
+        self._exception: Exception | None = None
+        self._thread: threading.Thread | None = None
+
+    @overrides
+    def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        return self.produce_async(deps, deps_ts=get_clock().now())[0]
+
+    def produce_async(self, deps: dict[str, DataItem] | None, deps_ts: datetime) \
+            -> tuple[dict[str, DataItem], datetime]:
+        """returns the latest output and the timestamp of the deps it was computed from. deps_ts is the ts of deps"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker_fn, daemon=True, name=f"Async-{self.modalities}")
+            self._thread.start()
+        # only the dependencies are handed over, as the caller may update the deps dict while we are using it
+        self._inputs.put(({k: (deps or {})[k] for k in self.dependencies}, deps_ts))
+        self._output_ready.wait()
+        with self._lock:
+            if self._exception is not None:
+                raise self._exception
+            return self._output, self._output_ts
+
+    def _worker_fn(self):
+        prev_time = datetime(1900, 1, 1)
+        try:
+            while True:
+                if self.frequency is not None:
+                    prev_time = freq_barrier(self.frequency, prev_time)
+                deps, deps_ts = self._inputs.take()
+                output = self.data_producer.produce(deps=deps)
+                with self._lock:
+                    self._output, self._output_ts = output, deps_ts
+                self._output_ready.set()
+        except Exception as e:
+            logger.error(f"Producer '{self.data_producer}' failed in its async thread: {e}")
+            with self._lock:
+                self._exception = e
+            self._output_ready.set()
+
+    def __repr__(self):
+        return f"[AsyncDataProducer] {self.data_producer}. Frequency: {self.frequency or 'max'}"
+
+class BatchedDataProducer(DataProducer):
+    """
+    Wraps a DataProducer implementing produce_batch() (i.e. a NN on CPU) so the frames are processed in micro-batches
+    of up to 'batch_size' items, waiting at most 'max_wait_s' for a batch to fill up. It trades single-frame latency for
+    throughput, so it's mainly useful for offline replays and multi-camera setups:
+    - in DataProducers2Channels, the stage of this producer takes the pending items from a bounded FIFO (not only the
+      latest one) and calls produce_batch() on them.
+    - produce() calls from multiple threads (i.e. one pipeline per camera sharing the same model) are collected by
+      a scheduler thread which calls produce_batch() on them. Each call blocks until its own output is ready.
+    """
+    def __init__(self, data_producer: DataProducer, batch_size: int, max_wait_s: float = 0.01):
+        assert isinstance(data_producer, DataProducer), type(data_producer)
+        assert batch_size > 0 and max_wait_s >= 0, (batch_size, max_wait_s)
+        super().__init__(modalities=data_producer.modalities, dependencies=data_producer.dependencies)
+        self.data_producer = data_producer
+        self.batch_size = batch_size
+        self.max_wait_s = max_wait_s
+
+        self._requests = BatchQueue(maxsize=batch_size * 2)
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+
+    @overrides
+    def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._scheduler_fn, daemon=True, name=f"Batch-{self.modalities}")
+                self._thread.start()
+        # only the dependencies are handed over, as the caller may update the deps dict while we are using it
+        future: Future = Future()
+        self._requests.put(({k: (deps or {})[k] for k in self.dependencies}, future))
+        return future.result()
+
+    @overrides
+    def produce_batch(self, deps_batch: list[dict[str, DataItem] | None]) -> list[dict[str, DataItem]]:
+        res = self.data_producer.produce_batch(deps_batch)
+        assert len(res) == len(deps_batch), f"Producer '{self.data_producer}' returned {len(res)}/{len(deps_batch)}"
+        return res
+
+    def _scheduler_fn(self):
+        while True:
+            requests: list[tuple[dict[str, DataItem], Future]] = \
+                self._requests.take_batch(self.batch_size, self.max_wait_s)
+            try:
+                outputs = self.produce_batch([deps for deps, _ in requests])
+            except Exception as e:
+                logger.error(f"Producer '{self.data_producer}' failed on a batch of {len(requests)}: {e}")
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            for (_, future), output in zip(requests, outputs):
+                future.set_result(output)
+
+    def __repr__(self):
+        return f"[BatchedDataProducer] {self.data_producer}. Batch size: {self.batch_size}. Wait: {self.max_wait_s}s"
+
+def _hash_deps(deps: dict[str, DataItem]) -> bytes:
+    """a fast content hash of the dependencies. numpy arrays are hashed by their raw bytes, the rest are pickled"""
+    hasher = blake2b(digest_size=16)
+    for k in sorted(deps):
+        v = deps[k]
+        hasher.update(k.encode())
+        if isinstance(v, np.ndarray) and v.dtype != object:
+            hasher.update(f"{v.dtype.str}{v.shape}".encode())
+            hasher.update(np.ascontiguousarray(v).data)
+        else:
+            hasher.update(pickle.dumps(v))
+    return hasher.digest()
+
+class CachedDataProducer(DataProducer):
+    """
+    Wraps a (slow) DataProducer with a LRU cache of its outputs, so re-visited frames (i.e. pausing or scrubbing a
+    video, replaying logs in a loop) cost a dict lookup instead of an inference. The cache is keyed by key_fn(deps)
+    (i.e. lambda deps: deps["frame_ix"]) or, if not provided, by a content hash of the dependencies. The oldest entries
+    are evicted when the outputs' total size exceeds 'max_bytes'.
+    Note: the cached outputs are returned as they are (no copy), so they must not be modified inplace by the consumers.
+    """
+    def __init__(self, data_producer: DataProducer, max_bytes: int,
+                 key_fn: Callable[[dict[str, DataItem]], Hashable] | None = None):
+        assert isinstance(data_producer, DataProducer), type(data_producer)
+        assert max_bytes > 0, max_bytes
+        super().__init__(modalities=data_producer.modalities, dependencies=data_producer.dependencies)
+        self.data_producer = data_producer
+        self.max_bytes = max_bytes
+        self.key_fn = key_fn
+
+        self._cache: OrderedDict[Hashable, tuple[dict[str, DataItem], int]] = OrderedDict() # key -> (output, nbytes)
+        self._lock = threading.Lock()
+        self.n_bytes = 0
+        self.n_hits = 0
+        self.n_misses = 0
+
+    @overrides
+    def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        return self.produce_batch([deps])[0]
+
+    @overrides
+    def produce_batch(self, deps_batch: list[dict[str, DataItem] | None]) -> list[dict[str, DataItem]]:
+        keys = [self._key(deps or {}) for deps in deps_batch]
+        res: list[dict[str, DataItem] | None] = [self._get(key) for key in keys]
+        if len(miss_ixs := [i for i, output in enumerate(res) if output is None]) == 0:
+            return res
+        miss_deps = [deps_batch[i] for i in miss_ixs]
+        outputs = [self.data_producer.produce(miss_deps[0])] if len(miss_deps) == 1 \
+            else self.data_producer.produce_batch(miss_deps)
+        for i, output in zip(miss_ixs, outputs, strict=True):
+            res[i] = output
+            self._put(keys[i], output)
+        return res
+
+    def _key(self, deps: dict[str, DataItem]) -> Hashable:
+        return self.key_fn(deps) if self.key_fn is not None else _hash_deps({k: deps[k] for k in self.dependencies})
+
+    def _get(self, key: Hashable) -> dict[str, DataItem] | None:
+        with self._lock:
+            if (entry := self._cache.get(key)) is None:
+                self.n_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.n_hits += 1
+            return entry[0]
+
+    def _put(self, key: Hashable, output: dict[str, DataItem]):
+        if (nbytes := item_nbytes(output)) > self.max_bytes: # would evict everything and still not fit
+            return
+        with self._lock:
+            if (prev := self._cache.pop(key, None)) is not None:
+                self.n_bytes -= prev[1]
+            self._cache[key] = (output, nbytes)
+            self.n_bytes += nbytes
+            while self.n_bytes > self.max_bytes:
+                self.n_bytes -= self._cache.popitem(last=False)[1][1]
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return (f"[CachedDataProducer] {self.data_producer}. Entries: {len(self)}. "
+                f"Size: {self.n_bytes}/{self.max_bytes} bytes. Hits: {self.n_hits}. Misses: {self.n_misses}")
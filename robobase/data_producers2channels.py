@@ -1,13 +1,18 @@
 """data_producers2channels.py implements the mapping between a list of producers and a list of channels"""
+from datetime import datetime
+from queue import Queue
+from typing import Callable
 import threading
 import time
 import traceback
 
-from .utils import ThreadGroup, logger
-from .types import DataItem
-from .data_producer import DataProducer
+from .utils import ThreadGroup, LatestSlot, BatchQueue, logger, get_clock
+from .types import DataItem, DataEqFn
+from .data_producer import DataProducer, AsyncDataProducer, BatchedDataProducer
 from .data_channel import DataChannel, DataChannelClosedError
 
+STAGE_TIMEOUT_S = 0.1 # how often a pipeline stage waiting for inputs checks if it should stop
+
 def _topo_sort_producers(producers: list[DataProducer]) -> list[DataProducer]:
     """does a topological sort of the data producers given their dependencies and their modalities"""
     consumers: dict[str, list[int]] = {} # Map dependency string -> list of consumer indices
@@ -33,6 +38,72 @@ def _topo_sort_producers(producers: list[DataProducer]) -> list[DataProducer]:
         raise ValueError("couldn't solve")
     return res
 
+def _topo_levels(producers: list[DataProducer]) -> list[list[DataProducer]]:
+    """groups the (topo-sorted) producers in levels. A level depends only on the previous ones, not on itself."""
+    modality_level: dict[str, int] = {}
+    res: list[list[DataProducer]] = []
+    for producer in _topo_sort_producers(producers):
+        level = max((modality_level[dep] + 1 for dep in producer.dependencies), default=0)
+        modality_level |= {modality: level for modality in producer.modalities}
+        res.extend([] for _ in range(level - len(res) + 1))
+        res[level].append(producer)
+    return res
+
+def _produce(data_producer: DataProducer, items: list[tuple[dict[str, DataItem], dict[str, datetime]]]) \
+        -> list[tuple[dict[str, DataItem], datetime]]:
+    """
+    Calls one producer on a batch of (data, data_ts) items given the data of the previous ones and returns its data and
+    the timestamp of its source data for each item: the oldest of its deps' timestamps (data_ts) or now if it has no
+    deps. The items are not modified. Batches of 1 item (the default) are produced with produce(), not produce_batch().
+    """
+    deps_ts = [min((data_ts[dep] for dep in data_producer.dependencies), default=None) for _, data_ts in items]
+    if isinstance(data_producer, AsyncDataProducer): # its output may be computed from older deps than the current ones
+        res = [data_producer.produce_async(deps=data, deps_ts=ts or get_clock().now())
+               for (data, _), ts in zip(items, deps_ts)]
+    elif len(items) == 1 and not isinstance(data_producer, BatchedDataProducer): # its produce() goes via its scheduler
+        res = [(data_producer.produce(deps=items[0][0]), deps_ts[0] or get_clock().now())]
+    else:
+        batch = data_producer.produce_batch([data for data, _ in items])
+        res = [(producer_data, ts or get_clock().now()) for producer_data, ts in zip(batch, deps_ts, strict=True)]
+    for producer_data, _ in res:
+        assert isinstance(producer_data, dict), f"Producer '{data_producer}' didn't produce a dict: {producer_data}"
+        if (A := set(producer_data.keys())) != set(B := data_producer.modalities):
+            raise KeyError(f"Producer '{data_producer}' with modalities {B} produced {A}.")
+    return res
+
+class _ProducerWorker(threading.Thread):
+    """
+    Daemon thread that calls one producer on request. Used to run the producers of the same level concurrently.
+    Note: we don't use a ThreadPoolExecutor because its threads are joined at exit and producers (i.e. the raw one
+    waiting for the env) may block forever.
+    """
+    def __init__(self, data_producer: DataProducer, name: str):
+        super().__init__(daemon=True, name=name)
+        self.data_producer = data_producer
+        self._requests: Queue[list[tuple[dict[str, DataItem], dict[str, datetime]]]] = Queue(maxsize=1)
+        self._results: Queue[tuple[bool, list[tuple[dict[str, DataItem], datetime]] | Exception]] = Queue(maxsize=1)
+
+    def submit(self, items: list[tuple[dict[str, DataItem], dict[str, datetime]]]):
+        """requests a produce call given the data of the previous levels (per item). Get its outputs with result()"""
+        self._requests.put(items)
+
+    def result(self) -> list[tuple[dict[str, DataItem], datetime]]:
+        """waits for the outputs of the previously submitted produce call. Raises its exception if it failed"""
+        ok, res, n_work = self._results.get()
+        get_clock().take_work(n_work) # i.e. a raw producer read the env: the stage hands the item over, not us
+        if not ok:
+            raise res
+        return res
+
+    def run(self):
+        while True:
+            items = self._requests.get()
+            try:
+                res = (True, _produce(self.data_producer, items))
+            except Exception as e:
+                res = (False, e)
+            self._results.put((*res, get_clock().transfer_work()))
+
 class _DataProducerList:
     """
     _DataProducerList implements a 1 channel : M producers (assumed topo-sorted) graph where all M write to it.
@@ -50,52 +121,183 @@ class _DataProducerList:
     def produce_all(self) -> dict[str, DataItem]:
         """Calls all the producers in topological order and synchronous"""
         data: dict[str, DataItem] = {}
+        data_ts: dict[str, datetime] = {}
         for data_producer in self.data_producers:
-            producer_data = data_producer.produce(deps=data)
-            assert isinstance(producer_data, dict), f"Producer '{data_producer}' didn't produce a dict: {producer_data}"
-            if (A := set(producer_data.keys())) != set(B := data_producer.modalities):
-                raise KeyError(f"Producer '{data_producer}' with modalities {B} produced {A}.")
+            [(producer_data, producer_ts)] = _produce(data_producer, [(data, data_ts)])
             data |= producer_data
+            data_ts |= {k: producer_ts for k in producer_data}
         return data
 
+def make_produce_all_fn(data_channel: DataChannel, data_producers: list[DataProducer]) \
+        -> Callable[[], dict[str, DataItem]]:
+    """returns a fn that calls all the producers of a channel synchronously (in topological order), i.e. for lockstep"""
+    return _DataProducerList(data_channel, _topo_sort_producers(data_producers)).produce_all
+
 class DataProducers2Channels(threading.Thread):
     """
-    DataProducers2Channels is a generalization of DataProducerList from 1 channel : M producers to N : M.
-    The end-goal is to have a async-based where we actually have one thread per DataProducer. Right now this is just
-    a generalization of the (sync) DataProducerList, so each underlying may do the same work multiple times.
+    DataProducers2Channels is a generalization of DataProducerList from 1 channel : M producers to N : M, ran as a
+    pipeline with one stage per topological level. Only the demanded modalities are produced and duplicates are
+    rejected after the raw producers (raw_eq_fn). See 'Design notes' in the README.
     """
-    def __init__(self, data_producers: list[DataProducer], data_channels: list[DataChannel]):
+    def __init__(self, data_producers: list[DataProducer], data_channels: list[DataChannel],
+                 raw_eq_fn: DataEqFn | None = None):
         assert isinstance(dps := data_producers, list) and all(isinstance(dp, DataProducer) for dp in dps), dps
         assert isinstance(dcs := data_channels, list) and all(isinstance(dc, DataChannel) for dc in dcs), dcs
         super().__init__(daemon=True)
         self.data_channels = data_channels
-        self.data_producers = _topo_sort_producers(data_producers)
+        self.raw_eq_fn = raw_eq_fn
         self._data_producer_lists: list[_DataProducerList] = [] # mostlfy for debugging, see test_i_DataProducers2DCs
+        for data_channel in data_channels:
+            channel_dps = [dp for dp in _topo_sort_producers(data_producers)
+                           if any(dp_mod in data_channel.supported_types for dp_mod in dp.modalities)]
+            self._data_producer_lists.append(_DataProducerList(data_channel, data_producers=channel_dps))
+        # the shared graph: all the producers used by at least one channel, evaluated once per item, level by level.
+        self._levels = _topo_levels([dp for dp in data_producers
+                                     if any(dp in dp_list.data_producers for dp_list in self._data_producer_lists)])
+        self.data_producers = [dp for level in self._levels for dp in level]
+        # emit_channels[j] = the channels that have all their modalities once the j-th stage (level) is done
+        self._emit_channels: list[list[DataChannel]] = [[] for _ in range(len(self._levels))]
+        for dp_list in self._data_producer_lists:
+            last_stage = max(i for i, level in enumerate(self._levels)
+                             if any(dp in level for dp in dp_list.data_producers))
+            self._emit_channels[last_stage].append(dp_list.data_channel)
+        # the raw modalities (of producers without deps) are complete after the first level. We check duplicates there.
+        self._raw_modalities = [modality for dp in self._levels[0] for modality in dp.modalities]
+        self._prev_raw_data: dict[str, DataItem] | None = None
+        self._last_produced: dict[str, tuple[DataItem, datetime]] = {} # modality -> its last produced value and ts
+        self.n_duplicates = 0 # number of items dropped before running the non-raw producers
 
+        self._stop_event = threading.Event() # set when any of the stages stops so all the other stages stop as well
+        # slots[j] is the input of stage j: a FIFO of up to 2 batches for batched levels, the latest item otherwise
+        batched_levels = [[dp for dp in level if isinstance(dp, BatchedDataProducer)] for level in self._levels]
+        self._batch_sizes = [max((dp.batch_size for dp in level), default=1) if j > 0 else 1 # raw: no inputs
+                             for j, level in enumerate(batched_levels)]
+        self._max_waits_s = [min((dp.max_wait_s for dp in level), default=0) for level in batched_levels]
+        self._slots = [BatchQueue(maxsize=2 * batch_size) if batch_size > 1 else LatestSlot()
+                       for batch_size in self._batch_sizes]
+        # the first producer of each level runs in the stage's thread, the others in their own worker (if any)
+        self._level_workers = [[_ProducerWorker(dp, name=f"DP-{j}-{k}") for k, dp in enumerate(level[1:], start=1)]
+                               for j, level in enumerate(self._levels)]
         self.workers = ThreadGroup()
-        for i, data_channel in enumerate(data_channels):
-            channel_dps = []
-            for dp in self.data_producers:
-                if any(dp_mod in data_channel.supported_types for dp_mod in dp.modalities):
-                    channel_dps.append(dp)
-            self._data_producer_lists.append(_DataProducerList(data_channel=data_channel, data_producers=channel_dps))
-            self.workers[f"DPList-{i}"] = threading.Thread(target=self._worker_fn, daemon=True, name=f"DPList-{i}",
-                                                           args=(self._data_producer_lists[-1], ))
+        for j in range(len(self._levels)):
+            self.workers[f"DP-{j}"] = threading.Thread(target=self._stage_fn, args=(j, ), daemon=True, name=f"DP-{j}")
 
     def run(self):
+        for worker in sum(self._level_workers, []):
+            worker.start()
         self.workers.start()
         while not self.workers.is_any_dead():
             time.sleep(1)
 
-    def _worker_fn(self, dp_list: _DataProducerList):
-        # This function operates at one DataChannel and the DataProducers of this singular channel. We have 1 thread for
-        # each DataChannel and its list.
-        while True:
+    def close(self):
+        """stops all the pipeline stages. Called by ThreadGroup.join()"""
+        self._stop_event.set()
+
+    def _produce_level(self, ix: int, items: list[tuple[dict[str, DataItem], dict[str, datetime]]]):
+        """calls the producers of the ix-th level, concurrently if more than one, and adds their modalities (inplace)"""
+        # the items for which each producer runs: its modalities are already set if it was pruned
+        dp_items = [[item for item in items if not any(m in item[0] for m in dp.modalities)] for dp in self._levels[ix]]
+        # they only read data of the previous levels, so they can share it as we update it after all of them are done
+        for worker, worker_items in zip(self._level_workers[ix], dp_items[1:]):
+            if len(worker_items) > 0:
+                worker.submit(worker_items)
+        outputs = []
+        try:
+            outputs.append(_produce(self._levels[ix][0], dp_items[0]) if len(dp_items[0]) > 0 else [])
+        finally: # always wait for the workers, so their results are not mixed with the ones of the next item
+            outputs.extend(worker.result() if len(worker_items) > 0 else []
+                           for worker, worker_items in zip(self._level_workers[ix], dp_items[1:]))
+        for producer_items, producer_outputs in zip(dp_items, outputs):
+            for (data, data_ts), (producer_data, producer_ts) in zip(producer_items, producer_outputs):
+                data |= producer_data
+                data_ts |= {k: producer_ts for k in producer_data}
+                self._last_produced |= {k: (v, producer_ts) for k, v in producer_data.items()}
+
+    def _pruned_modalities(self) -> list[str]:
+        """the modalities of the (non-raw) producers whose outputs are not needed by any channel, even as dependency"""
+        needed = set().union(*(dc.get_demanded_modalities() for dc in self.data_channels if dc.is_open()))
+        for dp in reversed(self.data_producers): # topo-sorted, so we see the consumers before their dependencies
+            if any(m in needed for m in dp.modalities):
+                needed |= set(dp.dependencies)
+        return [m for level in self._levels[1:] for dp in level if not any(m in needed for m in dp.modalities)
+                for m in dp.modalities]
+
+    def _take(self, ix: int) -> list[tuple[dict[str, DataItem], dict[str, datetime]]]:
+        """takes the pending item(s) of the ix-th stage: the latest one or a batch for batched levels. [] if none yet"""
+        if ix == 0: # the raw producers have no inputs
+            return [({}, {})]
+        if self._batch_sizes[ix] > 1:
+            res = self._slots[ix].take_batch(self._batch_sizes[ix], self._max_waits_s[ix], timeout=STAGE_TIMEOUT_S)
+        else:
+            res = [item] if (item := self._slots[ix].take(timeout=STAGE_TIMEOUT_S)) is not None else []
+        get_clock().take_work(len(res))
+        return res
+
+    def _hand_over(self, ix: int, item: tuple[dict[str, DataItem], dict[str, datetime]]):
+        """gives an item to the ix-th stage. Waits for a free spot if it's batched, as we don't drop items there"""
+        get_clock().add_work() # before the put, as the next stage may take (and release) the item right away
+        if self._batch_sizes[ix] == 1:
+            if self._slots[ix].put(item): # overwritten: its work is the new item's one
+                get_clock().cancel_work()
+            return
+        while not self._slots[ix].put(item, timeout=STAGE_TIMEOUT_S):
+            if self._stop_event.is_set():
+                get_clock().cancel_work()
+                return
+
+    def _is_duplicate(self, data: dict[str, DataItem]) -> bool:
+        """checks if the raw modalities are the same as the previous ones using raw_eq_fn or the channels' eq_fn"""
+        raw_data = {k: data[k] for k in self._raw_modalities}
+        prev_raw_data, self._prev_raw_data = self._prev_raw_data, raw_data
+        if prev_raw_data is None:
+            return False
+        if self.raw_eq_fn is not None:
+            return self.raw_eq_fn(raw_data, prev_raw_data)
+        for data_channel in self.data_channels:
+            try:
+                if not data_channel.eq_fn(raw_data, prev_raw_data):
+                    return False
+            except (KeyError, TypeError): # the channel's eq_fn uses non-raw modalities too, so we can't tell early
+                return False
+        return True
+
+    def _emit(self, ix: int, data: dict[str, DataItem], data_ts: dict[str, datetime]):
+        """puts the subset of modalities of each channel that is complete after the ix-th stage"""
+        for data_channel in self._emit_channels[ix]:
+            try:
+                data_channel.put({k: data[k] for k in data_channel.supported_types},
+                                 modalities_ts={k: data_ts[k] for k in data_channel.supported_types})
+            except DataChannelClosedError: # the other channels may still be open
+                pass
+        if all(not data_channel.is_open() for data_channel in self.data_channels):
+            raise DataChannelClosedError("All the channels are closed.")
+
+    def _stage_fn(self, ix: int):
+        # This function operates at one level (stage ix) of the shared pipeline. The first stage has no inputs (i.e. raw
+        # data) and each stage writes to the channels that are complete after it.
+        while not self._stop_event.is_set():
             try:
-                data = dp_list.produce_all()
-                dp_list.data_channel.put(data)
-            except DataChannelClosedError: # in case it closes between is_open() check and put(data)
+                if len(items := self._take(ix)) == 0:
+                    continue
+                self._produce_level(ix, items)
+                for data, data_ts in items:
+                    if ix == 0 and self._is_duplicate(data):
+                        self.n_duplicates += 1
+                        continue
+                    if ix == 0 and len(pruned := self._pruned_modalities()) > 0: # decided once per item for all stages
+                        logger.log_every_s(f"Not demanded by any subscriber: {pruned}", "DEBUG")
+                        # the last produced values with their (older) timestamps. None if never produced
+                        last = {m: self._last_produced.get(m, (None, get_clock().now())) for m in pruned}
+                        data |= {m: v for m, (v, _) in last.items()}
+                        data_ts |= {m: ts for m, (_, ts) in last.items()}
+                    self._emit(ix, data, data_ts)
+                    if ix < len(self._slots) - 1:
+                        self._hand_over(ix + 1, (data, data_ts))
+            except DataChannelClosedError: # all the channels are closed
                 break
             except Exception as e:
                 logger.error(f"Error {e}\nTraceback: {traceback.format_exc()}")
                 break
+            finally: # the item(s) were handed over to the next stage and channels (i.e. to the controllers)
+                get_clock().release_work()
+        self._stop_event.set()
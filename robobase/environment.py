@@ -1,12 +1,11 @@
 """environment.py - Script defining an interface for environments where a robot exists in"""
 from abc import ABC, abstractmethod
-import threading
-from robobase.utils import parsed_str_type, logger
+from robobase.utils import parsed_str_type, logger, WorkEvent
 
 class Environment(ABC):
     """Generic environment for robots."""
     def __init__(self):
-        self.data_ready = threading.Event()
+        self.data_ready = WorkEvent() # so a virtual clock waits for the state to be read (see VirtualClock)
 
     @abstractmethod
     def get_state(self) -> dict:
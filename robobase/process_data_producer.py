@@ -0,0 +1,153 @@
+"""process_data_producer.py - runs a DataProducer in a worker process so CPU-heavy (GIL-bound) ones use more cores"""
+from __future__ import annotations
+from dataclasses import dataclass
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+import atexit
+import threading
+import traceback
+from overrides import overrides
+import numpy as np
+
+from .data_producer import DataProducer
+from .types import DataItem
+from .utils import logger
+
+@dataclass(frozen=True)
+class _SharedArray:
+    """the picklable description of a numpy array stored in a shared memory block"""
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+class _SharedArrays:
+    """
+    Shared memory blocks (one per modality) that are owned (created & unlinked) by one side of the process pair.
+    The blocks are reused between calls as long as the arrays fit in them, so we don't allocate at every frame.
+    """
+    def __init__(self):
+        self._blocks: dict[str, SharedMemory] = {}
+
+    def pack(self, data: dict[str, DataItem]) -> dict[str, DataItem | _SharedArray]:
+        """copies the numpy arrays to shared memory. Other items (i.e. lists, object arrays) are pickled as they are"""
+        res = {}
+        for k, v in data.items():
+            if not isinstance(v, np.ndarray) or v.dtype == object or v.nbytes == 0:
+                res[k] = v
+                continue
+            if (block := self._blocks.get(k)) is None or block.size < v.nbytes:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+                block = self._blocks[k] = SharedMemory(create=True, size=v.nbytes)
+            np.ndarray(v.shape, dtype=v.dtype, buffer=block.buf)[:] = v
+            res[k] = _SharedArray(block.name, v.shape, v.dtype.str)
+        return res
+
+    def close(self):
+        """releases all the shared memory blocks"""
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+
+class _AttachedArrays:
+    """Shared memory blocks created by the other process of the pair. We only read from them, never unlink them."""
+    def __init__(self):
+        self._blocks: dict[str, SharedMemory] = {}
+
+    def unpack(self, data: dict[str, DataItem | _SharedArray], copy: bool) -> dict[str, DataItem]:
+        """returns the numpy arrays backed by the shared memory blocks (as views or as copies)"""
+        res = {}
+        for k, v in data.items():
+            if not isinstance(v, _SharedArray):
+                res[k] = v
+                continue
+            if (block := self._blocks.get(k)) is None or block.name != v.name: # the other side may reallocate
+                if block is not None:
+                    block.close()
+                block = self._blocks[k] = SharedMemory(name=v.name)
+                # python<3.13 registers attached blocks too, so the tracker would unlink them when this process exits
+                resource_tracker.unregister(block._name, "shared_memory") # pylint: disable=protected-access
+            arr = np.ndarray(v.shape, dtype=v.dtype, buffer=block.buf)
+            res[k] = arr.copy() if copy else arr
+        return res
+
+    def close(self):
+        """detaches from all the shared memory blocks"""
+        for block in self._blocks.values():
+            block.close()
+        self._blocks = {}
+
+def _worker_fn(data_producer: DataProducer, conn: Connection):
+    """the worker process: receives the deps, calls produce() and sends the results back, both via shared memory"""
+    inputs, outputs = _AttachedArrays(), _SharedArrays()
+    try:
+        while (packed_deps := conn.recv()) is not None:
+            try:
+                res = data_producer.produce(deps=inputs.unpack(packed_deps, copy=False))
+                conn.send((True, outputs.pack(res)))
+            except Exception as e:
+                conn.send((False, f"{e}\nTraceback: {traceback.format_exc()}"))
+    finally:
+        inputs.close()
+        outputs.close()
+
+class ProcessDataProducer(DataProducer):
+    """
+    Wraps a DataProducer so it runs in a worker process instead of in the DataProducers2Channels threads. Useful for
+    CPU-heavy producers (i.e. cv2/numpy post-processing) that would otherwise contend for the GIL with the rest of the
+    robot. The numpy arrays of the dependencies and of the outputs are passed through shared memory, not pickled.
+    Notes:
+    - the wrapped producer is pickled once when the worker starts (at the first produce() call) with 'spawn' by default
+    - only the dependencies of the wrapped producer are sent to the worker, not the entire item
+    """
+    def __init__(self, data_producer: DataProducer, start_method: str = "spawn"):
+        assert isinstance(data_producer, DataProducer), type(data_producer)
+        super().__init__(modalities=data_producer.modalities, dependencies=data_producer.dependencies)
+        self.data_producer = data_producer
+        self.start_method = start_method
+
+        self._lock = threading.Lock() # produce() is a request-reply over a single pipe
+        self._conn: Connection | None = None
+        self._process = None
+        self._inputs = _SharedArrays()
+        self._outputs = _AttachedArrays()
+
+    @overrides
+    def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        with self._lock:
+            if self._process is None:
+                self._start()
+            self._conn.send(self._inputs.pack({k: (deps or {})[k] for k in self.dependencies}))
+            ok, res = self._conn.recv()
+            if not ok:
+                raise RuntimeError(f"Producer '{self.data_producer}' failed in the worker process: {res}")
+            return self._outputs.unpack(res, copy=True) # copy, as the worker reuses the blocks at the next call
+
+    def close(self):
+        """stops the worker process and releases the shared memory"""
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                self._conn.send(None)
+            except OSError: # the worker already died (i.e. killed)
+                pass
+            self._process.join(timeout=1)
+            self._outputs.close()
+            self._inputs.close()
+            self._process = None
+            logger.debug(f"Stopped worker process of '{self.data_producer}'")
+
+    def _start(self):
+        ctx = get_context(self.start_method)
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_worker_fn, args=(self.data_producer, child_conn), daemon=True)
+        self._process.start()
+        atexit.register(self.close)
+        logger.debug(f"Started worker process (pid: {self._process.pid}) for '{self.data_producer}'")
+
+    def __repr__(self):
+        return f"[ProcessDataProducer] {self.data_producer}"
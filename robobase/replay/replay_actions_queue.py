@@ -2,7 +2,8 @@
 from datetime import datetime
 from pathlib import Path
 from robobase import ActionsQueue, Action
-from robobase.utils import load_npz_as_dict
+from robobase.actions_queue import QueuedAction
+from robobase.utils import load_npz_as_dict, is_session_log, SessionLogReader
 
 class ReplayActionsQueue(ActionsQueue):
     """Extends an ActionsQueue with replay abilities from an older run"""
@@ -15,28 +16,32 @@ class ReplayActionsQueue(ActionsQueue):
         self._actions = self._build_actions()
         self._current_ix = 0
 
-    def get(self, *args, **kwargs) -> tuple[Action, datetime]:
+    def get(self, *args, **kwargs) -> QueuedAction | tuple[Action, datetime]:
         if self._current_ix == len(self._actions):
             raise RuntimeError(f"ReplayActionsQueue depleeted (#actions: {len(self._actions)})")
         replay_action, replay_ts = self._actions[self._current_ix]
         self._current_ix += 1
         if self.mode == "online":
-            action, action_ts = super().get(*args, **kwargs)
-            if action != replay_action:
+            item = super().get(*args, **kwargs) # the QueuedAction is returned as is, so its future is kept
+            if (action := item[0]) != replay_action:
                 raise ValueError(f"{action=} vs {replay_action=} mismatch at index={self._current_ix-1} ({replay_ts=})")
-            return action, action_ts
+            return item
         else: # mode == "offline"
             return replay_action, replay_ts
 
-    def put(self, action: Action, data_ts: datetime | None, *args, **kwargs):
+    def put(self, action: Action, data_ts: datetime | None, *args, **kwargs) -> bool:
         assert self.mode == "online", "Can only add new actions (from controllers) if mode=='online'"
-        super().put(action, data_ts, *args, **kwargs)
+        return super().put(action, data_ts, *args, **kwargs)
 
     def _build_actions(self) -> list[tuple[Action, datetime]]:
         assert self.path.exists(), self.path
-        paths = sorted(self.path.iterdir(), key=lambda p: p.name)
-        assert len(paths) > 0, f"No actions provided in '{self.path}'"
-        res = [tuple(load_npz_as_dict(path).values()) for path in paths] # list of (action, action_ts) tuples
+        if is_session_log(self.path):
+            reader = SessionLogReader(self.path)
+            res = [tuple(reader[i].values()) for i in range(len(reader))] # list of (action, action_ts) tuples
+            reader.close()
+        else: # older logs: one npz file per action
+            res = [tuple(load_npz_as_dict(path).values()) for path in sorted(self.path.iterdir(), key=lambda p: p.name)]
+        assert len(res) > 0, f"No actions provided in '{self.path}'"
         assert all(len(a) == 2 for a in res), [(a, len(a)) for a in res]
         return res
 
@@ -5,14 +5,19 @@ import numpy as np
 
 from robobase.data_producer import DataProducer
 from robobase.types import DataItem
-from robobase.utils import logger, load_npz_as_dict
+from robobase.utils import logger, load_npz_as_dict, is_session_log, SessionLogReader
 
 class ReplayDataProducer(DataProducer):
-    """Acts like a RawDataProducer, but operates on the logs/ of ROBOBASE_STORE_LOGS=2 (or similar) from DataChannel"""
+    """
+    Acts like a RawDataProducer, but operates on the logs/ of ROBOBASE_STORE_LOGS=2 (or similar) from DataChannel.
+    Both the session logs (see DataStorer) and the older one npz file per item logs are supported.
+    The modalities decimated by a LoggingPolicy (missing from some items) hold the value of the last item that had them.
+    """
     def __init__(self, data_dir: Path, prefix: str | None = None, loop: bool=True):
         self.data_dir = Path(data_dir)
         self.loop = loop
         self.prefix = prefix or ""
+        self._reader = SessionLogReader(self.data_dir) if is_session_log(self.data_dir) else None
 
         self._data = self._build_data()
         self._keys = list(self._data.keys())
@@ -21,23 +26,31 @@ class ReplayDataProducer(DataProducer):
         logger.debug(f"Built ReplayDataProducer from {len(self._data)} items on disk. Modalities: {self._modalities}")
 
         self._current_ix = 0
+        self._last: dict[str, DataItem] = {}
 
     @overrides
     def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
-        file = self._data[self._keys[self._current_ix]]
-        res = {f"{self.prefix}{k}": v for k, v in load_npz_as_dict(file).items()}
+        self._last.update({f"{self.prefix}{k}": v for k, v in self._load(self._keys[self._current_ix]).items()})
         self._current_ix = (self._current_ix + 1) % len(self._data)
-        return res
+        return {k: self._last[k] for k in self._modalities}
+
+    def _load(self, key: str) -> dict[str, DataItem]:
+        return self._reader[self._data[key]] if self._reader is not None else load_npz_as_dict(self._data[key])
 
-    def _build_data(self) -> dict[str, Path]:
-        """returns an (oredered) dict {timestamp: list of npz files to read}. Matches actions to data if needed"""
+    def _build_data(self) -> dict[str, Path | int]:
+        """returns an (oredered) dict {timestamp: npz file or session log index to read}"""
         assert self.data_dir.exists(), self.data_dir
-        res = {item.stem: item for item in sorted(self.data_dir.iterdir(), key=lambda p: p.name)}
+        if self._reader is not None:
+            res = {ts: i for i, ts in enumerate(self._reader.timestamps)}
+        else:
+            res = {item.stem: item for item in sorted(self.data_dir.iterdir(), key=lambda p: p.name)}
         assert len(res) > 0, f"No data items fround at '{self.data_dir}'"
         return res
 
     def _build_modalities(self) -> list[str]:
         """returns the list of modalities from the first data item"""
+        if self._reader is not None:
+            return [f"{self.prefix}{modality}" for modality in self._reader[0].keys()]
         file = self._data[self._keys[0]]
         data = np.load(file, allow_pickle=True)
         if "arr_0" in data.keys() and len(data.keys()) == 1: # compat mode
@@ -1,21 +1,25 @@
 """robot.py - The basic Robot class that defines all the low-level wirings and should handle 95% of the cases"""
 from typing import Callable
+import itertools
 import threading
 import time
 from datetime import datetime
+from queue import Full
 from .environment import Environment
 from .data_channel import DataChannel
+from .action import Action
 from .actions_queue import ActionsQueue
 from .data_producer import DataProducer, RawDataProducer
 from .controller import BaseController, Controller
 from .actions2env import Actions2Environment
-from .data_producers2channels import DataProducers2Channels
+from .data_producers2channels import DataProducers2Channels, make_produce_all_fn
 from .types import ActionsFn, ControllerFn
-from .utils import ThreadGroup, ThreadStatus, logger, parsed_str_type
+from .utils import ThreadGroup, ThreadStatus, logger, parsed_str_type, get_clock
 
 SLEEP_TIME = 1
 
-def _make_status(status: dict[str, ThreadStatus], env: Environment, start_time: datetime) -> str:
+def _make_status(status: dict[str, ThreadStatus], env: Environment, data_channel: DataChannel,
+                 start_time: datetime) -> str:
     """Print a summary table of thread statuses after robot.run() completes."""
     duration = (datetime.now() - start_time).total_seconds()
     lines = [
@@ -28,6 +32,9 @@ def _make_status(status: dict[str, ThreadStatus], env: Environment, start_time:
         exc_str = "-" if ts.exception is None else f"{type(ts.exception).__name__}: {str(ts.exception)}"
         lines.append(f"{name:<35} {str(ts.is_alive):<10} {exc_str:<50}")
     lines.append(f"Env: {parsed_str_type(env):<30} {str(env.is_running()):<10} {'-':<50}")
+    lines.append("-" * 90)
+    for name, stats in data_channel.subscribers_stats.items():
+        lines.append(f"{name:<35} Received: {stats.received:<10} Skipped: {stats.skipped:<10}")
     lines.append("-" * 90 + "\n")
     return "\n".join(lines)
 
@@ -35,8 +42,10 @@ class Robot:
     """
     Robot class that interacts with an environment and has a single data channel and a single actions queue.
     The action_fn is the callback that converts generic actions to env-specific commands.
+    action_lanes optionally maps action names to independent actuator lanes (see Actions2Environment).
     """
-    def __init__(self, env: Environment, data_channel: DataChannel, actions_queue: ActionsQueue, actions_fn: ActionsFn):
+    def __init__(self, env: Environment, data_channel: DataChannel, actions_queue: ActionsQueue, actions_fn: ActionsFn,
+                 action_lanes: dict[str, str] | None = None):
         self.env = env
         self.data_channel = data_channel
         self.actions_queue = actions_queue
@@ -46,7 +55,7 @@ class Robot:
         self._data_producers: list[DataProducer] = []
         self._env2data: DataProducers2Channels | None = None
         self._controllers: dict[str, Controller] = {}
-        self._actions2env = Actions2Environment(self.env, self.actions_queue, self.actions_fn)
+        self._actions2env = Actions2Environment(self.env, self.actions_queue, self.actions_fn, lanes=action_lanes)
         self._other_threads: dict[str, threading.Thread] = {} # e.g. maybe we want to start the env at the same time.
 
     def add_data_producer(self, data_producer: DataProducer):
@@ -65,6 +74,9 @@ class Robot:
         if isinstance(controller, Callable):
             controller = Controller(self.data_channel, self.actions_queue, controller_fn=controller)
         assert isinstance(controller, BaseController), f"Expected 'robobase.Controller', got {type(controller)}"
+        controller.name = name # thread name, also used as the DataChannel subscriber name for the stats
+        if isinstance(controller, Controller): # so a virtual clock waits for it to process each item (from the first)
+            self.data_channel.track_work(name)
         self._controllers[name] = controller
 
     def add_other_thread(self, thread: threading.Thread, name: str | None = None):
@@ -78,6 +90,48 @@ class Robot:
         assert len(self._controllers) > 0, "At least one controller expected. Use `robot.add_controller`"
         self._env2data = DataProducers2Channels(data_producers=self._data_producers, data_channels=[self.data_channel])
 
+    def run_lockstep(self, n_steps: int | None = None) -> int:
+        """
+        Runs the robot synchronously in the calling thread, without threads, events or sleeps (i.e. for simulators, RL
+        or replays). At each step, the producers are called in topological order, the controllers are called (in the
+        order they were added) if the data is new and all their queued actions are applied to the env before the next
+        step. This way, the runs are reproducible and as fast as the env can step. Only controller_fn-based controllers
+        are supported. Stops after n_steps (if set) or when the env stops. Returns the number of steps done.
+        The puts never block: if the actions of a step fill the queue, the queued ones are applied to the env early.
+        """
+        assert n_steps is None or n_steps > 0, n_steps
+        assert len(self._controllers) > 0, "At least one controller expected. Use `robot.add_controller`"
+        assert all(isinstance(c, Controller) for c in self._controllers.values()), \
+            f"Only controller_fn-based controllers can run in lockstep: {self._controllers}"
+        produce_all = make_produce_all_fn(self.data_channel, [*self._data_producers, RawDataProducer(self.env)])
+        versions = {name: 0 for name in self._controllers}
+        n_done = 0
+        for _ in (itertools.count() if n_steps is None else range(n_steps)):
+            if not self.env.is_running():
+                break
+            self.env.data_ready.set() # the env is only stepped by the actions below, so its state is always ready
+            self.data_channel.put(produce_all())
+            for name, controller in self._controllers.items():
+                data, data_ts, version = self.data_channel.get_since(versions[name], timeout=0, subscriber=name)
+                if version == versions[name]: # duplicate (i.e. no action in the previous step), like in run()
+                    continue
+                versions[name] = version
+                for action in controller.controller_fn(data):
+                    self._put_nowait(action, data_ts)
+            self._actions2env.apply_pending()
+            get_clock().release_work()
+            n_done += 1
+        logger.debug(f"Lockstep run done after {n_done} steps. {self.env.is_running()=}")
+        return n_done
+
+    def _put_nowait(self, action: Action, data_ts: datetime):
+        """lockstep put: nothing else drains the queue, so if it's full, the queued actions are applied first"""
+        try:
+            self.actions_queue.put(action, data_ts=data_ts, block=False)
+        except Full:
+            self._actions2env.apply_pending()
+            self.actions_queue.put(action, data_ts=data_ts, block=False)
+
     def run(self, sleep_duration: float = SLEEP_TIME, print_status: bool = True) -> dict[str, ThreadStatus]:
         """start the robot's main loop which in turn starts all the threads: data producer + controllers + actuator"""
         start = datetime.now()
@@ -97,6 +151,6 @@ class Robot:
             logger.debug(f"Joining threads: \n{tg}")
             res = tg.join(timeout=sleep_duration)
             if print_status:
-                logger.info(_make_status(res, self.env, start))
+                logger.info(_make_status(res, self.env, self.data_channel, start))
 
             return res # pylint: disable=lost-exception return-in-finally
@@ -1,12 +1,16 @@
 """init file for generic utils"""
-from .utils import logger, get_project_root, parsed_str_type, load_npz_as_dict
+from .utils import logger, get_project_root, parsed_str_type, load_npz_as_dict, item_nbytes
 from .thread_group import ThreadGroup, ThreadStatus
 from .data_storer import DataStorer
-from .sync import freq_barrier, wait_and_clear
+from .session_log import SessionLogWriter, SessionLogReader, is_session_log
+from .logging_policy import LoggingPolicy, ModalityPolicy
+from .clock import Clock, RealClock, VirtualClock, get_clock, set_clock
+from .sync import freq_barrier, wait_and_clear, WorkEvent, LatestSlot, BatchQueue, TimerScheduler
 
 __all__ = [
-    "logger", "get_project_root", "parsed_str_type", "load_npz_as_dict",
+    "logger", "get_project_root", "parsed_str_type", "load_npz_as_dict", "item_nbytes",
     "ThreadGroup", "ThreadStatus",
-    "DataStorer",
-    "freq_barrier", "wait_and_clear",
+    "DataStorer", "SessionLogWriter", "SessionLogReader", "is_session_log", "LoggingPolicy", "ModalityPolicy",
+    "Clock", "RealClock", "VirtualClock", "get_clock", "set_clock",
+    "freq_barrier", "wait_and_clear", "WorkEvent", "LatestSlot", "BatchQueue", "TimerScheduler",
 ]
@@ -0,0 +1,164 @@
+"""clock.py - the (pluggable) clock used to timestamp and pace: real (wall-clock) or virtual (simulated) time"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import os
+import threading
+import time
+import weakref
+
+from .utils import logger
+
+class Clock(ABC):
+    """the time source of all the components that timestamp (i.e. DataChannel.put) or pace (i.e. freq_barrier)"""
+    @abstractmethod
+    def now(self) -> datetime:
+        """the current time"""
+
+    @abstractmethod
+    def sleep(self, duration_s: float):
+        """sleeps the calling thread for duration_s seconds of this clock's time"""
+
+    def register(self, thread: threading.Thread | None = None):
+        """registers a thread that paces itself with this clock (the calling one by default). No-op for the real time"""
+
+    def wait(self, cond: threading.Condition, timeout_s: float | None = None) -> bool:
+        """cond.wait() (with cond held) for at most timeout_s seconds of this clock's time. None: until notified"""
+        return cond.wait(timeout_s)
+
+    # Work accounting, so a virtual time waits for the items handed over between threads (i.e. frames). The sender
+    # calls add_work() before handing an item over, the receiver take_work() when it gets it and release_work() once
+    # it's done with it (after handing its own outputs over). No-ops for the real time.
+    def add_work(self, n: int = 1):
+        """announces n items handed over to another thread"""
+
+    def cancel_work(self, n: int = 1):
+        """n announced items were dropped before being taken (i.e. overwritten in a LatestSlot)"""
+
+    def take_work(self, n: int = 1):
+        """the calling thread got n announced items. They are done at its next release_work()"""
+
+    def transfer_work(self) -> int:
+        """forgets the items taken by the calling thread without releasing them, so another thread can take them"""
+        return 0
+
+    def release_work(self):
+        """the calling thread is done with all the items it took"""
+
+class RealClock(Clock):
+    """the wall-clock time. The default one"""
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, duration_s: float):
+        time.sleep(max(duration_s, 0))
+
+class VirtualClock(Clock):
+    """
+    Simulated time for faster than real-time runs (i.e. processing a recorded video or a maze session in seconds).
+    sleep() doesn't wait for the real duration: the time jumps to the earliest wake-up as soon as all the threads that
+    pace themselves with this clock (the alive ones that called register() or sleep()) are sleeping and all the work
+    handed over between threads (i.e. a frame going through the producers and the controllers) is done, so no frame is
+    skipped. A pacing thread blocked on something else would stall the clock, so the time also jumps after idle_s
+    seconds of real time without any progress (stall_s if there is pending work, which is logged as it's likely a bug).
+    now() is strictly increasing (1us per call while the time is frozen), so the timestamps are unique and ordered.
+    """
+    def __init__(self, start: datetime | None = None, idle_s: float = 0.1, stall_s: float = 5):
+        assert idle_s > 0 and stall_s > 0, (idle_s, stall_s)
+        self.idle_s = idle_s
+        self.stall_s = stall_s
+        self._now = start or datetime.now() # the simulated time, only advanced by sleep() wake-ups
+        self._last = self._now - timedelta(microseconds=1) # the last value returned by now()
+        self._cond = threading.Condition()
+        self._wakeups: list[tuple[datetime, int]] = [] # (wake-up time, seq) of the sleeping threads
+        self._seq = itertools.count()
+        self._pacers: weakref.WeakSet[threading.Thread] = weakref.WeakSet()
+        self._n_work = 0 # the items announced by add_work() and not released yet
+        self._taken = threading.local() # per thread: the number of items taken and not released yet
+
+    def now(self) -> datetime:
+        with self._cond:
+            self._last = max(self._now, self._last + timedelta(microseconds=1))
+            return self._last
+
+    def register(self, thread: threading.Thread | None = None):
+        """registers a pacing thread (the calling one by default) before it starts, so the time waits for it"""
+        with self._cond:
+            self._pacers.add(thread or threading.current_thread())
+
+    def sleep(self, duration_s: float):
+        with self._cond:
+            self._pacers.add(threading.current_thread())
+            if (wakeup := self._now + timedelta(seconds=max(duration_s, 0))) <= self._now:
+                return
+            heapq.heappush(self._wakeups, (wakeup, next(self._seq)))
+            while self._now < wakeup:
+                n_pacers = sum(thread.ident is None or thread.is_alive() for thread in self._pacers) # not finished
+                if len(self._wakeups) >= n_pacers and self._n_work == 0: # all the pacers sleep and nothing's pending
+                    self._advance()
+                elif not self._cond.wait(self.idle_s if self._n_work == 0 else self.stall_s): # no progress
+                    if self._n_work > 0:
+                        logger.warning(f"Virtual time stalled for {self.stall_s}s with {self._n_work} pending items")
+                    self._advance()
+
+    def wait(self, cond: threading.Condition, timeout_s: float | None = None) -> bool:
+        """
+        Waiting for a notification doesn't pace the calling thread, so it doesn't hold the time. A timeout is a sleep(),
+        which is not interrupted by a notification, so keep it short (i.e. TimerScheduler's tick).
+        """
+        if timeout_s is None:
+            with self._cond:
+                self._pacers.discard(threading.current_thread())
+                self._cond.notify_all()
+            return cond.wait()
+        cond.release()
+        try:
+            self.sleep(timeout_s)
+        finally:
+            cond.acquire()
+        return False
+
+    def add_work(self, n: int = 1):
+        with self._cond:
+            self._n_work += n
+
+    def cancel_work(self, n: int = 1):
+        with self._cond:
+            self._n_work -= n
+            self._cond.notify_all()
+
+    def take_work(self, n: int = 1):
+        self._taken.n = getattr(self._taken, "n", 0) + n
+
+    def transfer_work(self) -> int:
+        res, self._taken.n = getattr(self._taken, "n", 0), 0
+        return res
+
+    def release_work(self):
+        if (n := self.transfer_work()) == 0:
+            return
+        with self._cond:
+            self._n_work -= n
+            self._cond.notify_all()
+
+    def _advance(self):
+        """jumps to the earliest wake-up and wakes up its threads. Must be called with the lock held"""
+        self._now = max(self._now, self._wakeups[0][0])
+        while len(self._wakeups) > 0 and self._wakeups[0][0] <= self._now:
+            heapq.heappop(self._wakeups)
+        self._cond.notify_all()
+
+_CLOCK: Clock = VirtualClock() if os.getenv("ROBOBASE_CLOCK", "real") == "virtual" else RealClock()
+
+def get_clock() -> Clock:
+    """the clock used by all the components. Real by default, virtual if ROBOBASE_CLOCK=virtual. See set_clock()"""
+    return _CLOCK
+
+def set_clock(clock: Clock) -> Clock:
+    """sets the clock used by all the components (before starting the robot). Returns the previous one"""
+    global _CLOCK # pylint: disable=global-statement
+    assert isinstance(clock, Clock), type(clock)
+    prev, _CLOCK = _CLOCK, clock
+    return prev
@@ -1,35 +1,90 @@
-"""data_storer.py A thread with a queue for storing data on disk as npz files"""
+"""data_storer.py A thread with a queue for storing data on disk as segmented session logs (one per tag)"""
 from __future__ import annotations
 import threading
 import atexit
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
 from typing import Any
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from queue import Queue, Empty
-import time
 import os
-from overrides import overrides
 import numpy as np
+from overrides import overrides
 
-from .utils import logger
+from .utils import logger, item_nbytes
+from .session_log import SessionLogWriter, encode_item
+from .logging_policy import LoggingPolicy
+from .clock import get_clock
 
 SLEEP_INTERVAL = 0.01
-DATA_STORER_QUEUE_MAXSIZE = int(os.getenv("ROBOBASE_DATA_STORER_QUEUE_SIZE", "100"))
+STATS_INTERVAL_S = 1
+STATS_TAG = "DataStorer"
+OVERFLOW_POLICIES = ("drop", "downsample", "degrade")
+OVERFLOW_THRESHOLD = 0.5 # the fraction of max_queue_bytes from which downsample/degrade kick in
+DOWNSAMPLE_FACTOR = 4 # downsample: keep one in every DOWNSAMPLE_FACTOR items of a tag
+DATA_STORER_QUEUE_BYTES = int(os.getenv("ROBOBASE_DATA_STORER_QUEUE_BYTES", str(512 * 1024 * 1024)))
+DATA_STORER_OVERFLOW = os.getenv("ROBOBASE_DATA_STORER_OVERFLOW", "drop")
+DATA_STORER_POOL = os.getenv("ROBOBASE_DATA_STORER_POOL", "thread")
+DATA_STORER_WORKERS = int(os.getenv("ROBOBASE_DATA_STORER_WORKERS", str(min(4, os.cpu_count() or 1))))
+DATA_STORER_COMPRESSION = int(os.getenv("ROBOBASE_DATA_STORER_COMPRESSION", "1"))
 _INSTANCE: DataStorer | None = None # pylint: disable=invalid-name
 
+def _degrade(item: dict[str, Any]) -> dict[str, Any]:
+    """halves the resolution of the images (2D or HxWxC arrays) of the item, so it takes 4x less disk"""
+    return {k: np.ascontiguousarray(v[::2, ::2]) if isinstance(v, np.ndarray) and v.dtype != object
+            and v.ndim in (2, 3) and min(v.shape[0:2]) >= 32 else v for k, v in item.items()}
+
+def _encode(policy: LoggingPolicy, tag: str, item: dict[str, Any], compression_level: int, degrade: bool) -> bytes:
+    """encodes an item in the pool, after degrading it if the queue was overflowing when it was pushed"""
+    return policy.encode(tag, _degrade(item) if degrade else item, compression_level)
+
 class DataStorer(threading.Thread):
     """
     Thread that operates a queue for storing data from other threads i.e. DataChannel or ActionsQueue.
-    Note: you can control the queue size with `ROBOBASE_DATA_STORER_QUEUE_SIZE` env variable. If the queue is full, then
-    the data producer and actions consumers will also be throthled, making the robot lag. So be careful if you have too
-    much stuff you want to log to the disk, becuase it may propagate. See issue (!11) as well.
+    The queue is bounded by bytes (`ROBOBASE_DATA_STORER_QUEUE_BYTES`) and push() never blocks, as it's called with the
+    DataChannel lock held, so a slow disk doesn't throttle the robot (see issue (!11)). Instead, when the queue fills up
+    the items of the tags not in keep_tags (the frames, not the actions) go through the overflow policy:
+    - drop: the items that don't fit are dropped
+    - downsample: above OVERFLOW_THRESHOLD, only one in every DOWNSAMPLE_FACTOR items is kept. Drops if full.
+    - degrade: above OVERFLOW_THRESHOLD, the images are stored at half the resolution (by the pool). Drops if full.
+    The counts of dropped, downsampled and degraded items per tag are stored in the session log of the STATS_TAG tag.
+    Before all that, the policy (`ROBOBASE_DATA_STORER_POLICY` json file, see LoggingPolicy) selects which modalities
+    of each tag are stored, at what rate and with what encoding. By default, everything is stored.
+    The items of each tag are appended to a session log at path/tag (see SessionLogWriter and SessionLogReader).
+    The serialization and compression (the expensive part) is fanned out to a pool of n_workers threads or processes
+    (ROBOBASE_DATA_STORER_POOL/WORKERS/COMPRESSION env vars) while this thread appends the results in the push order.
+    With n_workers=0 everything is done in this thread.
     """
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, n_workers: int = DATA_STORER_WORKERS, pool: str = DATA_STORER_POOL,
+                 compression_level: int = DATA_STORER_COMPRESSION, max_queue_bytes: int = DATA_STORER_QUEUE_BYTES,
+                 overflow: str = DATA_STORER_OVERFLOW, keep_tags: tuple[str, ...] = ("ActionsQueue", ),
+                 policy: LoggingPolicy | None = None):
         super().__init__(daemon=True)
+        assert n_workers >= 0, n_workers
+        assert pool in ("thread", "process"), pool
+        assert 0 <= compression_level <= 9, compression_level
+        assert max_queue_bytes > 0, max_queue_bytes
+        assert overflow in OVERFLOW_POLICIES, f"{overflow} not in {OVERFLOW_POLICIES}"
         path.mkdir(parents=True, exist_ok=True)
         self.path = path
-        self.data_queue = Queue(maxsize=DATA_STORER_QUEUE_MAXSIZE)
+        self.data_queue = Queue()
         self.is_closed = False
+        self.n_workers = n_workers
+        self.pool = pool
+        self.compression_level = compression_level
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = overflow
+        self.keep_tags = keep_tags
+        self.policy = policy or LoggingPolicy()
+        self.stats: dict[str, dict[str, int]] = {"n_dropped": {}, "n_downsampled": {}, "n_degraded": {}} # per tag
+        self._writers: dict[str, SessionLogWriter] = {} # created at the first item of each tag
+        self._pending: deque[tuple[str, str, int, Future]] = deque() # (tag, timestamp, nbytes, encoded) in push order
+        self._queued_bytes = 0 # the items in data_queue and in _pending
+        self._n_overflowing: dict[str, int] = {} # per tag, the items pushed above the threshold (for downsample)
+        self._lock = threading.Lock() # push() is called from many threads (DataChannel, ActionsQueue)
+        self._stats_version = self._stored_stats_version = 0
 
     @staticmethod
     def get_instance() -> DataStorer | None:
@@ -44,8 +99,9 @@ class DataStorer(threading.Thread):
         else: # can happen in tests -_-
             logs_dir = Path(os.environ["ROBOBASE_LOGS_DIR"])
 
-        logger.info(f"Setting DataStorer at '{logs_dir}'")
-        (_INSTANCE := DataStorer(logs_dir)).start()
+        policy = LoggingPolicy.from_file(path) if (path := os.getenv("ROBOBASE_DATA_STORER_POLICY")) else None
+        logger.info(f"Setting DataStorer at '{logs_dir}' (policy: {policy})")
+        (_INSTANCE := DataStorer(logs_dir, policy=policy)).start()
         atexit.register(_INSTANCE.close)
         return _INSTANCE
 
@@ -56,38 +112,133 @@ class DataStorer(threading.Thread):
         self.is_closed = True
         self.join()
 
-    def push(self, item: dict[str, Any], tag: str, timestamp: datetime):
-        """Push a data item to the queue so it's later stored on disk. A 'tag' of the source must be provided."""
+    def push(self, item: dict[str, Any], tag: str, timestamp: datetime) -> bool:
+        """
+        Push a data item to the queue so it's later stored on disk. A 'tag' of the source must be provided.
+        Never blocks. Returns False if the item is not stored (the logging policy or the overflow policy dropped it).
+        """
         assert not self.is_closed, "DataStorer is closed, cannot push."
         assert isinstance(item, dict), f"Can only push dicts to DataStorer. Got {type(item)}"
+        if (item := self.policy.select(tag, item, timestamp, mark=False)) is None:
+            return False
+        nbytes = item_nbytes(item) # recursive, i.e. lists of masks
+        with self._lock:
+            if tag not in self.keep_tags and (policy := self._overflow_policy(tag, nbytes)) != "kept":
+                self._count(f"n_{policy}", tag)
+                logger.log_every_s(f"DataStorer queue is full ({self._queued_bytes} bytes). Item {policy}: {tag}",
+                                   "DEBUG", True)
+                return False
+            # no copies here (the DataChannel lock is held): the pool degrades the item when it encodes it
+            if degrade := tag not in self.keep_tags and self.overflow == "degrade" \
+                    and self._queued_bytes + nbytes > OVERFLOW_THRESHOLD * self.max_queue_bytes:
+                self._count("n_degraded", tag)
+            self._queued_bytes += nbytes
+        self.policy.mark_stored(tag, list(item), timestamp) # a dropped item doesn't delay the next one of its rate
         logger.trace(f"Pushing item at {self.path}/{tag}/{timestamp} (#queue: {len(self)})")
-        self.data_queue.put({"item": item, "tag": tag, "timestamp": timestamp.isoformat()}) # arr_0 for compat!
+        self.data_queue.put({"item": item, "tag": tag, "timestamp": timestamp.isoformat(), "nbytes": nbytes,
+                             "degrade": degrade})
+        return True
 
     def get_and_store(self):
-        """gets one item from the data queue and stores it to the disk"""
+        """gets one item from the data queue and stores it to the disk (synchronously, without the pool)"""
         x: dict[str, Any] = self.data_queue.get_nowait()
-        (path := self.path / x["tag"] / x["timestamp"]).parent.mkdir(exist_ok=True, parents=True)
-        data = {k: np.array(v, dtype=object) for k, v in x["item"].items()}
-        np.savez_compressed(path, **data) # the actual keys will be mapped in the .npz file
-        logger.log_every_s(f"Stored at '{path}' (#storer queue: {self.data_queue.qsize()})", "DEBUG", True)
+        self._write(x["tag"], x["timestamp"], _encode(self.policy, x["tag"], x["item"], self.compression_level,
+                                                      x["degrade"]))
+        self._release(x["nbytes"])
+
+    def _overflow_policy(self, tag: str, nbytes: int) -> str:
+        """what happens to a new item given the queue's fill: kept, dropped or downsampled"""
+        if self._queued_bytes + nbytes > self.max_queue_bytes:
+            return "dropped"
+        if self.overflow == "downsample" and self._queued_bytes + nbytes > OVERFLOW_THRESHOLD * self.max_queue_bytes:
+            self._n_overflowing[tag] = (n := self._n_overflowing.get(tag, 0)) + 1
+            return "kept" if n % DOWNSAMPLE_FACTOR == 0 else "downsampled"
+        return "kept"
+
+    def _count(self, stat: str, tag: str):
+        self.stats[stat][tag] = self.stats[stat].get(tag, 0) + 1
+        self._stats_version += 1
+
+    def _release(self, nbytes: int):
+        with self._lock:
+            self._queued_bytes -= nbytes
+
+    def _store_stats(self):
+        """appends the overflow counters to the STATS_TAG session log if they changed since the last time"""
+        with self._lock:
+            if self._stats_version == self._stored_stats_version:
+                return
+            self._stored_stats_version = self._stats_version
+            stats = {k: dict(v) for k, v in self.stats.items()}
+        logger.debug(f"DataStorer overflow stats: {stats}")
+        self._write(STATS_TAG, get_clock().now().isoformat(), encode_item(stats))
 
     @overrides
     def run(self):
-        logger.debug(f"Starting DataStorer at '{self.path}'")
-        while True:
-            try:
-                self.get_and_store()
-            except Empty:
-                if self.is_closed:
-                    break
-                logger.log_every_s("Empty queue on DataStorer.", "TRACE", True)
-                time.sleep(SLEEP_INTERVAL)
-
-        if (n := self.data_queue.qsize()) > 0:
-            logger.info(f"Waiting for DataChannel to write {n} left data logs to '{self.path}'")
-            while self.data_queue.qsize() > 0:
-                self.get_and_store()
+        logger.debug(f"Starting DataStorer at '{self.path}' (pool: {self.n_workers} {self.pool}s, "
+                     f"compression: {self.compression_level})")
+        executor = self._make_executor()
+        last_stats = get_clock().now()
+        try:
+            while True:
+                if (now := get_clock().now()) - last_stats >= timedelta(seconds=STATS_INTERVAL_S):
+                    self._store_stats()
+                    last_stats = now
+                self._commit_done(block=len(self._pending) >= 2 * max(self.n_workers, 1))
+                try:
+                    x: dict[str, Any] = self.data_queue.get(timeout=SLEEP_INTERVAL)
+                except Empty:
+                    if self.is_closed:
+                        break
+                    logger.log_every_s("Empty queue on DataStorer.", "TRACE", True)
+                    continue
+                self._submit(executor, x)
+
+            if (n := self.data_queue.qsize() + len(self._pending)) > 0:
+                logger.info(f"Waiting for DataChannel to write {n} left data logs to '{self.path}'")
+                while self.data_queue.qsize() > 0:
+                    self._submit(executor, self.data_queue.get_nowait())
+                    self._commit_done(block=len(self._pending) >= 2 * max(self.n_workers, 1))
+                while len(self._pending) > 0:
+                    self._commit_done(block=True)
+            self._store_stats()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            for writer in self._writers.values():
+                writer.close()
         logger.debug(f"Ending DataStorer at '{self.path}'")
 
+    def _make_executor(self) -> Executor | None:
+        if self.n_workers == 0:
+            return None
+        if self.pool == "thread": # zlib and the array copies release the GIL
+            return ThreadPoolExecutor(self.n_workers, thread_name_prefix="DataStorer")
+        return ProcessPoolExecutor(self.n_workers, mp_context=get_context("spawn"))
+
+    def _submit(self, executor: Executor | None, x: dict[str, Any]):
+        """encodes the item in the pool (or right away without one). The result is written later by _commit_done"""
+        if executor is None:
+            future = Future()
+            future.set_result(_encode(self.policy, x["tag"], x["item"], self.compression_level, x["degrade"]))
+        else:
+            future = executor.submit(_encode, self.policy, x["tag"], x["item"], self.compression_level, x["degrade"])
+        self._pending.append((x["tag"], x["timestamp"], x["nbytes"], future))
+
+    def _commit_done(self, block: bool):
+        """writes the encoded items in push order, stopping at the first one still being encoded (unless block)"""
+        while len(self._pending) > 0 and (block or self._pending[0][3].done()):
+            tag, timestamp, nbytes, future = self._pending.popleft()
+            self._write(tag, timestamp, future.result())
+            self._release(nbytes)
+            block = False
+
+    def _write(self, tag: str, timestamp: str, data: bytes):
+        if (writer := self._writers.get(tag)) is None:
+            writer = self._writers[tag] = SessionLogWriter(self.path / tag)
+        writer.append_encoded(data, timestamp=timestamp)
+        logger.log_every_s(f"Stored {tag}/{timestamp} (#storer queue: {self.data_queue.qsize()}, "
+                           f"#encoding: {len(self._pending)}, bytes: {self._queued_bytes})", "DEBUG", True)
+
     def __len__(self):
         return self.data_queue.qsize()
@@ -0,0 +1,120 @@
+"""logging_policy.py - which modalities of each tag DataStorer stores, at what rate and with what encoding"""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+import json
+import threading
+import numpy as np
+
+from .session_log import encode_item
+
+@dataclass(frozen=True)
+class ModalityPolicy:
+    """
+    How one modality is stored: at most rate_hz times per second (None: every item), with a zlib compression_level
+    (None: the one of DataStorer), cast to a dtype (i.e. float16 for float segmentation stacks) and with its first two
+    (spatial) dimensions downscaled by an integer factor. The casts and downscales are done by the DataStorer pool.
+    """
+    rate_hz: float | None = None
+    compression_level: int | None = None
+    dtype: str | None = None
+    downscale: int = 1
+
+    def __post_init__(self):
+        assert self.rate_hz is None or self.rate_hz > 0, self.rate_hz
+        assert self.compression_level is None or 0 <= self.compression_level <= 9, self.compression_level
+        assert self.downscale >= 1, self.downscale
+
+    def transform(self, value: Any) -> Any:
+        """casts and downscales the value (if it's an array)"""
+        if not isinstance(value, np.ndarray) or value.dtype == object:
+            return value
+        if self.downscale > 1 and value.ndim >= 2:
+            value = value[::self.downscale, ::self.downscale]
+        return value.astype(self.dtype) if self.dtype is not None else value
+
+class LoggingPolicy:
+    """
+    The logging policy of DataStorer: {tag: {modality: ModalityPolicy or None}}. None means the modality is not stored.
+    The '*' key of a tag is for the modalities not listed (defaults to ModalityPolicy(), so they are stored as they are)
+    and the tags that are not in the policy are stored as they are. For example, rgb at 5Hz, pose at full rate and no
+    other modality of the DataChannel items, while all the actions are stored:
+        LoggingPolicy({"DataChannel": {"rgb": ModalityPolicy(rate_hz=5), "pose": ModalityPolicy(), "*": None}})
+    The modalities of a tag are decimated independently, so an item may have only some of them (or none: not stored).
+    """
+    def __init__(self, policies: dict[str, dict[str, ModalityPolicy | None]] | None = None):
+        self.policies = policies or {}
+        for tag, modalities in self.policies.items():
+            assert all(p is None or isinstance(p, ModalityPolicy) for p in modalities.values()), (tag, modalities)
+        self._last_ts: dict[tuple[str, str], datetime] = {} # (tag, modality) -> the ts of the last stored value
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_dict(cfg: dict[str, dict[str, dict[str, Any] | None]]) -> LoggingPolicy:
+        """builds the policy from a (json) config: {tag: {modality: {rate_hz: 5, dtype: float16, ...} or null}}"""
+        return LoggingPolicy({tag: {k: None if v is None else ModalityPolicy(**v) for k, v in modalities.items()}
+                              for tag, modalities in cfg.items()})
+
+    @staticmethod
+    def from_file(path: Path) -> LoggingPolicy:
+        """builds the policy from a json file (see from_dict)"""
+        with open(path, "r", encoding="utf-8") as fp:
+            return LoggingPolicy.from_dict(json.load(fp))
+
+    def get(self, tag: str, modality: str) -> ModalityPolicy | None:
+        """the policy of a modality of a tag. None if it's not stored"""
+        if (modalities := self.policies.get(tag)) is None:
+            return ModalityPolicy()
+        return modalities[modality] if modality in modalities else modalities.get("*", ModalityPolicy())
+
+    def stored_modalities(self, tag: str, modalities: list[str]) -> set[str]:
+        """the modalities of a tag that are stored (at some rate), so they are produced even if nobody reads them"""
+        return {k for k in modalities if self.get(tag, k) is not None}
+
+    def select(self, tag: str, item: dict[str, Any], timestamp: datetime, mark: bool = True) -> dict[str, Any] | None:
+        """
+        the modalities of the item that are stored at this timestamp given their rates. None if there are none.
+        If mark is False, the caller calls mark_stored() once the item is actually stored (i.e. not dropped on overflow)
+        """
+        if tag not in self.policies:
+            return item
+        res = {}
+        with self._lock:
+            for k, v in item.items():
+                if (policy := self.get(tag, k)) is None:
+                    continue
+                if policy.rate_hz is not None:
+                    last_ts = self._last_ts.get((tag, k))
+                    if last_ts is not None and timestamp - last_ts < timedelta(seconds=1 / policy.rate_hz):
+                        continue
+                res[k] = v
+        if mark and len(res) > 0:
+            self.mark_stored(tag, list(res), timestamp)
+        return res if len(res) > 0 else None
+
+    def mark_stored(self, tag: str, modalities: list[str], timestamp: datetime):
+        """the selected modalities were stored at this timestamp, so the next ones are decimated as per their rates"""
+        if tag not in self.policies:
+            return
+        with self._lock:
+            self._last_ts |= {(tag, k): timestamp for k in modalities if (p := self.get(tag, k)) and p.rate_hz}
+
+    def encode(self, tag: str, item: dict[str, Any], compression_level: int) -> bytes:
+        """encodes the (selected) item with the dtype, downscale and compression level of each modality"""
+        if tag not in self.policies:
+            return encode_item(item, compression_level)
+        policies = {k: self.get(tag, k) or ModalityPolicy() for k in item}
+        levels = {k: compression_level if p.compression_level is None else p.compression_level
+                  for k, p in policies.items()}
+        return encode_item({k: policies[k].transform(v) for k, v in item.items()}, levels)
+
+    def __getstate__(self): # sent to the DataStorer worker processes, which only encode
+        return {"policies": self.policies}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["policies"])
+
+    def __repr__(self):
+        return f"[LoggingPolicy] {self.policies}"
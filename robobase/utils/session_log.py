@@ -0,0 +1,156 @@
+"""session_log.py - append-only segmented log of the items of one tag (i.e. DataChannel) as written by DataStorer"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any
+import pickle
+import struct
+import threading
+import zlib
+import numpy as np
+
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+INDEX_FILE = "index.bin"
+INDEX_DTYPE = np.dtype([("timestamp", "S32"), ("segment", "<u4"), ("offset", "<u8"), ("length", "<u8")])
+_HEADER_LEN = struct.Struct("<I") # the length of the (pickled) header of a record, before its raw buffers
+
+def _segment_path(path: Path, segment: int) -> Path:
+    return path / f"segment-{segment:06d}.bin"
+
+def _is_raw_array(value: Any) -> bool:
+    """only typed (non-object) numpy arrays are stored as raw buffers. The rest (i.e. lists) is pickled as it is"""
+    return isinstance(value, np.ndarray) and value.dtype != object
+
+def encode_item(item: dict[str, Any], compression_level: int | dict[str, int] = 0) -> bytes:
+    """
+    Serializes an item: the (non-object) numpy arrays are stored as raw buffers, the rest is pickled, so the other
+    values (i.e. lists of bboxes) are replayed with the same types as in the live run. The header (dtypes, shapes and sizes of each value) is pickled in front of the buffers.
+    compression_level (1-9, 0 for none) zlib-compresses the buffers. zlib releases the GIL, so it scales with threads.
+    It can be a dict for a level per key (the missing keys are not compressed).
+    """
+    levels = compression_level if isinstance(compression_level, dict) else {k: compression_level for k in item}
+    assert all(0 <= level <= 9 for level in levels.values()), levels
+    header, buffers = [], []
+    for k, v in item.items():
+        if _is_raw_array(v):
+            kind, meta, buffer = "array", (v.dtype.str, v.shape), np.ascontiguousarray(v).tobytes()
+        else:
+            kind, meta, buffer = "pickle", None, pickle.dumps(v)
+        if (level := levels.get(k, 0)) > 0:
+            buffer = zlib.compress(buffer, level)
+        buffers.append(buffer)
+        header.append((k, kind, meta, len(buffer), level > 0))
+    header_bytes = pickle.dumps(header)
+    return b"".join([_HEADER_LEN.pack(len(header_bytes)), header_bytes, *buffers])
+
+def decode_item(data: bytes) -> dict[str, Any]:
+    """the inverse of encode_item. The arrays are copies, so they are writeable and don't keep the record alive"""
+    (header_len, ) = _HEADER_LEN.unpack_from(data)
+    header = pickle.loads(data[_HEADER_LEN.size:_HEADER_LEN.size + header_len])
+    res, offset = {}, _HEADER_LEN.size + header_len
+    for k, kind, meta, length, compressed in header:
+        buffer = zlib.decompress(data[offset:offset + length]) if compressed else data[offset:offset + length]
+        res[k] = np.frombuffer(buffer, dtype=meta[0]).reshape(meta[1]).copy() if kind == "array" \
+            else pickle.loads(buffer)
+        offset += length
+    return res
+
+def is_session_log(path: Path) -> bool:
+    """checks if the directory is a session log (as opposed to the older one npz file per item format)"""
+    return (Path(path) / INDEX_FILE).exists()
+
+class SessionLogWriter:
+    """
+    Appends the items of one tag to large segment files (a new one every segment_max_bytes) and their timestamp,
+    segment and offset to a fixed-size record index, so the writes are sequential and the reads are O(1) (see
+    SessionLogReader). Appending to an existing log continues it. Each append is flushed so it can be read live.
+    """
+    def __init__(self, path: Path, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        assert segment_max_bytes > 0, segment_max_bytes
+        Path(path).mkdir(parents=True, exist_ok=True)
+        self.path = Path(path)
+        self.segment_max_bytes = segment_max_bytes
+        self._index_file = open(self.path / INDEX_FILE, "ab") # pylint: disable=consider-using-with
+        index = SessionLogReader.read_index(self.path)
+        self._segment = int(index["segment"][-1]) if len(index) > 0 else 0
+        self._segment_file = open(_segment_path(self.path, self._segment), "ab") # pylint: disable=consider-using-with
+        self.n_items = len(index)
+
+    def append(self, item: dict[str, Any], timestamp: str, compression_level: int = 0):
+        """appends the item at the end of the current segment (or of a new one if it's full) and indexes it"""
+        self.append_encoded(encode_item(item, compression_level), timestamp)
+
+    def append_encoded(self, data: bytes, timestamp: str):
+        """appends an item already serialized with encode_item (i.e. by a pool of workers)"""
+        if self._segment_file.tell() > 0 and self._segment_file.tell() + len(data) > self.segment_max_bytes:
+            self._segment_file.close()
+            self._segment += 1
+            self._segment_file = open(_segment_path(self.path, self._segment), "ab") # pylint: disable=R1732
+        offset = self._segment_file.tell()
+        self._segment_file.write(data)
+        self._segment_file.flush() # the data before its index record, so readers never see a partial item
+        record = np.array([(timestamp.encode(), self._segment, offset, len(data))], dtype=INDEX_DTYPE)
+        self._index_file.write(record.tobytes())
+        self._index_file.flush()
+        self.n_items += 1
+
+    def close(self):
+        """closes the files. The log can be appended to later on with a new writer"""
+        self._segment_file.close()
+        self._index_file.close()
+
+class SessionLogReader:
+    """Random access to the items of a session log: the index is loaded at once and each item is a single read"""
+    def __init__(self, path: Path):
+        assert is_session_log(path), f"Not a session log: '{path}'"
+        self.path = Path(path)
+        self._index = SessionLogReader.read_index(self.path)
+        self._files = {}
+        self._lock = threading.Lock() # seek + read on shared file handles
+
+    @staticmethod
+    def read_index(path: Path) -> np.ndarray:
+        """the index records. A partially written record (the writer is appending) is ignored"""
+        if not (index_path := Path(path) / INDEX_FILE).exists():
+            return np.empty(0, dtype=INDEX_DTYPE)
+        n_records = index_path.stat().st_size // INDEX_DTYPE.itemsize
+        return np.fromfile(index_path, dtype=INDEX_DTYPE, count=n_records)
+
+    @property
+    def timestamps(self) -> list[str]:
+        """the timestamps of all the items, in the order they were written"""
+        return [ts.decode() for ts in self._index["timestamp"]]
+
+    def refresh(self):
+        """reloads the index, i.e. to see the items appended since this reader was created"""
+        self._index = SessionLogReader.read_index(self.path)
+
+    def close(self):
+        """closes the segment files"""
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+
+    def keys(self, ix: int) -> list[str]:
+        """the keys of an item, read from its header only (the buffers are neither read nor decoded)"""
+        _, segment, offset, _ = self._index[ix]
+        with self._lock:
+            file = self._file(segment)
+            file.seek(offset)
+            (header_len, ) = _HEADER_LEN.unpack(file.read(_HEADER_LEN.size))
+            return [k for k, *_ in pickle.loads(file.read(header_len))]
+
+    def _file(self, segment: int):
+        if (file := self._files.get(segment)) is None:
+            file = self._files[segment] = open(_segment_path(self.path, segment), "rb") # pylint: disable=R1732
+        return file
+
+    def __getitem__(self, ix: int) -> dict[str, Any]:
+        _, segment, offset, length = self._index[ix]
+        with self._lock:
+            file = self._file(segment)
+            file.seek(offset)
+            return decode_item(file.read(length))
+
+    def __len__(self):
+        return len(self._index)
@@ -1,7 +1,13 @@
 """sync.py - synchronization primitives"""
+from collections import deque
+from typing import Any, Callable, Hashable
+import heapq
+import itertools
 import threading
-from datetime import datetime
-import time
+from datetime import datetime, timedelta
+
+from .utils import logger
+from .clock import get_clock
 
 def wait_and_clear(event: threading.Event, timeout: float | None = None):
     """wait for green light and set red light again. Used in get_state() at the beginning."""
@@ -11,6 +17,161 @@ def wait_and_clear(event: threading.Event, timeout: float | None = None):
 def freq_barrier(frequency: float, prev_time: datetime) -> datetime:
     """sleeps for the amount of time required between two consuecitive runs as per frequency. Returns new time."""
     assert frequency > 0, frequency
-    diff = (1 / frequency) - ((now := datetime.now()) - prev_time).total_seconds()
-    time.sleep(diff if diff > 0 else 0)
-    return now
+    diff = (1 / frequency) - ((clock := get_clock()).now() - prev_time).total_seconds()
+    clock.sleep(diff if diff > 0 else 0)
+    return clock.now() # after the sleep, so the next call waits a full period after this one returned
+
+class WorkEvent(threading.Event):
+    """
+    Event signaling an item to another thread (i.e. Environment.data_ready, a new frame for the raw producer). A set is
+    announced to the clock (see Clock.add_work) and taken by the thread that clears it, so a virtual time waits for it.
+    """
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def set(self):
+        with self._lock:
+            if not self.is_set():
+                get_clock().add_work()
+            super().set()
+
+    def clear(self):
+        with self._lock:
+            if self.is_set():
+                get_clock().take_work()
+            super().clear()
+
+class LatestSlot:
+    """Bounded (size 1) latest-value slot between a producer and a consumer thread. put() overwrites untaken items."""
+    def __init__(self):
+        self._item: Any | None = None
+        self._cond = threading.Condition()
+        self.n_overwritten = 0 # number of items dropped because the consumer was busy
+
+    def put(self, item: Any) -> bool:
+        """puts an item in the slot, replacing the previous one if it wasn't taken by the consumer (returns True)"""
+        with self._cond:
+            overwritten = self._item is not None
+            self.n_overwritten += overwritten
+            self._item = item
+            self._cond.notify()
+            return overwritten
+
+    def take(self, timeout: float | None = None) -> Any | None:
+        """takes the item from the slot (leaving it empty). Returns None if no item arrived within the timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._item is not None, timeout):
+                return None
+            res, self._item = self._item, None
+            return res
+
+class BatchQueue:
+    """Bounded FIFO between a producer and a consumer thread that takes the items in batches. put() blocks if full."""
+    def __init__(self, maxsize: int):
+        assert maxsize > 0, maxsize
+        self.maxsize = maxsize
+        self._items: deque[Any] = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item: Any, timeout: float | None = None) -> bool:
+        """puts an item at the end of the queue. Returns False if the queue was still full after the timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def take_batch(self, max_size: int, max_wait_s: float, timeout: float | None = None) -> list[Any]:
+        """
+        Takes up to max_size items in FIFO order. Waits for the first item at most 'timeout' (returns [] if none) and
+        then at most 'max_wait_s' for the batch to fill up, so a partial batch is returned when the producer is slow.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) > 0, timeout):
+                return []
+            self._cond.wait_for(lambda: len(self._items) >= max_size, max_wait_s)
+            res = [self._items.popleft() for _ in range(min(max_size, len(self._items)))]
+            self._cond.notify_all()
+            return res
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+class TimerScheduler:
+    """
+    Runs delayed callbacks (i.e. stopping the gimbal after piloting_time) from a single daemon thread and a heap,
+    instead of a threading.Timer thread per call. Callbacks are keyed: scheduling a key that is still pending replaces
+    it, so a re-issued command extends the pending one instead of stacking. The lateness (actual call time - deadline)
+    of the calls is tracked so the scheduler's latency can be measured (see max_lateness_s and mean_lateness_s).
+    The delays are in the time of get_clock(), so the callbacks follow a virtual time too (checked every TICK_S).
+    """
+    TICK_S = 0.01 # the longest wait between two deadline checks, as a virtual clock's sleep can't be interrupted
+
+    def __init__(self, name: str = "TimerScheduler"):
+        self.name = name
+        self._heap: list[tuple[datetime, int, Hashable]] = [] # (deadline, seq, key). Replaced entries are skipped
+        self._pending: dict[Hashable, tuple[int, Callable[[], Any]]] = {} # key -> (seq, fn) of the live entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self.n_calls = 0
+        self.n_replaced = 0 # number of pending callbacks replaced by a new one of the same key
+        self.max_lateness_s = 0.0
+        self._total_lateness_s = 0.0
+
+    def schedule(self, key: Hashable, delay_s: float, fn: Callable[[], Any]):
+        """calls fn after delay_s seconds, replacing the pending callback of this key (if any)"""
+        assert delay_s >= 0, delay_s
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+            self.n_replaced += key in self._pending
+            self._pending[key] = (seq := next(self._seq), fn)
+            get_clock().register(self._thread) # so a virtual time waits for the deadline
+            heapq.heappush(self._heap, (get_clock().now() + timedelta(seconds=delay_s), seq, key))
+            self._cond.notify()
+
+    def cancel(self, key: Hashable) -> bool:
+        """cancels the pending callback of this key. Returns False if there was none"""
+        with self._cond:
+            return self._pending.pop(key, None) is not None
+
+    @property
+    def mean_lateness_s(self) -> float:
+        """the average delay between the deadlines and the actual calls"""
+        return self._total_lateness_s / max(self.n_calls, 1)
+
+    def _next(self) -> tuple[datetime, Callable[[], Any]]:
+        """waits for the earliest live deadline and pops its callback"""
+        with self._cond:
+            while True:
+                while len(self._heap) > 0 and self._pending.get(self._heap[0][2], (None, ))[0] != self._heap[0][1]:
+                    heapq.heappop(self._heap) # replaced or cancelled
+                if len(self._heap) == 0:
+                    get_clock().wait(self._cond)
+                    continue
+                if (wait_s := (self._heap[0][0] - get_clock().now()).total_seconds()) > 0:
+                    get_clock().wait(self._cond, min(wait_s, self.TICK_S)) # the real one wakes up on new deadlines
+                    continue
+                deadline, _, key = heapq.heappop(self._heap)
+                return deadline, self._pending.pop(key)[1]
+
+    def _run(self):
+        while True:
+            deadline, fn = self._next()
+            lateness_s = (get_clock().now() - deadline).total_seconds()
+            self.n_calls += 1
+            self.max_lateness_s = max(self.max_lateness_s, lateness_s)
+            self._total_lateness_s += lateness_s
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Error in {self.name} callback {fn}: {e}")
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
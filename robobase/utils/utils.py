@@ -1,7 +1,9 @@
 """generic utils file"""
 from pathlib import Path
 import os
+import sys
 from datetime import datetime
+from multiprocessing import current_process
 from typing import Any
 import numpy as np
 from loggez import make_logger
@@ -12,14 +14,27 @@ def get_project_root() -> Path:
 
 # Create a logger. For the logs dir we have a few options: ROBOBASE_STORE_LOGS must be >=1 otherwise no logs.
 # For the file, if the env. var ROBOBASE_LOGS_DIR is set, then it's used, otherwise defaults to proj_root/logs/now_iso
+# Worker processes (i.e. ProcessDataProducer or the DataStorer pool) re-import us, but only the main process has a file.
+# Note: spawn sets the name of the process before importing the main module (and us), unlike parent_process().
 logs_dir = os.getenv("ROBOBASE_LOGS_DIR", get_project_root() / "logs" / datetime.now().isoformat()[0:-7])
-log_file = f"{logs_dir}/ROBOBASE.txt" if os.getenv("ROBOBASE_STORE_LOGS", "1") in ("1", "2") else None
+log_file = f"{logs_dir}/ROBOBASE.txt" if os.getenv("ROBOBASE_STORE_LOGS", "1") in ("1", "2") \
+    and current_process().name == "MainProcess" else None
 logger = make_logger("ROBOBASE", log_file=log_file)
 
 def parsed_str_type(item: Any) -> str:
     """Given an object with a type of the format: <class 'A.B.C.D'>, parse it and return 'A.B.C.D'"""
     return str(type(item)).rsplit(".", maxsplit=1)[-1][0:-2]
 
+def item_nbytes(item: Any) -> int:
+    """(approximate) size in bytes of an item: exact for the arrays, recursive for dicts, lists and tuples"""
+    if isinstance(item, np.ndarray) and item.dtype != object:
+        return item.nbytes
+    if isinstance(item, dict):
+        return sum(item_nbytes(v) for v in item.values())
+    if isinstance(item, (list, tuple)):
+        return sum(item_nbytes(v) for v in item)
+    return sys.getsizeof(item)
+
 def load_npz_as_dict(path: Path) -> dict[str, Any]:
     """Loads a stored npz as a dict by trying our best to unpickle it"""
     data = np.load(path, allow_pickle=True)
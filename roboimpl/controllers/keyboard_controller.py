@@ -19,7 +19,7 @@ class KeyboardController(BaseController):
                  keyboard_fn: KeyboardFn = None, key_to_action: dict[Key, Action] | None = None):
         if key_to_action is not None:
             assert keyboard_fn is None, "key_to_action cannot be set if keyboard_fn is also set"
-        super().__init__(data_channel, actions_queue)
+        super().__init__(data_channel, actions_queue, modalities=[]) # keys only: no producer runs on our behalf
         self.keyboard_fn = keyboard_fn or self._keyboard_fn
         self.key_to_action = key_to_action or {}
         self.backend = backend
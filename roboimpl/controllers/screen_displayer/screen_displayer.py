@@ -18,12 +18,15 @@ INITIAL_RESOLUTION_FALLBACK = (480, 640)
 DEFAULT_BACKEND = os.getenv("ROBOIMPL_SCREEN_DISPLAYER_BACKEND", "sdl2")
 
 class ScreenDisplayer(BaseController):
-    """ScreenDisplayer provides support for displaying the DataChannel at each frame + support for keyboard actions."""
+    """
+    ScreenDisplayer provides support for displaying the DataChannel at each frame + support for keyboard actions.
+    Use set_modalities() when an overlay is toggled (i.e. depth) so its producer stops running while it's hidden.
+    """
     def __init__(self, data_channel: DataChannel, actions_queue: ActionsQueue,
                  resolution: tuple[int, int] | None = None,
                  screen_frame_callback: Callable[[DataItem], np.ndarray | None] | None = None,
-                 backend: str | None = None):
-        super().__init__(data_channel=data_channel, actions_queue=actions_queue)
+                 backend: str | None = None, modalities: list[str] | None = None):
+        super().__init__(data_channel=data_channel, actions_queue=actions_queue, modalities=modalities)
         self.initial_resolution = resolution
         self.backend_type = backend or DEFAULT_BACKEND
         self.screen_frame_callback = screen_frame_callback or ScreenDisplayer.rgb_only_displayer
@@ -81,4 +84,5 @@ class ScreenDisplayer(BaseController):
             old_state = new_state
 
         self.backend.close_window()
+        self.data_channel.remove_demand(self.name)
         logger.warning("ScreenDisplayer thread stopping")
@@ -36,8 +36,7 @@ class UDPController(BaseController):
             try:
                 items = message.split(" ")
                 action = Action(name=items[0], parameters=tuple(items[1:]))
-                self.actions_queue.put(action, data_ts=now, block=True)
-                msg = "OK"
+                msg = "OK" if self.actions_queue.put(action, data_ts=now) else "Dropped (actions queue is full)"
             except Exception as e:
                 logger.error(msg := str(e))
                 msg = f"Unknown message: {message}" if "not in" in msg else msg # for e2e test
@@ -1,5 +1,7 @@
 """vre_data_producers.py - Interface between video-representations-extractor and robobase"""
 from pathlib import Path
+from overrides import overrides
+import numpy as np
 from vre.representations import build_representations_from_cfg # pylint: disable=all
 from vre import MemoryData, Representation, ReprOut # pylint: disable=all
 from vre.representations.mixins import LearnedRepresentationMixin # pylint: disable=all
@@ -14,19 +16,26 @@ class VREDataProducer(DataProducer):
         self.repr = representation
         super().__init__(modalities=[self.repr.name], dependencies=self.repr.dep_names)
 
+    @overrides
     def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        return self.produce_batch([deps])[0]
+
+    @overrides
+    def produce_batch(self, deps_batch: list[dict[str, DataItem] | None]) -> list[dict[str, DataItem]]:
         if isinstance(self.repr, LearnedRepresentationMixin) and not self.repr.setup_called:
             logger.debug(f"Repr: {self.repr.name}. Device: {self.repr.device}. You can control via VRE_DEVICE=cpu/cuda")
             self.repr.vre_setup()
         # TODO: we may need to be able to pass a compute_fn to change defaults (i.e. resize or not) from app level.
-        # Note that while VRE operates at batch level, robobase operates at frame level (streaming), so we create a
-        # batch of size 1: (B, H, C) -> (1, B, H, C) -> vre -> (1, B, H, C') -> (B, H, C').
-        video = deps["rgb"][None] # rgb must always be here in thge case of VRE. (1, B, H, 3)
+        # Note that while VRE operates at batch level, robobase operates at frame level (streaming), so we stack the
+        # frames of the batch (1 unless micro-batched): B x (H, W, C) -> (B, H, W, C) -> vre -> (B, H, W, C') -> B x ..
+        ixs = list(range(len(deps_batch)))
+        video = np.stack([deps["rgb"] for deps in deps_batch]) # (B, H, W, 3). rgb is always here for VRE
         dep_data = []
         for dep_name in self.repr.dep_names:
-            dep_data.append(ReprOut(frames=video, output=MemoryData(deps[dep_name][None]), key=[0]))
-        out_repr = self.repr.compute(video=video, ixs=[0], dep_data=dep_data)
-        return {self.repr.name: out_repr.output[0]}
+            dep_frames = np.stack([deps[dep_name] for deps in deps_batch])
+            dep_data.append(ReprOut(frames=video, output=MemoryData(dep_frames), key=ixs))
+        out_repr = self.repr.compute(video=video, ixs=ixs, dep_data=dep_data)
+        return [{self.repr.name: out_repr.output[i]} for i in ixs]
 
 def build_vre_data_producers(cfg: Path | str | dict) -> list[VREDataProducer]:
     """given a VRE config (path or dict), builds the VRE Representations and turn them into robobase DataProducers"""
@@ -2,7 +2,7 @@
 import numpy as np
 from overrides import overrides
 from ultralytics import YOLO # pylint: disable=import-error
-from ultralytics.engine.results import Masks, Boxes # pylint: disable=import-error
+from ultralytics.engine.results import Masks, Boxes, Results # pylint: disable=import-error
 from torch.nn import functional as F
 from loggez import make_logger
 from robobase import DataProducer, DataItem
@@ -22,10 +22,9 @@ class YOLODataProducer(DataProducer):
         self.resize_segmentations = resize_segmentations
         self.bgr = bgr
 
-    def _compute_yolo(self, rgb: np.ndarray) \
+    def _compute_yolo(self, results: Results) \
             -> tuple[list[Bbox], list[float], list[Segmentation] | None, list[np.ndarray] | None] | None:
         """returns 4 lists: bounding boxes (over thr), confidences of bboxes, segmentation masks and segmentations xy"""
-        results = self.yolo.predict(rgb)[0]
         boxes = good_boxes = results.boxes
         masks = good_masks = results.masks
 
@@ -55,10 +54,18 @@ class YOLODataProducer(DataProducer):
 
     @overrides
     def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
-        logger.log_every_s(f"RGB: {deps['rgb'].shape}", "DEBUG")
-        rgb = deps["rgb"] if self.bgr is False else deps["rgb"][..., ::-1] # some yolo model'r trained with BGR images:)
-        yolo_res = self._compute_yolo(rgb)
-        bbox, bbox_confidence, segmentation, segmentation_xy = yolo_res if yolo_res is not None else [None] * 4
-        logger.log_every_s(f"Segmentation: {segmentation.shape if segmentation is not None else None}", "DEBUG")
-        return {"bbox": bbox, "bbox_confidence": bbox_confidence,
-                "segmentation": segmentation, "segmentation_xy": segmentation_xy}
+        return self.produce_batch([deps])[0]
+
+    @overrides
+    def produce_batch(self, deps_batch: list[dict[str, DataItem] | None]) -> list[dict[str, DataItem]]:
+        logger.log_every_s(f"RGB: {deps_batch[0]['rgb'].shape}. Batch: {len(deps_batch)}", "DEBUG")
+        # some yolo model'r trained with BGR images :)
+        rgbs = [deps["rgb"] if self.bgr is False else deps["rgb"][..., ::-1] for deps in deps_batch]
+        res = []
+        for results in self.yolo.predict(rgbs): # a list of images is predicted as a single batch
+            yolo_res = self._compute_yolo(results)
+            bbox, bbox_confidence, segmentation, segmentation_xy = yolo_res if yolo_res is not None else [None] * 4
+            logger.log_every_s(f"Segmentation: {segmentation.shape if segmentation is not None else None}", "DEBUG")
+            res.append({"bbox": bbox, "bbox_confidence": bbox_confidence,
+                        "segmentation": segmentation, "segmentation_xy": segmentation_xy})
+        return res
@@ -2,8 +2,9 @@
 
 try:
     from .gym_env import GymEnv, GymState, gym_actions_fn, GYM_ACTION_NAMES
+    from .gym_vector_env import GymVectorEnv
 
-    __all__ = ["GymEnv", "GymState", "gym_actions_fn", "GYM_ACTION_NAMES"]
+    __all__ = ["GymEnv", "GymState", "gym_actions_fn", "GYM_ACTION_NAMES", "GymVectorEnv"]
 except ImportError as e:
     from roboimpl.utils import logger
     logger.warning(f"gym could not be imported {e}. Did you run 'pip install -r requirements-extra.txt' ?")
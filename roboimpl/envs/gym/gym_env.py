@@ -84,8 +84,9 @@ class GymEnv(Environment):
     def step(self, action: Any):
         """Apply a step in the gym environment. Updates the state as well."""
         self.total_steps += 1
-        if self.total_steps == self.max_steps:
-            logger.info(f"Environment: '{self.env.spec.id}' stops as {self.total_steps} reached max steps")
+        if self.total_steps == self.max_steps: # no spec for the envs (or vector envs) that are not built by gym.make
+            env_id = self.env.spec.id if self.env.spec is not None else type(self.env).__name__
+            logger.info(f"Environment: '{env_id}' stops as {self.total_steps} reached max steps")
         self._last_state = GymState(*self.env.step(action))
         self.data_ready.set() # set to green light
 
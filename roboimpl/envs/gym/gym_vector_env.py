@@ -0,0 +1,46 @@
+"""gym_vector_env.py - Wrapper for gymnasium vector environments: N copies of an env stepped with batched actions"""
+from __future__ import annotations
+from typing import Any
+from overrides import overrides
+import numpy as np
+import gymnasium as gym # pylint: disable=import-error
+
+from .gym_env import GymEnv, GymState, MAX_STEPS, INITIAL_SEED
+
+class GymVectorEnv(GymEnv):
+    """
+    Wrapper for a gymnasium vector env (SyncVectorEnv or AsyncVectorEnv), so a controller makes one (batched) policy
+    call per tick for num_envs environments. The 'state' modality is a GymState of batched fields: observation is
+    (num_envs, *obs_shape) and reward, terminated and truncated are (num_envs, ). The 'step' action (see gym_actions_fn)
+    takes a batch of num_envs actions (i.e. env.action_space.sample()). The finished sub-envs are reset by gymnasium
+    (autoreset), so the controller doesn't send 'reset' for them: with the default (next step) mode, the action of a
+    sub-env at the step after it finished is ignored and its observation is the reset one. 'reset' resets all of them.
+    max_steps counts vector steps, so the number of samples is total_steps * num_envs.
+    """
+    def __init__(self, env: gym.vector.VectorEnv, max_steps: int | None = MAX_STEPS, seed: int | None = INITIAL_SEED):
+        assert isinstance(env, gym.vector.VectorEnv), f"Expected a gym.vector.VectorEnv, got {type(env)}"
+        self.num_envs = env.num_envs
+        self.single_action_space = env.single_action_space
+        super().__init__(env, max_steps=max_steps, seed=seed)
+
+    @staticmethod
+    def make(env_id: str, num_envs: int, asynchronous: bool = False, max_steps: int | None = MAX_STEPS,
+             seed: int | None = INITIAL_SEED, **kwargs) -> GymVectorEnv:
+        """builds the vector env of num_envs copies of env_id. asynchronous uses one process per env (AsyncVectorEnv)"""
+        env = gym.make_vec(env_id, num_envs=num_envs, vectorization_mode="async" if asynchronous else "sync", **kwargs)
+        return GymVectorEnv(env, max_steps=max_steps, seed=seed)
+
+    @overrides
+    def step(self, action: Any):
+        """Apply a step in all the sub-environments with a batch of num_envs actions"""
+        assert len(action) == self.num_envs, f"Expected {self.num_envs} actions (one per env), got {len(action)}"
+        super().step(action)
+
+    @overrides
+    def reset(self):
+        """Resets all the sub-environments. The seed is used for the first one and incremented for the others"""
+        res = self.env.reset(seed=self.seed)
+        self._last_state = GymState(observation=res[0], reward=np.full(self.num_envs, -2**31, dtype=np.float64),
+                                    terminated=np.zeros(self.num_envs, dtype=bool),
+                                    truncated=np.zeros(self.num_envs, dtype=bool), info=res[1])
+        self.data_ready.set() # set to green light
@@ -5,14 +5,18 @@ try:
     import os
 
     from .olympe_env import OlympeEnv
-    from .olympe_actions import olympe_actions_fn, olympe_action_fn, OLYMPE_ACTION_NAMES
+    from .olympe_actions import olympe_actions_fn, olympe_action_fn, OLYMPE_ACTION_NAMES, OLYMPE_ACTION_REDUCE_FNS, \
+        OLYMPE_ACTION_PRIORITIES, OLYMPE_ACTION_LANES, OLYMPE_TIMER_SCHEDULER
+    from .olympe_piloting import OLYMPE_PILOTING_REDUCE_FNS, clamped_sum_piloting, merge_piloting_actions
 
     if (val := os.getenv("OLYMPE_LOG_LEVEL", "")) != "":
         olympe.log.update_config({"loggers": {"olympe": {"level": val}}})
     else:
         olympe.log.update_config({"loggers": {"olympe": {"level": "CRITICAL"}}})
 
-    __all__ = ["OlympeEnv", "olympe_actions_fn", "olympe_action_fn", "OLYMPE_ACTION_NAMES", ]
+    __all__ = ["OlympeEnv", "olympe_actions_fn", "olympe_action_fn", "OLYMPE_ACTION_NAMES", "OLYMPE_ACTION_REDUCE_FNS",
+               "OLYMPE_ACTION_PRIORITIES", "OLYMPE_ACTION_LANES", "OLYMPE_TIMER_SCHEDULER",
+               "OLYMPE_PILOTING_REDUCE_FNS", "clamped_sum_piloting", "merge_piloting_actions"]
 except ImportError as e:
     from roboimpl.utils import logger
     logger.warning(f"olympe could not be imported {e}. Did you run 'pip install -r requirements-extra.txt' ?")
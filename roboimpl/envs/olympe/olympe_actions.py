@@ -1,16 +1,28 @@
 """olympe_actions.py - defines all the supported actions of an olympe drone from our generic ones to the drone's"""
-import threading
 from olympe.messages.ardrone3.Piloting import Landing, TakeOff
 from olympe.messages import gimbal
 
-from robobase import Action
+from robobase import Action, ActionReduceFn
+from robobase.utils import TimerScheduler
 from roboimpl.utils import logger
 from .olympe_env import OlympeEnv
+from .olympe_piloting import merge_piloting_actions
 
 # the list of all supported actions from our generic ones to the drone's internal ones.
 OLYMPE_ACTION_NAMES = [
     "DISCONNECT", "LIFT", "LAND", "PILOTING", "GIMBAL_UP", "GIMBAL_DOWN", "GIMBAL_ABSOLUTE"
 ]
+# continuous commands: the drone only needs the latest one, not a queue's worth (i.e. from the keyboard at 30Hz).
+# Note: 'latest' PILOTING merges all the controllers. For olympe_actions_fn(piloting_reduce='sum'), remove it.
+OLYMPE_ACTION_REDUCE_FNS = {"PILOTING": "latest", "GIMBAL_UP": "latest", "GIMBAL_DOWN": "latest",
+                            "GIMBAL_ABSOLUTE": "latest"}
+# safety actions: sent to the drone ahead of the queued movement commands
+OLYMPE_ACTION_PRIORITIES = {"DISCONNECT": 2, "LAND": 1}
+# independent actuators: a blocking TakeOff/Landing doesn't hold the gimbal commands. DISCONNECT is in its own lane.
+OLYMPE_ACTION_LANES = {"LIFT": "piloting", "LAND": "piloting", "PILOTING": "piloting", "GIMBAL_UP": "gimbal",
+                       "GIMBAL_DOWN": "gimbal", "GIMBAL_ABSOLUTE": "gimbal"}
+# the delayed stop commands (i.e. of the gimbal velocity actions) of all the drones. See its lateness for the latency
+OLYMPE_TIMER_SCHEDULER = TimerScheduler(name="OlympeTimerScheduler")
 
 def olympe_action_fn(env: OlympeEnv, action: Action) -> bool:
     """non-batch variant as olympe doesn't support ootb batching"""
@@ -35,10 +47,12 @@ def olympe_action_fn(env: OlympeEnv, action: Action) -> bool:
     if action.name == "GIMBAL_ABSOLUTE":
         gimbal_kwargs = {"gimbal_id": 0, "control_mode": "position", "yaw_frame_of_reference": "none", "yaw": 0,
                          "roll_frame_of_reference": "none", "roll": 0, "pitch_frame_of_reference": "absolute"}
+        OLYMPE_TIMER_SCHEDULER.cancel((drone, "gimbal_stop")) # a pending velocity stop would override the position
         drone(gimbal.set_target(pitch=action.parameters[0], **gimbal_kwargs))
         return True
 
-    # drone.piloting() does this for us, but for gimbal, we do it ourselves (blocking for now).
+    # drone.piloting() does this for us, but for gimbal, we do it ourselves. A re-issued command (i.e. a held key)
+    # replaces the pending stop, so it's extended to the latest command's piloting_time instead of cutting it short.
     velocity, piloting_time = action.parameters
     if not -100 <= velocity <= 100:
         logger.error(f"Velocity not in [-100:100]. Got: {velocity}")
@@ -47,20 +61,27 @@ def olympe_action_fn(env: OlympeEnv, action: Action) -> bool:
     # gimbal stuff
     gimbal_kwargs = {"gimbal_id": 0, "control_mode": "velocity", "yaw_frame_of_reference": "none", "yaw": 0,
                      "roll_frame_of_reference": "none", "roll": 0, "pitch_frame_of_reference": "absolute"}
+    def stop_fn():
+        drone(gimbal.set_target(pitch=0, **gimbal_kwargs))
     if action.name == "GIMBAL_UP":
         drone(gimbal.set_target(pitch=velocity / 100, **gimbal_kwargs)) # pitch is in [-1:1] for this API
-        threading.Timer(piloting_time, lambda: drone(gimbal.set_target(pitch=0, **gimbal_kwargs))).start()
+        OLYMPE_TIMER_SCHEDULER.schedule((drone, "gimbal_stop"), piloting_time, stop_fn)
         return True
     if action.name == "GIMBAL_DOWN":
         drone(gimbal.set_target(pitch=-velocity / 100, **gimbal_kwargs)) # pitch is in [-1:1] for this API
-        threading.Timer(piloting_time, lambda: drone(gimbal.set_target(pitch=0, **gimbal_kwargs))).start()
+        OLYMPE_TIMER_SCHEDULER.schedule((drone, "gimbal_stop"), piloting_time, stop_fn)
         return True
 
     return False
 
-def olympe_actions_fn(env: OlympeEnv, actions: list[Action]) -> bool:
-    """the actions callback from generic actions to drone-specific ones. Note: all move acts are in (velocity, time)"""
+def olympe_actions_fn(env: OlympeEnv, actions: list[Action], piloting_reduce: str | ActionReduceFn = "override",
+                      source_priorities: list[str] | None = None) -> bool:
+    """
+    the actions callback from generic actions to drone-specific ones. Note: all move acts are in (velocity, time).
+    The PILOTING actions of the batch are sent as a single command (see merge_piloting_actions). To use another rule
+    than 'override': functools.partial(olympe_actions_fn, piloting_reduce="sum") and no PILOTING reduce fn in the queue.
+    """
     all_good = True
-    for action in actions:
+    for action in merge_piloting_actions(actions, piloting_reduce, source_priorities):
         all_good = all_good and olympe_action_fn(env, action)
     return all_good
@@ -0,0 +1,38 @@
+"""olympe_piloting.py - how the PILOTING actions of many controllers become a single drone.piloting() call"""
+from functools import reduce
+from robobase import Action, ActionReduceFn
+from robobase.actions_queue import latest_wins, as_number
+
+def clamped_sum_piloting(prev: Action, new: Action) -> Action:
+    """
+    reduce fn for PILOTING: the velocities are summed and clamped to [-100:100], the piloting_time is the longest.
+    The parameters are parsed as numbers first, as the ones of UDPController are strings.
+    """
+    (*prev_velocities, prev_time), (*new_velocities, new_time) = [[as_number(x) for x in action.parameters]
+                                                                  for action in (prev, new)]
+    velocities = [max(-100, min(100, a + b)) for a, b in zip(prev_velocities, new_velocities, strict=True)]
+    return Action("PILOTING", (*velocities, max(prev_time, new_time)))
+
+# how the PILOTING actions of different sources in a tick (i.e. IBVS + keyboard) become a single drone.piloting() call:
+# 'override' (the one of the highest priority source wins, see merge_piloting_actions) or 'sum' (clamped vector sum)
+OLYMPE_PILOTING_REDUCE_FNS: dict[str, ActionReduceFn] = {"override": latest_wins, "sum": clamped_sum_piloting}
+
+def merge_piloting_actions(actions: list[Action], piloting_reduce: str | ActionReduceFn = "override",
+                           source_priorities: list[str] | None = None) -> list[Action]:
+    """
+    Merges the PILOTING actions into one, which takes the place of the last one. The others are kept as they are.
+    Only the latest PILOTING action of each source (controller) counts, the older ones are its stale backlog. The
+    sources are then reduced with piloting_reduce from the lowest to the highest priority one, so with 'override' the
+    first source of source_priorities in the batch wins. The unlisted sources (all of them if it's not set) come before
+    the listed ones, so among them the latest one wins. Note: it's pointless if the queue already coalesced the PILOTING
+    actions of all the sources into one (i.e. 'latest' in its reduce_fns), so don't use both.
+    """
+    reduce_fn = OLYMPE_PILOTING_REDUCE_FNS[piloting_reduce] if isinstance(piloting_reduce, str) else piloting_reduce
+    if len(piloting_ixs := [i for i, action in enumerate(actions) if action.name == "PILOTING"]) <= 1:
+        return actions
+    latest_ixs = {actions[i].source: i for i in piloting_ixs} # source -> the index of its latest PILOTING action
+    ranks = {source: i for i, source in enumerate(source_priorities or [])} # 0 is the highest priority
+    ixs = sorted(latest_ixs.values(), key=lambda i: (-ranks.get(actions[i].source, len(ranks)), i))
+    merged = reduce(reduce_fn, [actions[i] for i in ixs])
+    return [merged if i == piloting_ixs[-1] else action for i, action in enumerate(actions)
+            if action.name != "PILOTING" or i == piloting_ixs[-1]]
@@ -1,6 +1,6 @@
 """init file"""
 
 from .video_player_env import VideoPlayerEnv
-from .video_actions import video_actions_fn, VIDEO_ACTION_NAMES
+from .video_actions import video_actions_fn, VIDEO_ACTION_NAMES, VIDEO_ACTION_REDUCE_FNS
 __all__ = ["VideoPlayerEnv",
-            "video_actions_fn", "VIDEO_ACTION_NAMES"]
+            "video_actions_fn", "VIDEO_ACTION_NAMES", "VIDEO_ACTION_REDUCE_FNS"]
@@ -5,6 +5,7 @@ from roboimpl.utils import logger, image_write
 from .video_player_env import VideoPlayerEnv
 
 VIDEO_ACTION_NAMES = ["DISCONNECT", "PLAY_PAUSE", "GO_FORWARD", "GO_BACK", "TAKE_SCREENSHOT"]
+VIDEO_ACTION_REDUCE_FNS = {"GO_FORWARD": "sum", "GO_BACK": "sum"} # n frames: one jump instead of many small ones
 
 def video_actions_fn(video_player: VideoPlayerEnv, actions: list[Action], write_path: Path | None = None) -> bool:
     """the actions callback from generic actions to video-specific ones"""
@@ -7,7 +7,7 @@ from overrides import overrides
 from vre_video import VREVideo
 
 from robobase import Environment
-from robobase.utils import freq_barrier, wait_and_clear
+from robobase.utils import freq_barrier, wait_and_clear, get_clock
 from roboimpl.utils import logger
 
 class VideoPlayerEnv(threading.Thread, Environment):
@@ -46,6 +46,7 @@ class VideoPlayerEnv(threading.Thread, Environment):
 
     @overrides
     def run(self):
+        self._prev_time = get_clock().now() # so the first frame lasts a full period too
         while not self.is_done:
             try:
                 now = datetime.now()
@@ -56,13 +57,14 @@ class VideoPlayerEnv(threading.Thread, Environment):
                             self.is_done = True
                         self.frame_ix = self.frame_ix % len(self.video)
                     self._current_frame = self.video[self.frame_ix]
+                self.data_ready.set() # set green light before pacing, so the frame isn't replaced before it's read
                 self._prev_time = freq_barrier(self.fps, self._prev_time)
                 took_s = (datetime.now() - now).total_seconds()
                 logger.trace(f"Frame: {self.frame_ix}. FPS: {self.fps:.2f}. Took: {took_s:.5f}")
             except Exception as e:
                 logger.error(f"Error {e}\nTraceback: {traceback.format_exc()}")
                 self.is_done = True
-            self.data_ready.set() # set green light
+                self.data_ready.set() # set green light
 
     @overrides
     def close(self):
@@ -1,6 +1,6 @@
 from pathlib import Path
 from robobase import DataChannel
-from robobase.utils import DataStorer, logger
+from robobase.utils import DataStorer, SessionLogReader, logger
 import pytest
 
 def test_DataChannel_data_storer(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
@@ -14,7 +14,7 @@ def test_DataChannel_data_storer(tmp_path: Path, monkeypatch: pytest.MonkeyPatch
     channel.put({"rgb": 2})
     channel.close()
     DataStorer.get_instance().close()
-    assert len(list((tmp_path / "DataChannel").iterdir())) == 3
+    assert [item["rgb"] for item in SessionLogReader(tmp_path / "DataChannel")] == [0, 1, 2]
 
 if __name__ == "__main__":
     from tempfile import TemporaryDirectory
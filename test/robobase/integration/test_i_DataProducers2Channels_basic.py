@@ -1,6 +1,6 @@
 import numpy as np
 import time
-from robobase import DataChannel, DataProducer
+from robobase import DataChannel, DataProducer, LambdaDataProducer, AsyncDataProducer, BatchedDataProducer
 from robobase.data_producers2channels import DataProducers2Channels
 
 def test_i_DataProducers2Channels_basic():
@@ -28,5 +28,204 @@ def test_i_DataProducers2Channels_basic():
     assert len(channel._data) > 0
     assert (channel._data["rgb"] != 0).all() # unclear where the iteration will stop but we expect at least 2 iterations
 
+def test_i_DataProducers2Channels_pipelined():
+    """two stages of 0.1s each: sequential would give ~1 item per 0.2s, pipelined ~1 item per 0.1s"""
+    class Counter(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.1)
+            Counter.i += 1
+            return {"i": Counter.i}
+
+    class Slow(DataProducer):
+        def produce(self, deps = None):
+            time.sleep(0.1)
+            return {"slow": deps["i"]}
+
+    channel = DataChannel(supported_types=["i", "slow"], eq_fn=lambda a, b: a["i"] == b["i"])
+    data2channels = DataProducers2Channels([Slow(["slow"], ["i"]), Counter(["i"])], [channel])
+    data2channels.start()
+    time.sleep(1.05)
+    data, _, version = channel.get_since(0)
+    channel.close()
+    data2channels.close()
+
+    assert data["slow"] == data["i"]
+    assert version >= 7, version # 9 in theory, 4-5 if the stages ran sequentially
+
+def test_i_DataProducers2Channels_shared_producers():
+    """the producers are evaluated once per item even if more channels use them"""
+    class Counter(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.05)
+            Counter.i += 1
+            return {"i": Counter.i}
+
+    channel1 = DataChannel(supported_types=["i"], eq_fn=lambda a, b: a["i"] == b["i"])
+    channel2 = DataChannel(supported_types=["i", "i2"], eq_fn=lambda a, b: a["i"] == b["i"])
+    dps = [Counter(["i"]), LambdaDataProducer(lambda deps: {"i2": deps["i"] * 2}, ["i2"], ["i"])]
+    data2channels = DataProducers2Channels(dps, [channel1, channel2])
+    data2channels.start()
+    time.sleep(0.5)
+    _, _, version1 = channel1.get_since(0)
+    _, _, version2 = channel2.get_since(0)
+    channel1.close()
+    channel2.close()
+
+    assert Counter.i <= 11, Counter.i # ~20 if each channel called the producer separately
+    assert abs(version1 - version2) <= 1, (version1, version2)
+
+def test_i_DataProducers2Channels_async_producer():
+    """a slow async producer doesn't cap the rate of the fast ones. Its modality is older than the fast ones"""
+    class Counter(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.02)
+            Counter.i += 1
+            return {"i": Counter.i}
+
+    def slow_fn(deps):
+        time.sleep(0.2)
+        return {"slow": deps["i"]}
+
+    channel = DataChannel(supported_types=["i", "slow"], eq_fn=lambda a, b: a["i"] == b["i"])
+    slow = AsyncDataProducer(LambdaDataProducer(slow_fn, ["slow"], ["i"]), frequency=5)
+    data2channels = DataProducers2Channels([Counter(["i"]), slow], [channel])
+    data2channels.start()
+    time.sleep(1)
+    data, _, version = channel.get_since(0)
+    modalities_ts = channel.get_modalities_ts()
+    channel.close()
+
+    assert version >= 25, version # ~5 if the slow one was synchronous
+    assert data["slow"] < data["i"]
+    assert modalities_ts["slow"] < modalities_ts["i"]
+
+def test_i_DataProducers2Channels_early_duplicates():
+    """the raw producer returns each frame 5 times. The downstream producer must only run on the new ones"""
+    class Raw(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.005)
+            Raw.i += 1
+            return {"rgb": np.zeros((10, 10)) + Raw.i // 5}
+
+    n_calls = 0
+    def rev_fn(deps):
+        nonlocal n_calls
+        n_calls += 1
+        return {"rgb_rev": deps["rgb"][::-1]}
+
+    channel = DataChannel(supported_types=["rgb", "rgb_rev"], eq_fn=lambda a, b: np.allclose(a["rgb"], b["rgb"]))
+    data2channels = DataProducers2Channels([Raw(["rgb"]), LambdaDataProducer(rev_fn, ["rgb_rev"], ["rgb"])], [channel])
+    data2channels.start()
+    time.sleep(0.5)
+    channel.close()
+
+    assert Raw.i > 40, Raw.i
+    assert n_calls <= Raw.i // 5 + 1, (n_calls, Raw.i)
+    assert data2channels.n_duplicates >= Raw.i - n_calls - 2, (data2channels.n_duplicates, Raw.i, n_calls)
+
+def test_i_DataProducers2Channels_concurrent_level():
+    """two independent slow producers (same level) must take ~max(latency) per item, not the sum"""
+    class Raw(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            Raw.i += 1
+            return {"i": Raw.i}
+
+    def slow_fn(name):
+        def fn(deps):
+            time.sleep(0.1)
+            return {name: deps["i"]}
+        return fn
+
+    channel = DataChannel(supported_types=["i", "a", "b"], eq_fn=lambda a, b: a["i"] == b["i"])
+    data_producers = [Raw(["i"]), LambdaDataProducer(slow_fn("a"), ["a"], ["i"]),
+                      LambdaDataProducer(slow_fn("b"), ["b"], ["i"])]
+    data2channels = DataProducers2Channels(data_producers, [channel])
+    data2channels.start()
+    time.sleep(1)
+    data, _, version = channel.get_since(0)
+    channel.close()
+
+    assert version >= 7, version # ~5 if they were called one after another
+    assert data["a"] == data["b"] == data["i"]
+
+def test_i_DataProducers2Channels_batched():
+    """a fast (replay-like) raw producer and a NN-like producer that takes the same time for 1 or 4 frames"""
+    class Raw(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.005)
+            Raw.i += 1
+            return {"i": Raw.i}
+
+    class NN(DataProducer):
+        seen = []
+        batch_lens = []
+        def produce(self, deps = None):
+            raise ValueError("only batches")
+        def produce_batch(self, deps_batch):
+            time.sleep(0.05)
+            NN.seen.extend(deps["i"] for deps in deps_batch)
+            NN.batch_lens.append(len(deps_batch))
+            return [{"nn": deps["i"] * 10} for deps in deps_batch]
+
+    channel = DataChannel(supported_types=["i", "nn"], eq_fn=lambda a, b: a["i"] == b["i"])
+    nn = BatchedDataProducer(NN(["nn"], ["i"]), batch_size=4, max_wait_s=0.1)
+    data2channels = DataProducers2Channels([Raw(["i"]), nn], [channel])
+    data2channels.start()
+    time.sleep(1)
+    data, _, _ = channel.get_since(0)
+    channel.close()
+
+    assert data["nn"] == data["i"] * 10
+    assert max(NN.batch_lens) == 4 and len(NN.seen) >= 40, NN.batch_lens # ~20 if not batched
+    assert NN.seen == list(range(1, len(NN.seen) + 1)) # FIFO: no frame is dropped before the batched stage
+
+def test_i_DataProducers2Channels_demand_driven():
+    """depth is only produced while the (only) controller declares it. yolo's deps are produced if yolo is demanded"""
+    class Raw(DataProducer):
+        i = 0
+        def produce(self, deps = None):
+            time.sleep(0.01)
+            Raw.i += 1
+            return {"i": Raw.i}
+
+    n_calls = {"depth": 0, "feats": 0, "yolo": 0}
+    def fn(name, dep):
+        def produce_fn(deps):
+            n_calls[name] += 1
+            return {name: deps[dep]}
+        return LambdaDataProducer(produce_fn, [name], [dep])
+
+    channel = DataChannel(supported_types=["i", "depth", "feats", "yolo"], eq_fn=lambda a, b: a["i"] == b["i"])
+    data_producers = [Raw(["i"]), fn("depth", "i"), fn("feats", "i"), fn("yolo", "feats")]
+    channel.set_demand("controller", ["i"])
+    (data2channels := DataProducers2Channels(data_producers, [channel])).start()
+    time.sleep(0.3)
+    data, _ = channel.get()
+    assert data["depth"] is None and data["yolo"] is None and sum(n_calls.values()) == 0, (data, n_calls)
+
+    channel.set_demand("controller", ["i", "yolo"]) # i.e. a HUD was toggled on
+    time.sleep(0.3)
+    data, _ = channel.get()
+    assert data["depth"] is None and data["yolo"] == data["feats"] == data["i"], data
+    assert n_calls["depth"] == 0 and n_calls["yolo"] > 0 and n_calls["feats"] > 0, n_calls
+
+    channel.remove_demand("controller") # no declarations: all of them
+    time.sleep(0.3)
+    data, _ = channel.get()
+    assert data["depth"] == data["i"] and n_calls["depth"] > 0, (data, n_calls)
+
+    channel.set_demand("controller", ["i"]) # the pruned modalities keep their last produced value, not None
+    time.sleep(0.3)
+    data, _ = channel.get()
+    channel.close()
+    assert data["depth"] is not None and data["depth"] < data["i"] , data
+    assert data2channels.n_duplicates == 0
+
 if __name__ == "__main__":
     test_i_DataProducers2Channels_basic()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""lockstep (single-threaded) runs of a Robot: same results for the same seed, no threads and no sleeps"""
+import threading
+from queue import Queue
+import numpy as np
+import pytest
+from robobase import Robot, Environment, DataChannel, ActionsQueue, Action, DataItem
+from robobase.utils import wait_and_clear
+
+class RandomWalkEnv(Environment):
+    """1D random walk driven by the actions. get_state() blocks until the env is stepped, as in the threaded mode"""
+    def __init__(self, max_steps: int):
+        super().__init__()
+        self.position, self.n_steps, self.max_steps = 0, 0, max_steps
+        self.data_ready.set()
+    def step(self, delta: int):
+        self.position += delta
+        self.n_steps += 1
+        self.data_ready.set()
+    def is_running(self) -> bool:
+        return self.n_steps < self.max_steps
+    def get_state(self) -> dict:
+        wait_and_clear(self.data_ready)
+        return {"position": self.position, "n_steps": self.n_steps}
+    def get_modalities(self) -> list[str]:
+        return ["position", "n_steps"]
+
+def _run(seed: int, max_steps: int = 1000) -> tuple[list[int], int]:
+    env, rng, positions = RandomWalkEnv(max_steps), np.random.default_rng(seed), []
+    data_channel = DataChannel(supported_types=["position", "n_steps"], eq_fn=lambda a, b: a == b)
+    actions_queue = ActionsQueue(action_names=["move"])
+    def controller_fn(data: dict[str, DataItem]) -> list[Action]:
+        positions.append(data["position"])
+        return [Action("move", (int(rng.integers(-1, 2)), ))]
+    robot = Robot(env, data_channel, actions_queue,
+                  actions_fn=lambda env, acts: [env.step(a.parameters[0]) for a in acts])
+    robot.add_controller(controller_fn)
+    n_threads = threading.active_count()
+    assert robot.run_lockstep() == max_steps and threading.active_count() == n_threads
+    return positions, env.position
+
+def test_i_Robot_lockstep_reproducible():
+    positions, final = _run(seed=42)
+    assert len(positions) == 1000 and (positions, final) == _run(seed=42)
+    assert (positions, final) != _run(seed=43)
+
+def test_i_Robot_lockstep_n_steps():
+    env = RandomWalkEnv(max_steps=100)
+    data_channel = DataChannel(supported_types=["position", "n_steps"], eq_fn=lambda a, b: a == b)
+    robot = Robot(env, data_channel, ActionsQueue(action_names=["move"]),
+                  actions_fn=lambda env, acts: [env.step(a.parameters[0]) for a in acts])
+    with pytest.raises(AssertionError): # no controllers
+        robot.run_lockstep(n_steps=10)
+    robot.add_controller(lambda data: [Action("move", (1, ))] if data["n_steps"] < 5 else [])
+    assert robot.run_lockstep(n_steps=10) == 10 # the env stops being stepped after 5 actions, but it's still running
+    assert env.position == 5 and data_channel.subscribers_stats["Controller-0"].received == 6
+
+def test_i_Robot_lockstep_full_queue():
+    env = RandomWalkEnv(max_steps=1000)
+    data_channel = DataChannel(supported_types=["position", "n_steps"], eq_fn=lambda a, b: a == b)
+    actions_queue = ActionsQueue(action_names=["move"], queue=Queue(maxsize=20)) # overflow='block'
+    robot = Robot(env, data_channel, actions_queue,
+                  actions_fn=lambda env, acts: [env.step(a.parameters[0]) for a in acts])
+    robot.add_controller(lambda data: [Action("move", (1, ))] * 25) # more than the queue can hold in one step
+    assert robot.run_lockstep(n_steps=3) == 3 # doesn't deadlock
+    assert env.position == 75 and len(actions_queue) == 0
@@ -6,10 +6,9 @@ from pathlib import Path
 from copy import deepcopy
 from datetime import datetime
 import pytest
-import numpy as np
 from robobase import Robot, Environment, DataChannel, ActionsQueue, Action, DataItem
 from robobase.replay import ReplayDataProducer, ReplayActionsQueue
-from robobase.utils import wait_and_clear, DataStorer, logger
+from robobase.utils import wait_and_clear, DataStorer, SessionLogReader, logger
 
 TARGET = "helloworld"
 
@@ -54,18 +53,16 @@ def test_i_Robot_replay_from_logs(tmp_path: Path, monkeypatch: pytest.MonkeyPatc
 
     DataStorer.get_instance().close()
 
-    # Load Data .npz files and compare states
-    data_files = sorted(list((tmp_path / "DataChannel").iterdir()), key=lambda p: p.name)
-    data = [np.load(x, allow_pickle=True) for x in data_files]
+    # Load the data session log and compare states
+    data = SessionLogReader(tmp_path / "DataChannel")
     for i in range(len(data)):
         assert "".join(data[i]["state"]) == TARGET[0:i]
 
-    # Load Actions .npz files and compare states
-    actions_files = sorted(list((tmp_path / "ActionsQueue").iterdir()), key=lambda p: p.name)
-    actions = [np.load(x, allow_pickle=True) for x in actions_files]
+    # Load the actions session log and compare states
+    actions = SessionLogReader(tmp_path / "ActionsQueue")
     for i in range(len(actions)):
-        assert actions[i]["action"].item().name == TARGET[i], (actions[i], TARGET[i])
-        assert actions[i]["data_ts"].item() == data_files[i].stem
+        assert actions[i]["action"].name == TARGET[i], (actions[i], TARGET[i])
+        assert actions[i]["data_ts"] == data.timestamps[i]
 
 def test_i_Robot_replay_from_logs_ReplayDataProducer_ReplayActionsQueue(tmp_path: Path,
                                                                         monkeypatch: pytest.MonkeyPatch):
@@ -124,7 +121,7 @@ def test_i_Robot_replay_from_logs_offline_exception(tmp_path: Path, monkeypatch:
     def replay_controller_fn(data: dict[str, DataItem]) -> list[Action]:
         if len(data["state"]) == len(TARGET):
             return []
-        assert data["state"] == data["replay_state"].tolist(), (data["state"], data["replay_state"])
+        assert data["state"] == data["replay_state"], (data["state"], data["replay_state"])
         return [Action(TARGET[len(data["state"])])]
 
     # just read the data that was created via the data channel
@@ -169,7 +166,7 @@ def test_i_Robot_replay_from_logs_online_compare(tmp_path: Path, monkeypatch: py
     def replay_controller_fn(data: dict[str, DataItem]) -> list[Action]:
         if len(data["state"]) == len(TARGET):
             return []
-        assert data["state"] == data["replay_state"].tolist(), (data["state"], data["replay_state"])
+        assert data["state"] == data["replay_state"], (data["state"], data["replay_state"])
         return [Action(TARGET[len(data["state"])])]
 
     # just read the data that was created via the data channel
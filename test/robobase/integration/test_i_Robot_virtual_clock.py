@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""a Robot processing a 'video' under a virtual clock: faster than real-time, but no frame is skipped"""
+from datetime import datetime
+import threading
+import time
+from robobase import Robot, Environment, DataChannel, ActionsQueue, DataProducer, DataItem
+from robobase.utils import VirtualClock, get_clock, set_clock, freq_barrier, wait_and_clear
+
+N_FRAMES, FPS = 60, 30
+
+class VideoEnv(threading.Thread, Environment):
+    """plays N_FRAMES frames at FPS with freq_barrier, like VideoPlayerEnv"""
+    def __init__(self):
+        threading.Thread.__init__(self, daemon=True)
+        Environment.__init__(self)
+        self.frame_ix, self.is_done = -1, False
+    def run(self):
+        prev_time = get_clock().now()
+        for i in range(N_FRAMES):
+            self.frame_ix = i
+            self.data_ready.set()
+            prev_time = freq_barrier(FPS, prev_time)
+        self.is_done = True
+    def is_running(self) -> bool:
+        return not self.is_done
+    def get_state(self) -> dict:
+        wait_and_clear(self.data_ready)
+        return {"frame_ix": self.frame_ix}
+    def get_modalities(self) -> list[str]:
+        return ["frame_ix"]
+
+class SlowProducer(DataProducer):
+    """a (real) time consuming producer, i.e. a neural network, way slower than the virtual frame rate"""
+    def __init__(self):
+        super().__init__(modalities=["slow"], dependencies=["frame_ix"])
+    def produce(self, deps: dict[str, DataItem] | None = None) -> dict[str, DataItem]:
+        time.sleep(0.01)
+        return {"slow": deps["frame_ix"]}
+
+def test_i_Robot_virtual_clock_no_skipped_frames():
+    prev_clock = set_clock(clock := VirtualClock(start=datetime(2000, 1, 1)))
+    try:
+        env, seen = VideoEnv(), []
+        clock.register(env)
+        data_channel = DataChannel(supported_types=["frame_ix", "slow"], eq_fn=lambda a, b: a == b)
+        robot = Robot(env, data_channel, ActionsQueue(action_names=["noop"]), actions_fn=lambda env, actions: True)
+        robot.add_data_producer(SlowProducer())
+        def controller_fn(data: dict[str, DataItem]) -> list:
+            time.sleep(0.005)
+            seen.append((data["frame_ix"], data["slow"]))
+            return []
+        robot.add_controller(controller_fn)
+        robot.add_other_thread(env)
+        robot.run(sleep_duration=0.05, print_status=False)
+    finally:
+        set_clock(prev_clock)
+    assert seen == [(i, i) for i in range(N_FRAMES)] # all the frames, in order, with the slow modality of each
+    assert abs((clock.now() - datetime(2000, 1, 1)).total_seconds() - N_FRAMES / FPS) < 0.1
@@ -12,3 +12,8 @@ def test_Action_eq():
 
     assert action == action2
     assert action2 != action3
+
+def test_Action_source():
+    action, action2 = Action("a", (5, ), source="keyboard"), Action("a", (5, ), source="ibvs")
+    assert action == action2 and hash(action) == hash(action2) and action.source == "keyboard"
+    assert Action("a").source is None
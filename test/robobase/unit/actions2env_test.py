@@ -0,0 +1,103 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import time
+from robobase import ActionsQueue, Actions2Environment, Action as A, Environment
+
+class FakeEnv(Environment):
+    def __init__(self):
+        super().__init__()
+        self.running = True
+    def get_state(self):
+        return {}
+    def is_running(self):
+        return self.running
+    def get_modalities(self):
+        return []
+
+def test_Actions2Environment_coalesce_flood():
+    env, applied = FakeEnv(), []
+    def actions_fn(env: Environment, actions: list[A]) -> bool:
+        applied.append(actions)
+        time.sleep(0.05) # a slow env (i.e. a drone command), so the keyboard floods the queue meanwhile
+        return True
+
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], reduce_fns={"PILOTING": "latest"})
+    (a2e := Actions2Environment(env, aq, actions_fn)).start()
+    for i in range(20): # 200 Hz
+        aq.put(A("PILOTING", (i, )), data_ts=None)
+        time.sleep(0.005)
+    time.sleep(0.1)
+    env.running = False
+    a2e.join()
+
+    assert applied[-1] == [A("PILOTING", (19, ))] # the latest one is always applied
+    assert all(len(actions) == 1 for actions in applied), applied
+    assert len(applied) < 10 and a2e.n_coalesced == 20 - len(applied), (applied, a2e.n_coalesced)
+
+def test_Actions2Environment_wakeup():
+    env, applied_at = FakeEnv(), []
+    aq = ActionsQueue(action_names=["LAND"])
+    (a2e := Actions2Environment(env, aq, lambda env, actions: applied_at.append(time.perf_counter()))).start()
+    time.sleep(0.05) # the thread is now waiting for actions
+    put_at = time.perf_counter()
+    aq.put(A("LAND"), data_ts=None)
+    time.sleep(0.05)
+    env.running = False
+    a2e.join()
+    assert len(applied_at) == 1 and applied_at[0] - put_at < 0.01, (applied_at, put_at) # woken up, not polled
+
+def test_Actions2Environment_priorities():
+    env, applied = FakeEnv(), []
+    def actions_fn(env: Environment, actions: list[A]) -> bool:
+        applied.append(actions)
+        time.sleep(0.05)
+        return True
+
+    aq = ActionsQueue(action_names=["PILOTING", "GIMBAL", "LAND"], priorities={"LAND": 1})
+    aq.put(A("PILOTING", (0, )), data_ts=None)
+    (a2e := Actions2Environment(env, aq, actions_fn)).start()
+    time.sleep(0.01) # the first PILOTING is being applied
+    for i in range(1, 10):
+        aq.put(A("PILOTING", (i, )), data_ts=None)
+        aq.put(A("GIMBAL", (i, )), data_ts=None)
+    aq.put(A("LAND"), data_ts=None)
+    time.sleep(0.2)
+    env.running = False
+    a2e.join()
+    assert applied[0] == [A("PILOTING", (0, ))]
+    assert applied[1] == [A("LAND")] # on its own, right after the current call, ahead of the queued ones
+    assert len(applied[2]) == 18
+
+def test_Actions2Environment_futures():
+    env, executor = FakeEnv(), ThreadPoolExecutor(max_workers=1)
+    def actions_fn(env: Environment, actions: list[A]) -> Future: # non-blocking, i.e. a drone command
+        return executor.submit(lambda: actions[0].name != "LAND")
+
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], reduce_fns={"PILOTING": "latest"})
+    futures = [aq.submit(A("PILOTING", (i, )), data_ts=None) for i in range(3)]
+    (a2e := Actions2Environment(env, aq, actions_fn)).start()
+    assert all(future.result(timeout=1) is True for future in futures) # all merged into the same call
+    assert aq.submit(A("LAND"), data_ts=None).result(timeout=1) is False
+    env.running = False
+    a2e.join()
+    executor.shutdown()
+
+def test_Actions2Environment_lanes():
+    env, applied = FakeEnv(), []
+    async def actions_fn(env: Environment, actions: list[A]) -> bool: # an awaitable
+        await asyncio.sleep(0.2 if actions[0].name == "LIFT" else 0.01) # a slow TakeOff
+        applied.append(actions)
+        return True
+
+    aq = ActionsQueue(action_names=["LIFT", "PILOTING", "GIMBAL"])
+    lanes = {"LIFT": "piloting", "PILOTING": "piloting", "GIMBAL": "gimbal"}
+    (a2e := Actions2Environment(env, aq, actions_fn, lanes=lanes)).start()
+    f_lift = aq.submit(A("LIFT"), data_ts=None)
+    time.sleep(0.01)
+    f_piloting = aq.submit(A("PILOTING", (0, )), data_ts=None)
+    f_gimbal = aq.submit(A("GIMBAL", (0, )), data_ts=None)
+    assert f_gimbal.result(timeout=1) is True and not f_lift.done() # the gimbal lane doesn't wait for the LIFT
+    assert f_piloting.result(timeout=1) is True and f_lift.done()
+    assert applied == [[A("GIMBAL", (0, ))], [A("LIFT")], [A("PILOTING", (0, ))]] # in order within the lane
+    env.running = False
+    a2e.join()
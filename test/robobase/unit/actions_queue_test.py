@@ -1,3 +1,6 @@
+from datetime import datetime, timedelta
+from queue import Empty, Queue
+import time
 import pytest
 from robobase import ActionsQueue, Action as A
 
@@ -25,3 +28,120 @@ def test_ActionsQueue_push_pop():
         aq.put(A("a3"), data_ts=None)
     assert aq.get()[0].name == "a2"
     assert len(aq) == 0
+
+def test_ActionsQueue_coalesce():
+    with pytest.raises(AssertionError): # unknown action name
+        ActionsQueue(action_names=["a1"], reduce_fns={"a2": "latest"})
+    aq = ActionsQueue(action_names=["PILOTING", "LAND", "GO_FORWARD", "PLAY_PAUSE"],
+                      reduce_fns={"PILOTING": "latest", "GO_FORWARD": "sum"})
+    actions = [A("PILOTING", (1, 0)), A("GO_FORWARD", (30, )), A("PLAY_PAUSE"), A("PILOTING", (2, 0)),
+               A("LAND"), A("GO_FORWARD", (1, )), A("PLAY_PAUSE"), A("PILOTING", (3, 0))]
+    assert aq.coalesce(actions) == [A("PLAY_PAUSE"), A("LAND"), A("GO_FORWARD", (31, )), A("PLAY_PAUSE"),
+                                    A("PILOTING", (3, 0))]
+    assert aq.coalesce([]) == []
+    assert ActionsQueue(action_names=["PILOTING"]).coalesce(actions[0:1] * 3) == actions[0:1] * 3 # no reduce fns
+
+def test_ActionsQueue_coalesce_sum_mixed_parameters():
+    aq = ActionsQueue(action_names=["GO_FORWARD"], reduce_fns={"GO_FORWARD": "sum"})
+    # UDPController sends the parameters as strings, the keyboard as ints
+    assert aq.coalesce([A("GO_FORWARD", ("5", )), A("GO_FORWARD", ("5", ))]) == [A("GO_FORWARD", (10, ))]
+    assert aq.coalesce([A("GO_FORWARD", (1, )), A("GO_FORWARD", ("5", ))]) == [A("GO_FORWARD", (6, ))]
+    assert aq.coalesce([A("GO_FORWARD", (1, )), A("GO_FORWARD", ("0.5", ))]) == [A("GO_FORWARD", (1.5, ))]
+    assert aq.coalesce([A("GO_FORWARD", (1, )), A("GO_FORWARD", ("x", ))]) == [A("GO_FORWARD", ("x", ))] # latest
+
+def test_ActionsQueue_max_age():
+    with pytest.raises(AssertionError): # unknown action name
+        ActionsQueue(action_names=["a1"], max_data_age_s={"a2": 0.1})
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], max_data_age_s={"PILOTING": 0.1},
+                      max_queue_age_s={"LAND": 0.1})
+    now = datetime.now()
+    aq.put(A("PILOTING", (1, )), data_ts=now - timedelta(seconds=0.5)) # computed from an old frame
+    aq.put(A("PILOTING", (2, )), data_ts=now)
+    aq.put(A("PILOTING", (3, )), data_ts=None) # i.e. keyboard: no data age
+    assert aq.get()[0] == A("PILOTING", (2, ))
+    assert aq.get_nowait()[0] == A("PILOTING", (3, ))
+    assert aq.n_expired == {"PILOTING": 1}
+
+    aq.put(A("LAND"), data_ts=now - timedelta(seconds=0.5)) # no data age policy for LAND
+    time.sleep(0.15)
+    aq.put(A("PILOTING", (4, )), data_ts=None)
+    assert aq.get(timeout=0.01)[0] == A("PILOTING", (4, )) # LAND stayed too long in the queue
+    assert aq.n_expired == {"PILOTING": 1, "LAND": 1}
+    with pytest.raises(Empty):
+        aq.get(timeout=0.01)
+
+@pytest.mark.parametrize("overflow, expected", [
+    ("drop_oldest", [A("b", (1, )), A("a", (2, )), A("b", (3, ))]),
+    ("drop_newest", [A("a", (0, )), A("b", (1, )), A("a", (2, ))]),
+    ("replace", [A("a", (0, )), A("b", (3, )), A("a", (2, ))]),
+])
+def test_ActionsQueue_overflow(overflow: str, expected: list[A]):
+    with pytest.raises(AssertionError):
+        ActionsQueue(action_names=["a"], overflow="asdf")
+    aq = ActionsQueue(action_names=["a", "b", "c"], queue=Queue(maxsize=3), overflow=overflow)
+    for i, name in enumerate(["a", "b", "a"]):
+        assert aq.put(A(name, (i, )), data_ts=None) is True
+    assert aq.put(A("b", (3, )), data_ts=None) is (overflow != "drop_newest") # doesn't block
+    assert [aq.get_nowait()[0] for _ in range(len(aq))] == expected
+    assert sum(aq.n_overflow.values()) == 1
+
+def test_ActionsQueue_overflow_replace_fallback():
+    aq = ActionsQueue(action_names=["a", "b", "c"], queue=Queue(maxsize=2), overflow="replace")
+    aq.put(A("a", (0, )), data_ts=None)
+    aq.put(A("b", (1, )), data_ts=None)
+    aq.put(A("c", (2, )), data_ts=None) # no pending 'c': the oldest is dropped
+    assert [aq.get_nowait()[0] for _ in range(len(aq))] == [A("b", (1, )), A("c", (2, ))]
+    assert aq.n_overflow == {"a": 1}
+
+def test_ActionsQueue_priorities():
+    with pytest.raises(AssertionError): # priorities must be positive
+        ActionsQueue(action_names=["a"], priorities={"a": 0})
+    aq = ActionsQueue(action_names=["PILOTING", "LAND", "DISCONNECT"], queue=Queue(maxsize=5),
+                      priorities={"LAND": 1, "DISCONNECT": 2})
+    for i in range(5):
+        aq.put(A("PILOTING", (i, )), data_ts=None)
+    assert aq.put(A("LAND"), data_ts=None) is True # full but doesn't block: the oldest PILOTING is dropped
+    assert aq.put(A("DISCONNECT"), data_ts=None) is True
+    assert aq.n_overflow == {"PILOTING": 2}
+    assert aq.get()[0] == A("DISCONNECT") and aq.get()[0] == A("LAND")
+    with pytest.raises(Empty): # the next one is a PILOTING, not a LAND
+        aq.get_nowait(priority=1)
+    assert [aq.get_nowait(priority=0)[0] for _ in range(len(aq))] == [A("PILOTING", (i, )) for i in range(2, 5)]
+
+def test_ActionsQueue_priorities_never_dropped():
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], queue=Queue(maxsize=2), overflow="replace",
+                      priorities={"LAND": 1})
+    aq.put(A("PILOTING", (0, )), data_ts=None)
+    assert all(aq.put(A("LAND", (i, )), data_ts=None) for i in range(3)) # over the capacity, not replaced
+    assert aq.put(A("PILOTING", (1, )), data_ts=None) is False and aq.n_overflow == {"PILOTING": 2}
+    assert [aq.get_nowait()[0] for _ in range(len(aq))] == [A("LAND", (i, )) for i in range(3)]
+
+def test_ActionsQueue_overflow_join():
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], queue=Queue(maxsize=2), overflow="drop_oldest",
+                      priorities={"LAND": 1}, cancel_lower=True)
+    for i in range(3):
+        aq.put(A("PILOTING", (i, )), data_ts=None)
+    assert aq.queue.unfinished_tasks == 2 # the dropped one is not waited for
+    aq.put(A("LAND"), data_ts=None)
+    assert aq.queue.unfinished_tasks == 1 and aq.get_nowait()[0] == A("LAND")
+    aq.queue.task_done()
+    aq.queue.join() # doesn't hang
+
+def test_ActionsQueue_priorities_cancel_lower():
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], priorities={"LAND": 1}, cancel_lower=True)
+    for i in range(3):
+        aq.put(A("PILOTING", (i, )), data_ts=None)
+    aq.put(A("LAND"), data_ts=None)
+    aq.put(A("PILOTING", (3, )), data_ts=None) # after the LAND, so it's kept
+    assert [aq.get_nowait()[0] for _ in range(len(aq))] == [A("LAND"), A("PILOTING", (3, ))]
+    assert aq.n_cancelled == {"PILOTING": 3}
+
+def test_ActionsQueue_submit():
+    aq = ActionsQueue(action_names=["PILOTING", "LAND"], queue=Queue(maxsize=2), overflow="drop_newest",
+                      reduce_fns={"PILOTING": "latest"})
+    f1, f2, f3 = [aq.submit(A("PILOTING", (i, )), data_ts=None) for i in range(3)]
+    assert f3.cancelled() and not f1.done() and not f2.done() # rejected as the queue is full
+    (action, ts), item2 = aq.get(), aq.get()
+    assert action == A("PILOTING", (0, )) and isinstance(ts, datetime) and item2.future is f2
+    assert aq.coalesce_groups([A("PILOTING", (0, )), A("LAND"), A("PILOTING", (1, ))]) == \
+        [(A("LAND"), [1]), (A("PILOTING", (1, )), [0, 2])]
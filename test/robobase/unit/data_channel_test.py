@@ -1,5 +1,9 @@
+from types import SimpleNamespace
+import numpy as np
 import pytest
-from robobase.data_channel import DataChannel
+import threading
+from robobase.data_channel import DataChannel, DataChannelClosedError, SubscriberStats
+from robobase.utils import DataStorer, LoggingPolicy, ModalityPolicy
 
 def test_DataChannel_ctor():
     with pytest.raises(AssertionError):
@@ -42,3 +46,95 @@ def test_DataChannel_subscribe():
 
     channel.put({"item": 1}) # put other item -> event is set
     assert event.is_set()
+
+def test_DataChannel_snapshot():
+    channel = DataChannel(supported_types=["rgb", "bbox"], eq_fn=lambda a, b: a["bbox"] == b["bbox"], snapshot=True)
+    channel.put({"rgb": np.zeros((2, 2)), "bbox": [[0, 1]]})
+    data, _ = channel.get()
+    data2, _ = channel.get()
+    assert data is data2 # same snapshot for all consumers, no copies
+    with pytest.raises(ValueError):
+        data["rgb"][0, 0] = 1
+    with pytest.raises(TypeError):
+        data["rgb"] = np.ones((2, 2))
+    with pytest.raises(TypeError):
+        data["bbox"][0] = 5
+
+    channel.put({"rgb": np.ones((2, 2)), "bbox": [[0, 1]]}) # lists compare equal to frozen lists: dup
+    assert (channel.get()[0]["rgb"] == 0).all()
+
+def test_DataChannel_snapshot_views():
+    channel = DataChannel(supported_types=["rgb", "crop"], eq_fn=lambda a, b: False, snapshot=True)
+    buffer = np.zeros((4, 4)) # i.e. the reused output buffer of an env
+    channel.put({"rgb": buffer[0:2], "crop": (crop := np.zeros((2, 2)))})
+    data, _ = channel.get()
+    buffer[:] = 1 # the base of the view is still writeable and the snapshot doesn't change
+    assert buffer.flags.writeable and (data["rgb"] == 0).all()
+    assert data["crop"] is crop and not crop.flags.writeable # owns its data: frozen in place, no copy
+
+    channel.put({"rgb": data["rgb"][0:1], "crop": data["crop"]}) # views of frozen arrays are not copied
+    data2, _ = channel.get()
+    assert data2["rgb"].base is data["rgb"] and data2["crop"] is data["crop"]
+
+def test_DataChannel_copy_modalities():
+    channel = DataChannel(supported_types=["rgb", "bbox"], eq_fn=lambda a, b: False, snapshot=True)
+    channel.put({"rgb": np.zeros((2, 2)), "bbox": [np.array([0, 1])]})
+    snapshot, _ = channel.get()
+    data, _ = channel.get(copy_modalities=["bbox"])
+    assert data["rgb"] is snapshot["rgb"]
+    assert isinstance(data["bbox"], list)
+    data["bbox"][0][0] = 5
+    assert snapshot["bbox"][0][0] == 0
+    with pytest.raises(AssertionError):
+        channel.get(copy_modalities=["depth"])
+
+def test_DataChannel_get_since():
+    channel = DataChannel(supported_types=["item"], eq_fn=lambda a, b: a==b)
+    data, _, version = channel.get_since(0, timeout=0.01) # timeout, nothing newer
+    assert data == {} and version == 0
+
+    channel.put({"item": 0})
+    channel.put({"item": 0}) # duplicate, version is not incremented
+    data, _, version = channel.get_since(0, subscriber="ctrl")
+    assert data == {"item": 0} and version == 1
+
+    channel.put({"item": 1})
+    channel.put({"item": 2})
+    channel.put({"item": 3})
+    data, _, version = channel.get_since(version, subscriber="ctrl")
+    assert data == {"item": 3} and version == 4
+    assert channel.subscribers_stats["ctrl"] == SubscriberStats(received=2, skipped=2)
+
+def test_DataChannel_get_since_blocking():
+    channel = DataChannel(supported_types=["item"], eq_fn=lambda a, b: a==b)
+    threading.Timer(0.05, lambda: channel.put({"item": 5})).start()
+    data, _, version = channel.get_since(0, timeout=5)
+    assert data == {"item": 5} and version == 1
+
+    threading.Timer(0.05, channel.close).start()
+    with pytest.raises(DataChannelClosedError):
+        channel.get_since(version, timeout=5)
+
+def test_DataChannel_demanded_modalities():
+    channel = DataChannel(supported_types=["rgb", "depth", "yolo"], eq_fn=lambda a, b: a==b)
+    assert channel.get_demanded_modalities() == {"rgb", "depth", "yolo"} # no declarations: all of them
+    channel.set_demand("keyboard", [])
+    assert channel.get_demanded_modalities() == set()
+    channel.set_demand("screen", ["rgb", "depth"])
+    channel.set_demand("planner", ["yolo"])
+    assert channel.get_demanded_modalities() == {"rgb", "depth", "yolo"}
+    channel.remove_demand("planner")
+    assert channel.get_demanded_modalities() == {"rgb", "depth"}
+    channel.set_demand("other", None)
+    assert channel.get_demanded_modalities() == {"rgb", "depth", "yolo"}
+    with pytest.raises(AssertionError):
+        channel.set_demand("screen", ["asdf"])
+
+def test_DataChannel_demanded_modalities_logged(monkeypatch: pytest.MonkeyPatch):
+    policy = LoggingPolicy({"DataChannel": {"depth": ModalityPolicy(rate_hz=1), "*": None}})
+    monkeypatch.setattr(DataStorer, "get_instance", staticmethod(lambda: SimpleNamespace(policy=policy)))
+    channel = DataChannel(supported_types=["rgb", "depth", "yolo"], eq_fn=lambda a, b: a==b)
+    channel.set_demand("screen", ["rgb"])
+    assert channel.get_demanded_modalities() == {"rgb", "depth"} # yolo is neither read nor stored
+    policy.policies.clear() # no policy for the tag: everything is stored
+    assert channel.get_demanded_modalities() == {"rgb", "depth", "yolo"}
@@ -1,5 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pytest
-from robobase import LambdaDataProducer, DataItem
+from robobase import (LambdaDataProducer, AsyncDataProducer, BatchedDataProducer, CachedDataProducer, DataProducer,
+                      DataItem)
 
 def test_LambdaDataProducer_basic():
     def produce_fn(deps: dict[str, DataItem] | None) -> dict[str, DataItem]:
@@ -15,3 +18,63 @@ def test_LambdaDataProducer_deps():
     with pytest.raises(KeyError):
         dp2.produce(deps={})
     assert dp2.produce(deps=dp.produce(deps={})) == {"b": 1}
+
+def test_AsyncDataProducer_basic():
+    dp = AsyncDataProducer(LambdaDataProducer(lambda deps: {"b": deps["a"] + 1}, modalities=["b"], dependencies=["a"]))
+    assert dp.modalities == ["b"] and dp.dependencies == ["a"]
+    assert dp.produce(deps={"a": 0}) == {"b": 1} # the first call waits for the first output
+
+def test_AsyncDataProducer_exception():
+    dp = AsyncDataProducer(LambdaDataProducer(lambda deps: {"b": deps["a"] + 1}, modalities=["b"], dependencies=["a"]))
+    with pytest.raises(TypeError):
+        dp.produce(deps={"a": "str"})
+
+def test_DataProducer_produce_batch_default():
+    dp = LambdaDataProducer(lambda deps: {"b": deps["a"] + 1}, modalities=["b"], dependencies=["a"])
+    assert dp.produce_batch([{"a": 0}, {"a": 5}]) == [{"b": 1}, {"b": 6}]
+
+def test_BatchedDataProducer_multiple_callers():
+    class Batched(DataProducer):
+        batch_lens = []
+        def produce(self, deps = None):
+            raise ValueError("only batches")
+        def produce_batch(self, deps_batch):
+            Batched.batch_lens.append(len(deps_batch))
+            return [{"b": deps["a"] + 1} for deps in deps_batch]
+
+    dp = BatchedDataProducer(Batched(modalities=["b"], dependencies=["a"]), batch_size=4, max_wait_s=0.1)
+    with ThreadPoolExecutor(max_workers=8) as pool: # i.e. 8 cameras sharing the same model
+        res = list(pool.map(lambda i: dp.produce({"a": i}), range(16)))
+    assert res == [{"b": i + 1} for i in range(16)] # each caller gets its own output
+    assert sum(Batched.batch_lens) == 16 and max(Batched.batch_lens) == 4
+    assert len(Batched.batch_lens) < 16, Batched.batch_lens
+
+def test_BatchedDataProducer_exception():
+    dp = BatchedDataProducer(LambdaDataProducer(lambda deps: {"b": deps["a"] + 1}, modalities=["b"],
+                                                dependencies=["a"]), batch_size=2, max_wait_s=0)
+    with pytest.raises(TypeError):
+        dp.produce(deps={"a": "str"})
+    assert dp.produce(deps={"a": 1}) == {"b": 2} # the scheduler survives a failed batch
+
+def test_CachedDataProducer_content_hash():
+    n_calls = 0
+    def produce_fn(deps):
+        nonlocal n_calls
+        n_calls += 1
+        return {"rgb_rev": deps["rgb"][::-1]}
+    dp = CachedDataProducer(LambdaDataProducer(produce_fn, ["rgb_rev"], ["rgb"]), max_bytes=10_000)
+    frames = [np.random.randint(0, 255, size=(10, 10, 3), dtype=np.uint8) for _ in range(3)]
+    for frame in [*frames, *frames, frames[0].copy()]: # a copy has the same content so it's a hit too
+        assert np.allclose(dp.produce({"rgb": frame, "other": 0})["rgb_rev"], frame[::-1])
+    assert n_calls == 3 and dp.n_hits == 4 and dp.n_misses == 3
+    assert dp.n_bytes == 3 * 300
+
+def test_CachedDataProducer_key_fn_and_budget():
+    dp = CachedDataProducer(LambdaDataProducer(lambda deps: {"b": np.zeros(100, dtype=np.uint8) + deps["ix"]},
+                                               ["b"], ["ix"]), max_bytes=250, key_fn=lambda deps: deps["ix"])
+    for ix in [0, 1, 0, 2]: # 0 is used again, so 1 is the least recently used one when 2 doesn't fit
+        dp.produce({"ix": ix})
+    assert len(dp) == 2 and dp.n_bytes == 200 and dp.n_hits == 1
+    assert dp.produce({"ix": 0})["b"][0] == 0 and dp.n_hits == 2
+    dp.produce({"ix": 1})
+    assert dp.n_misses == 4
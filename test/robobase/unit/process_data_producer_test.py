@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from robobase import DataProducer, ProcessDataProducer
+
+class Flip(DataProducer):
+    def __init__(self):
+        super().__init__(modalities=["flip", "shape"], dependencies=["rgb"])
+    def produce(self, deps = None):
+        if deps["rgb"].sum() < 0:
+            raise ValueError("negative")
+        return {"flip": deps["rgb"][::-1].copy(), "shape": list(deps["rgb"].shape)}
+
+def test_ProcessDataProducer_produce():
+    dp = ProcessDataProducer(Flip())
+    assert dp.modalities == ["flip", "shape"] and dp.dependencies == ["rgb"]
+    for shape in [(10, 5), (10, 5), (30, 20, 3)]: # second call reuses the blocks, third one reallocates them
+        rgb = np.random.randint(0, 255, size=shape).astype(np.uint8)
+        res = dp.produce({"rgb": rgb, "other": "not sent"})
+        assert np.array_equal(res["flip"], rgb[::-1]) and res["shape"] == list(shape)
+    dp.close()
+
+def test_ProcessDataProducer_exception():
+    dp = ProcessDataProducer(Flip())
+    with pytest.raises(RuntimeError, match="negative"):
+        dp.produce({"rgb": -np.ones((2, 2))})
+    assert dp.produce({"rgb": np.ones((2, 2))})["shape"] == [2, 2] # the worker is still alive
+    dp.close()
+
+def test_ProcessDataProducer_with_logs_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROBOBASE_LOGS_DIR", str(tmp_path)) # inherited by the worker, which re-imports robobase
+    (tmp_path / "ROBOBASE.txt").write_text("the main process' log file")
+    dp = ProcessDataProducer(Flip())
+    assert dp.produce({"rgb": np.ones((2, 2))})["shape"] == [2, 2] # the worker must not try to create the file too
+    dp.close()
+    assert (tmp_path / "ROBOBASE.txt").read_text() == "the main process' log file"
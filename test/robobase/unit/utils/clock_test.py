@@ -0,0 +1,53 @@
+import threading
+import time
+from datetime import datetime
+from robobase.utils import VirtualClock, RealClock, get_clock, set_clock, freq_barrier
+
+def test_VirtualClock_sleep():
+    clock = VirtualClock(start=datetime(2000, 1, 1))
+    now = time.perf_counter()
+    clock.sleep(600) # 10 minutes
+    assert time.perf_counter() - now < 0.1
+    assert (clock.now() - datetime(2000, 1, 1)).total_seconds() == 600
+    now1, now2 = clock.now(), clock.now()
+    assert now2 > now1 and (now2 - now1).total_seconds() < 1e-5 # strictly increasing, even if the time is frozen
+
+def test_VirtualClock_threads():
+    clock, events = VirtualClock(start=datetime(2000, 1, 1)), []
+    def pacer(name: str, period_s: float, n: int):
+        for _ in range(n):
+            clock.sleep(period_s)
+            events.append((round((clock.now() - datetime(2000, 1, 1)).total_seconds(), 3), name))
+    threads = [threading.Thread(target=pacer, args=("a", 1, 6)), threading.Thread(target=pacer, args=("b", 3, 2))]
+    _ = [clock.register(t) for t in threads] # so the time doesn't jump before both of them sleep
+    now = time.perf_counter()
+    _ = [t.start() for t in threads]
+    _ = [t.join() for t in threads]
+    assert time.perf_counter() - now < 0.5
+    assert [e for e in events if e[1] == "b"] == [(3, "b"), (6, "b")] # woken up in the virtual order
+    assert [e for e in events if e[1] == "a"] == [(i, "a") for i in range(1, 7)]
+
+def test_freq_barrier_virtual_clock():
+    prev_clock = set_clock(clock := VirtualClock(start=datetime(2000, 1, 1)))
+    try:
+        assert get_clock() is clock
+        prev = datetime(1900, 1, 1)
+        for _ in range(301): # 10s at 30 FPS
+            prev = freq_barrier(30, prev)
+        assert abs((clock.now() - datetime(2000, 1, 1)).total_seconds() - 10) < 1e-3
+    finally:
+        set_clock(prev_clock)
+    assert isinstance(get_clock(), RealClock)
+
+def test_VirtualClock_waits_for_work():
+    clock, done = VirtualClock(start=datetime(2000, 1, 1)), []
+    def worker():
+        clock.take_work()
+        time.sleep(0.05) # real time: i.e. a neural network
+        done.append(clock.now())
+        clock.release_work()
+    clock.add_work() # i.e. a frame handed over to the worker
+    threading.Thread(target=worker).start()
+    clock.sleep(1)
+    assert len(done) == 1 and done[0] < datetime(2000, 1, 1, 0, 0, 1) # the time didn't jump while it was working
+    assert (clock.now() - datetime(2000, 1, 1)).total_seconds() >= 1
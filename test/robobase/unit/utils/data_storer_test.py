@@ -1,7 +1,11 @@
 from pathlib import Path
 from datetime import datetime
 from queue import Empty
-from robobase.utils import DataStorer
+import os
+import subprocess
+import sys
+import textwrap
+from robobase.utils import DataStorer, SessionLogReader, get_project_root
 import numpy as np
 import pytest
 
@@ -37,8 +41,84 @@ def test_push_and_get_and_store_flow(tmp_path):
         ds.get_and_store()
 
     # verify data on disk
-    files = sorted(list((tmp_path / "test").iterdir()), key=lambda p: p.name) # sort for consistency
-    assert len(files) == 2
-    saved_arrays = [np.load(f, allow_pickle=True) for f in files]
-    assert np.array_equal(saved_arrays[0]["my_key"], arr1)
-    assert np.array_equal(saved_arrays[1]["my_key2"], arr2)
+    reader = SessionLogReader(tmp_path / "test")
+    assert len(reader) == 2 and reader.timestamps == [t1.isoformat(), t2.isoformat()]
+    assert np.array_equal(reader[0]["my_key"], arr1)
+    assert np.array_equal(reader[1]["my_key2"], arr2)
+
+@pytest.mark.parametrize("pool, n_workers", [("thread", 0), ("thread", 3), ("process", 2)])
+def test_DataStorer_pool_keeps_push_order(tmp_path: Path, pool: str, n_workers: int):
+    ds = DataStorer(tmp_path, n_workers=n_workers, pool=pool, compression_level=1)
+    ds.start()
+    timestamps = [datetime(2020, 1, 1, 0, 0, i) for i in range(30)]
+    for i, ts in enumerate(timestamps): # bigger items first, so the later ones are encoded before them
+        ds.push({"i": i, "rgb": np.random.randint(0, 255, size=(30 - i, 100, 3), dtype=np.uint8)}, "rgb", ts)
+        ds.push({"action": f"a{i}"}, "actions", ts)
+    ds.close()
+
+    reader = SessionLogReader(tmp_path / "rgb")
+    assert reader.timestamps == [ts.isoformat() for ts in timestamps]
+    assert [reader[i]["i"] for i in range(len(reader))] == list(range(30)) and reader[0]["rgb"].shape == (30, 100, 3)
+    assert [x["action"] for x in map(SessionLogReader(tmp_path / "actions").__getitem__, range(30))] == \
+        [f"a{i}" for i in range(30)]
+
+def test_DataStorer_process_pool_from_script(tmp_path: Path):
+    """the workers of a __main__ script re-import it (and robobase) with the same ROBOBASE_LOGS_DIR as the parent"""
+    script = tmp_path / "main.py"
+    script.write_text(textwrap.dedent(f"""
+        from pathlib import Path
+        from datetime import datetime
+        import numpy as np
+        from robobase.utils import DataStorer
+
+        if __name__ == "__main__":
+            ds = DataStorer(Path("{tmp_path}/data"), n_workers=2, pool="process")
+            ds.start()
+            for i in range(10):
+                item = {{"rgb": np.full((16, 16, 3), i, dtype=np.uint8)}}
+                ds.push(item, "DataChannel", datetime(2020, 1, 1, 0, 0, i))
+            ds.close()
+    """))
+    env = {**os.environ, "ROBOBASE_LOGS_DIR": str(tmp_path / "logs"), "ROBOBASE_STORE_LOGS": "1",
+           "PYTHONPATH": os.pathsep.join([str(get_project_root()), os.getenv("PYTHONPATH", "")])}
+    proc = subprocess.run([sys.executable, str(script)], env=env, capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0 and "Traceback" not in proc.stderr, proc.stderr
+    reader = SessionLogReader(tmp_path / "data/DataChannel")
+    assert [reader[i]["rgb"][0, 0, 0] for i in range(len(reader))] == list(range(10))
+    assert [p.name for p in (tmp_path / "logs").iterdir()] == ["ROBOBASE.txt"] # only the parent's
+
+def test_DataStorer_overflow_drop_keeps_actions(tmp_path: Path):
+    ds = DataStorer(tmp_path, max_queue_bytes=3 * 64 * 64 * 3 + 1000, overflow="drop") # not started: nothing is stored
+    results = [ds.push({"rgb": np.zeros((64, 64, 3), dtype=np.uint8)}, "DataChannel", datetime.now()) for _ in range(5)]
+    assert results == [True, True, True, False, False]
+    assert all(ds.push({"action": "a"}, "ActionsQueue", datetime.now()) for _ in range(100)) # never dropped
+    assert ds.stats["n_dropped"] == {"DataChannel": 2}
+    ds.start()
+    ds.close()
+    assert len(SessionLogReader(tmp_path / "DataChannel")) == 3
+    assert len(SessionLogReader(tmp_path / "ActionsQueue")) == 100
+    assert SessionLogReader(tmp_path / "DataStorer")[-1]["n_dropped"] == {"DataChannel": 2} # recorded in the log
+    assert ds._queued_bytes == 0
+
+def test_DataStorer_overflow_lists_of_arrays(tmp_path: Path):
+    masks = [np.zeros((64, 64), dtype=bool) for _ in range(10)] # i.e. yolo's segmentation masks
+    ds = DataStorer(tmp_path, max_queue_bytes=3 * 10 * 64 * 64 + 1000, overflow="drop")
+    assert [ds.push({"masks": masks}, "DataChannel", datetime.now()) for _ in range(5)] == [True] * 3 + [False] * 2
+    assert ds._queued_bytes >= 3 * 10 * 64 * 64 # the arrays of the list are counted, not the list itself
+    ds.start()
+    ds.close()
+
+def test_DataStorer_overflow_downsample_and_degrade(tmp_path: Path):
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    ds = DataStorer(tmp_path / "downsample", max_queue_bytes=100 * frame.nbytes, overflow="downsample")
+    results = [ds.push({"rgb": frame}, "DataChannel", datetime.now()) for _ in range(70)]
+    assert all(results[0:50]) and sum(results[50:]) == 5 and ds.stats["n_downsampled"] == {"DataChannel": 15}
+
+    ds = DataStorer(tmp_path / "degrade", max_queue_bytes=12 * frame.nbytes, overflow="degrade")
+    assert all(ds.push({"rgb": frame, "pose": np.zeros(6)}, "DataChannel", datetime.now()) for _ in range(10))
+    assert ds.stats["n_degraded"] == {"DataChannel": 5} # the pose bytes get it over the threshold at the 6th
+    assert ds._queued_bytes == 10 * (frame.nbytes + np.zeros(6).nbytes) # degraded by the pool, not in push()
+    ds.start()
+    ds.close()
+    shapes = [item["rgb"].shape for item in SessionLogReader(tmp_path / "degrade/DataChannel")]
+    assert shapes == [(64, 64, 3)] * 5 + [(32, 32, 3)] * 5
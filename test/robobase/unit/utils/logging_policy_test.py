@@ -0,0 +1,72 @@
+from pathlib import Path
+from datetime import datetime, timedelta
+import json
+import numpy as np
+import pytest
+from robobase.utils import DataStorer, SessionLogReader, LoggingPolicy, ModalityPolicy
+from robobase.replay import ReplayDataProducer
+
+def test_LoggingPolicy_select():
+    policy = LoggingPolicy({"DataChannel": {"rgb": ModalityPolicy(rate_hz=5), "pose": ModalityPolicy(), "*": None}})
+    t0 = datetime(2020, 1, 1)
+    selected = [policy.select("DataChannel", {"rgb": 0, "pose": i, "semantic": 0}, t0 + timedelta(seconds=i / 10))
+                for i in range(6)]
+    assert [list(x.keys()) for x in selected] == [["rgb", "pose"], ["pose"], ["rgb", "pose"], ["pose"],
+                                                  ["rgb", "pose"], ["pose"]]
+    assert policy.select("ActionsQueue", {"action": "a"}, t0) == {"action": "a"} # tags not in the policy: all
+    assert LoggingPolicy({"DataChannel": {"*": None}}).select("DataChannel", {"rgb": 0}, t0) is None
+
+    assert policy.stored_modalities("DataChannel", ["rgb", "pose", "semantic"]) == {"rgb", "pose"}
+    assert policy.stored_modalities("ActionsQueue", ["action"]) == {"action"}
+
+    with pytest.raises(AssertionError):
+        ModalityPolicy(rate_hz=0)
+    with pytest.raises(AssertionError):
+        LoggingPolicy({"DataChannel": {"rgb": 5}})
+
+def test_DataStorer_LoggingPolicy_dropped_items(tmp_path: Path):
+    policy = LoggingPolicy({"DataChannel": {"rgb": ModalityPolicy(rate_hz=1)}})
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    ds = DataStorer(tmp_path, max_queue_bytes=frame.nbytes + 100, overflow="drop", policy=policy) # not started
+    t0 = datetime(2020, 1, 1)
+    assert ds.push({"rgb": frame}, "DataChannel", t0)
+    assert not ds.push({"rgb": frame}, "DataChannel", t0 + timedelta(seconds=1)) # dropped: the queue is full
+    ds.get_and_store()
+    # the dropped one doesn't count for the rate, so the next frame is stored instead of waiting for a whole period
+    assert ds.push({"rgb": frame}, "DataChannel", t0 + timedelta(seconds=1.1))
+    assert not ds.push({"rgb": frame}, "DataChannel", t0 + timedelta(seconds=1.5)) # decimated
+    ds.start()
+    ds.close()
+
+def test_LoggingPolicy_from_file(tmp_path: Path):
+    cfg = {"DataChannel": {"rgb": {"rate_hz": 5, "downscale": 2}, "depth": {"dtype": "float16"}, "*": None}}
+    (path := tmp_path / "policy.json").write_text(json.dumps(cfg))
+    policy = LoggingPolicy.from_file(path)
+    assert policy.get("DataChannel", "rgb") == ModalityPolicy(rate_hz=5, downscale=2)
+    assert policy.get("DataChannel", "semantic") is None and policy.get("ActionsQueue", "action") == ModalityPolicy()
+
+def test_DataStorer_LoggingPolicy_and_replay(tmp_path: Path):
+    policy = LoggingPolicy({"DataChannel": {
+        "rgb": ModalityPolicy(rate_hz=5, downscale=2, compression_level=0),
+        "depth": ModalityPolicy(dtype="float16", compression_level=9),
+        "semantic": None,
+    }})
+    ds = DataStorer(tmp_path, n_workers=2, policy=policy)
+    ds.start()
+    t0 = datetime(2020, 1, 1)
+    for i in range(10): # at 10Hz
+        item = {"rgb": np.full((64, 64, 3), i, dtype=np.uint8), "depth": np.full((64, 64), i, dtype=np.float32),
+                "semantic": np.zeros((64, 64, 8), dtype=np.float32), "pose": np.full(6, i)}
+        ds.push(item, "DataChannel", t0 + timedelta(seconds=i / 10))
+    ds.close()
+
+    reader = SessionLogReader(tmp_path / "DataChannel")
+    assert len(reader) == 10 and [("rgb" in reader[i]) for i in range(10)] == [i % 2 == 0 for i in range(10)]
+    assert reader[0]["rgb"].shape == (32, 32, 3) and reader[0]["depth"].dtype == np.float16
+    assert "semantic" not in reader[0] and np.array_equal(reader[3]["pose"], np.full(6, 3))
+
+    replay = ReplayDataProducer(tmp_path / "DataChannel")
+    assert sorted(replay.modalities) == ["depth", "pose", "rgb"]
+    items = [replay.produce() for _ in range(4)]
+    assert [item["rgb"][0, 0, 0] for item in items] == [0, 0, 2, 2] # sample & hold of the decimated modality
+    assert [item["pose"][0] for item in items] == [0, 1, 2, 3]
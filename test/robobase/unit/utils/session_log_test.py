@@ -0,0 +1,52 @@
+from pathlib import Path
+from dataclasses import dataclass
+import numpy as np
+from robobase.utils import SessionLogWriter, SessionLogReader, is_session_log
+from robobase.utils.session_log import encode_item, decode_item, INDEX_FILE
+
+@dataclass
+class Obj:
+    x: int
+
+def test_encode_decode_item():
+    item = {"rgb": np.arange(12, dtype=np.uint8).reshape(2, 2, 3), "state": ["h", "e"], "empty": [], "ts": "2020",
+            "obj": Obj(1), "ragged": [[1], [1, 2]], "n": 5}
+    res = decode_item(encode_item(item))
+    assert res["rgb"].dtype == np.uint8 and np.array_equal(res["rgb"], item["rgb"]) and res["rgb"].flags.writeable
+    assert res["state"] == ["h", "e"] and res["empty"] == [] and res["ragged"] == [[1], [1, 2]]
+    assert res["ts"] == "2020" and res["obj"] == Obj(1) and res["n"] == 5
+
+def test_encode_decode_item_lists():
+    item = {"mixed": [1, "a"], "empty": [], "bboxes": [[0, 0, 10, 10], [5, 5, 20, 20]], "floats": [0.5, 1.0],
+            "masks": [np.zeros((2, 2), dtype=bool)]}
+    res = decode_item(encode_item(item, compression_level=1))
+    assert all(type(res[k]) is list and res[k] == item[k] for k in ["mixed", "empty", "bboxes", "floats"]) # same types
+    assert len(res["masks"]) == 1 and res["masks"][0].dtype == bool and res["masks"][0].shape == (2, 2)
+
+def test_encode_decode_item_compressed():
+    item = {"rgb": np.zeros((64, 64, 3), dtype=np.uint8), "obj": Obj(2)}
+    data = encode_item(item, compression_level=1)
+    assert len(data) < len(encode_item(item)) // 10
+    res = decode_item(data)
+    assert np.array_equal(res["rgb"], item["rgb"]) and res["obj"] == Obj(2)
+
+def test_SessionLog_segments(tmp_path: Path):
+    writer = SessionLogWriter(tmp_path / "tag", segment_max_bytes=1000)
+    for i in range(20):
+        writer.append({"i": i, "data": np.full(100, i, dtype=np.uint8)}, timestamp=f"2020-01-01T00:00:{i:02d}")
+    assert is_session_log(tmp_path / "tag") and not is_session_log(tmp_path)
+    assert len(reader := SessionLogReader(tmp_path / "tag")) == 20 # readable while the writer is still open
+    writer.close()
+    assert len(list((tmp_path / "tag").glob("segment-*.bin"))) > 1
+    assert reader[13]["i"] == 13 and np.array_equal(reader[13]["data"], np.full(100, 13)) # random access
+    assert reader.timestamps[-1] == "2020-01-01T00:00:19"
+    assert reader.keys(13) == ["i", "data"] # header only
+
+    writer = SessionLogWriter(tmp_path / "tag", segment_max_bytes=1000) # continues the log
+    writer.append({"i": 20}, timestamp="2020-01-01T00:00:20")
+    writer.close()
+    with open(tmp_path / "tag" / INDEX_FILE, "ab") as f:
+        f.write(b"partial") # i.e. read while a record is being written
+    reader.refresh()
+    assert len(reader) == 21 and reader[20] == {"i": 20} and [item["i"] for item in reader] == list(range(21))
+    reader.close()
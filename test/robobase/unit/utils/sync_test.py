@@ -0,0 +1,39 @@
+import time
+from datetime import datetime
+from robobase.utils import TimerScheduler, VirtualClock, set_clock
+
+def test_TimerScheduler_order():
+    scheduler, calls = TimerScheduler(), []
+    scheduler.schedule("b", 0.04, lambda: calls.append("b"))
+    scheduler.schedule("a", 0.02, lambda: calls.append("a"))
+    assert len(scheduler) == 2
+    time.sleep(0.1)
+    assert calls == ["a", "b"] and len(scheduler) == 0 and scheduler.n_calls == 2
+    assert 0 <= scheduler.mean_lateness_s <= scheduler.max_lateness_s < 0.05
+
+def test_TimerScheduler_replace_and_cancel():
+    scheduler, calls = TimerScheduler(), []
+    for i in range(10): # i.e. a held key at 100Hz: the pending stop is extended, not stacked
+        scheduler.schedule("stop", 0.03, lambda i=i: calls.append(i))
+        time.sleep(0.01)
+    assert calls == [] and scheduler.n_replaced == 9
+    time.sleep(0.05)
+    assert calls == [9]
+    scheduler.schedule("stop", 0.02, lambda: calls.append(10))
+    assert scheduler.cancel("stop") is True and scheduler.cancel("stop") is False
+    time.sleep(0.04)
+    assert calls == [9] and scheduler.n_calls == 1
+
+def test_TimerScheduler_virtual_clock():
+    prev_clock = set_clock(clock := VirtualClock(start=datetime(2000, 1, 1)))
+    try:
+        scheduler, calls = TimerScheduler(), []
+        scheduler.schedule("stop", 30, lambda: calls.append(clock.now()))
+        now = time.perf_counter()
+        clock.sleep(60) # the virtual time waits for the deadline instead of jumping over it
+        assert time.perf_counter() - now < 5 and len(calls) == 1
+        assert abs((calls[0] - datetime(2000, 1, 1)).total_seconds() - 30) <= TimerScheduler.TICK_S
+        assert (clock.now() - datetime(2000, 1, 1)).total_seconds() >= 60 # the idle scheduler doesn't hold the time
+        assert scheduler.max_lateness_s <= TimerScheduler.TICK_S
+    finally:
+        set_clock(prev_clock)
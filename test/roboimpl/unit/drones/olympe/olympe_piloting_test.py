@@ -0,0 +1,32 @@
+from robobase import Action as A, ActionsQueue
+from roboimpl.envs.olympe.olympe_piloting import clamped_sum_piloting, merge_piloting_actions
+
+def test_clamped_sum_piloting():
+    assert clamped_sum_piloting(A("PILOTING", (10, -20, 0, 90, 0.1)), A("PILOTING", (5, -90, 1, 20, 0.3))) == \
+        A("PILOTING", (15, -100, 1, 100, 0.3))
+    assert clamped_sum_piloting(A("PILOTING", ("10", "0", "0", "0", "0.1")), A("PILOTING", (5, 0, 0, 0, "0.3"))) == \
+        A("PILOTING", (15, 0, 0, 0, 0.3)) # UDPController sends strings
+
+def test_merge_piloting_actions_per_source():
+    kb = [A("PILOTING", (50, 0, 0, 0, 0.1), source="keyboard") for _ in range(5)] # a stale backlog of the keyboard
+    ibvs = A("PILOTING", (0, 30, 0, 0, 0.2), source="ibvs")
+    actions = [*kb[0:3], A("LIFT", source="keyboard"), ibvs, *kb[3:]]
+    # only the latest of each source is summed, so the backlog doesn't saturate the velocities
+    assert merge_piloting_actions(actions, "sum") == [A("LIFT"), A("PILOTING", (50, 30, 0, 0, 0.2))]
+    assert merge_piloting_actions(actions, "override") == [A("LIFT"), kb[-1]] # the latest source wins
+    assert merge_piloting_actions([ibvs, A("LAND")], "sum") == [ibvs, A("LAND")] # a single one is kept as is
+
+def test_merge_piloting_actions_source_priorities():
+    kb, ibvs = A("PILOTING", (50, 0, 0, 0, 0.1), source="keyboard"), A("PILOTING", (0, 30, 0, 0, 0.2), source="ibvs")
+    other = A("PILOTING", (0, 0, 10, 0, 0.1), source="other")
+    for actions in ([kb, ibvs, other], [ibvs, other, kb], [other, kb, ibvs]): # whatever the order they came in
+        assert merge_piloting_actions(actions, "override", source_priorities=["keyboard", "ibvs"]) == [kb]
+    assert merge_piloting_actions([kb, other], "override", source_priorities=["ibvs"]) == [other] # unlisted: latest
+    assert merge_piloting_actions([ibvs, other], "override", source_priorities=["keyboard", "ibvs"]) == [ibvs]
+
+def test_merge_piloting_actions_sources_from_queue():
+    aq = ActionsQueue(action_names=["PILOTING"]) # no PILOTING reduce fn, so all the sources reach the actions fn
+    aq.put(A("PILOTING", (10, 0, 0, 0, 0.1)), data_ts=None) # the source is the calling thread
+    aq.put(A("PILOTING", (20, 0, 0, 0, 0.1), source="ibvs"), data_ts=None)
+    actions = [aq.get()[0] for _ in range(2)]
+    assert merge_piloting_actions(actions, "sum") == [A("PILOTING", (30, 0, 0, 0, 0.1))]
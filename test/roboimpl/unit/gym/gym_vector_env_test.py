@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from robobase import Robot, DataChannel, ActionsQueue, Action
+
+gym = pytest.importorskip("gymnasium")
+from roboimpl.envs.gym import GymVectorEnv, GymState, gym_actions_fn, GYM_ACTION_NAMES # pylint: disable=C0413
+
+def test_GymVectorEnv_make_and_step():
+    env = GymVectorEnv.make("CartPole-v1", num_envs=3, max_steps=2)
+    state: GymState = env.get_state()["state"]
+    assert state.observation.shape == (3, 4) and state.reward.shape == (3, ) and state.terminated.shape == (3, )
+
+    env.step(env.action_space.sample())
+    state = env.get_state()["state"]
+    assert state.observation.shape == (3, 4) and state.reward.shape == (3, ) and state.truncated.shape == (3, )
+    with pytest.raises(AssertionError):
+        env.step(env.action_space.sample()[0:2]) # one action per sub-env
+    env.step(env.action_space.sample()) # reaches max_steps (and logs the spec id)
+    assert not env.is_running()
+    env.close()
+
+def test_GymVectorEnv_no_spec():
+    vec_env = gym.vector.SyncVectorEnv([lambda: gym.make("CartPole-v1")] * 2)
+    env = GymVectorEnv(vec_env, max_steps=1)
+    env.step(env.action_space.sample()) # the max_steps log doesn't need a spec
+    assert not env.is_running()
+    env.close()
+
+def test_GymVectorEnv_run_lockstep_autoreset():
+    env = GymVectorEnv.make("CartPole-v1", num_envs=2, max_steps=300)
+    data_channel = DataChannel(["state"], eq_fn=lambda a, b: False)
+    robot = Robot(env=env, data_channel=data_channel, actions_queue=ActionsQueue(action_names=GYM_ACTION_NAMES),
+                  actions_fn=gym_actions_fn)
+    n_terminated = []
+    def controller_fn(data: dict[str, GymState]) -> list[Action]:
+        n_terminated.append(data["state"].terminated.sum())
+        return [Action("step", parameters=(env.action_space.sample(), ))]
+    robot.add_controller(controller_fn)
+
+    assert robot.run_lockstep() == 300 and env.total_steps == 300 # no 'reset' action was ever sent
+    assert sum(n_terminated) > 0 # random actions: the sub-envs finished (many times) and were reset by gymnasium
+    assert np.isfinite(env.get_state()["state"].observation).all()
+    env.close()
@@ -14,74 +14,87 @@ from urllib.parse import urlparse, parse_qs
 
 import numpy as np
 
+from robobase.utils import SessionLogReader, is_session_log
+
 _state = {
     "logs_dir": None,
     "html_path": Path(__file__).parent / "index.html",
     "cache": {"DataChannel": {}, "ActionsQueue": {}},
+    "readers": {},
+    "n_scanned": {"DataChannel": 0, "ActionsQueue": 0},
 }
 
 
-def scan_logs(after=None):  # pylint: disable=too-many-branches
+def _action_entry(stem, keys, action, data_ts):
+    """The cache entry of an ActionsQueue item."""
+    action_name = str(action.name) if hasattr(action, "name") else str(action)
+    action_params = {}
+    if hasattr(action, "parameters") and action.parameters is not None:
+        if isinstance(action.parameters, dict):
+            action_params = {str(k): str(v) for k, v in action.parameters.items()}
+        else:
+            action_params = str(action.parameters)
+    return {
+        "timestamp": stem,
+        "keys": keys,
+        "action_name": action_name,
+        "action_params": action_params,
+        "data_ts": data_ts,
+    }
+
+
+def _scan_session_log(tag, tag_dir):
+    """Adds the items appended to a session log (DataStorer's format) since the last scan. O(new items)."""
+    cache = _state["cache"][tag]
+    if (reader := _state["readers"].get(tag)) is None:
+        reader = _state["readers"][tag] = SessionLogReader(tag_dir)
+    reader.refresh()
+    timestamps = reader.timestamps
+    for i in range(_state["n_scanned"][tag], len(reader)):
+        stem = timestamps[i]
+        try:
+            if tag == "DataChannel": # only the keys are shown, so the (large) frames are not read
+                cache[stem] = {"timestamp": stem, "keys": sorted(reader.keys(i))}
+            else:
+                item = reader[i]
+                cache[stem] = _action_entry(stem, sorted(item.keys()), item.get("action"), item.get("data_ts"))
+        except Exception:
+            cache[stem] = {"timestamp": stem, "keys": []} if tag == "DataChannel" \
+                else _action_entry(stem, [], "?", None)
+    _state["n_scanned"][tag] = len(reader)
+
+
+def _scan_npz_dir(tag, tag_dir):
+    """Adds the new items of an older log directory (one .npz file per item)."""
+    cache = _state["cache"][tag]
+    for entry in os.scandir(tag_dir):
+        if not entry.name.endswith(".npz") or not entry.is_file():
+            continue
+        stem = entry.name[:-4]
+        if stem in cache:
+            continue
+        try:
+            data = np.load(entry.path, allow_pickle=True)
+            if tag == "DataChannel":
+                cache[stem] = {"timestamp": stem, "keys": sorted(data.keys())}
+            else:
+                cache[stem] = _action_entry(stem, sorted(data.keys()), data.get("action"), data.get("data_ts").item())
+        except Exception:
+            cache[stem] = {"timestamp": stem, "keys": []} if tag == "DataChannel" \
+                else _action_entry(stem, [], "?", None)
+
+
+def scan_logs(after=None):
     """Scan log directories and return cached entries, optionally filtered by timestamp."""
     logs_dir = _state["logs_dir"]
     cache = _state["cache"]
-    dc_dir = logs_dir / "DataChannel"
-    aq_dir = logs_dir / "ActionsQueue"
-
-    if dc_dir.exists():
-        for entry in os.scandir(dc_dir):
-            if not entry.name.endswith(".npz") or not entry.is_file():
-                continue
-            stem = entry.name[:-4]
-            if stem in cache["DataChannel"]:
-                continue
-            try:
-                data = np.load(entry.path, allow_pickle=True)
-                keys = sorted(data.keys())
-            except Exception:
-                keys = []
-            cache["DataChannel"][stem] = {
-                "timestamp": stem,
-                "keys": keys,
-            }
-
-    if aq_dir.exists():
-        for entry in os.scandir(aq_dir):
-            if not entry.name.endswith(".npz") or not entry.is_file():
-                continue
-            stem = entry.name[:-4]
-            if stem in cache["ActionsQueue"]:
-                continue
-            try:
-                data = np.load(entry.path, allow_pickle=True)
-                action = data.get("action")
-                action_name = (
-                    str(action.name) if hasattr(action, "name") else str(action)
-                )
-                data_ts = data.get("data_ts")
-                action_params = {}
-                if hasattr(action, "parameters") and action.parameters is not None:
-                    if isinstance(action.parameters, dict):
-                        action_params = {
-                            str(k): str(v) for k, v in action.parameters.items()
-                        }
-                    else:
-                        action_params = str(action.parameters)
-                cache["ActionsQueue"][stem] = {
-                    "timestamp": stem,
-                    "keys": sorted(data.keys()),
-                    "action_name": action_name,
-                    "action_params": action_params,
-                    "data_ts": data_ts.item(),
-                }
-            except Exception:
-                cache["ActionsQueue"][stem] = {
-                    "timestamp": stem,
-                    "keys": [],
-                    "action_name": "?",
-                    "action_params": {},
-                    "data_ts": None,
-                }
+    for tag in ("DataChannel", "ActionsQueue"):
+        if not (tag_dir := logs_dir / tag).exists():
+            continue
+        if is_session_log(tag_dir):
+            _scan_session_log(tag, tag_dir)
+        else:
+            _scan_npz_dir(tag, tag_dir)
 
     dc_items = cache["DataChannel"].values()
     aq_items = cache["ActionsQueue"].values()